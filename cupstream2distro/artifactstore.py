@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2014 Canonical
+#
+# Authors:
+#  Didier Roche
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+'''Host wide store of source package files, addressed by their sha256 as listed in the .dsc
+
+Every silo and stack downloading the same file shares it: files are hard linked from the store to where they are
+needed. The modification time of a stored file is its last use time, the least recently used files are evicted
+once the store is over ARTIFACT_STORE_MAX_SIZE.'''
+
+import fcntl
+import logging
+import os
+import shutil
+import urllib
+
+from . import downloader
+from .settings import ARTIFACT_STORE_DIR, ARTIFACT_STORE_MAX_SIZE, DOWNLOAD_WORKERS
+from .utils import concurrent_map, ignored
+
+
+def get_dsc_checksums(dsc_path):
+    '''Return {filename: (sha256, size)} of the files listed in dsc_path'''
+    checksums = {}
+    in_checksums = False
+    with open(dsc_path) as f:
+        for line in f:
+            if line.startswith("Checksums-Sha256:"):
+                in_checksums = True
+                continue
+            if in_checksums:
+                if not line.startswith(" "):
+                    break
+                fields = line.split()
+                if len(fields) == 3:
+                    checksums[fields[2]] = (fields[0], int(fields[1]))
+    return checksums
+
+
+def _get_artifact_path(sha256):
+    return os.path.join(ARTIFACT_STORE_DIR, sha256[:2], sha256)
+
+
+def _link(source, dest):
+    '''Hard link source to dest, copying it if they're not on the same filesystem'''
+    with ignored(OSError):
+        os.remove(dest)
+    try:
+        os.link(source, dest)
+    except OSError:
+        shutil.copy(source, dest)
+
+
+def _insert(url, sha256, size):
+    '''Download url in the store, checking it matches sha256 and size as it arrives
+
+    Partial downloads are kept under a hidden name, locked while in progress, so that an interrupted download is
+    resumed by the next fetch of that file from any process.'''
+    path = _get_artifact_path(sha256)
+    partial_path = os.path.join(os.path.dirname(path), ".{}.partial".format(sha256))
+    with ignored(OSError):
+        os.makedirs(os.path.dirname(path))
+    with open(partial_path, 'a+b') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            # another process may have completed the download while we were waiting
+            if os.path.isfile(path):
+                if not os.path.samestat(os.fstat(f.fileno()), os.stat(path)):
+                    with ignored(OSError):
+                        os.remove(partial_path)
+                return
+            downloader.download(url, f, sha256, size)
+            os.chmod(partial_path, 0o644)
+            os.rename(partial_path, path)
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+    evict(keep=path)
+
+
+def fetch(url, dest, sha256, size):
+    '''Make the file at url, having sha256 and size, available at dest
+
+    It's only downloaded if it's not in the store yet.'''
+    path = _get_artifact_path(sha256)
+    try:
+        os.utime(path, None)
+        _link(path, dest)
+        logging.info("Using {} from the artifact store".format(os.path.basename(dest)))
+        return
+    except (IOError, OSError):
+        # not in the store, or evicted in the meantime
+        pass
+    _insert(url, sha256, size)
+    _link(path, dest)
+
+
+def evict(keep=None, max_size=None):
+    '''Remove the least recently used files until the store is under max_size (ARTIFACT_STORE_MAX_SIZE by default)
+
+    keep is never removed.'''
+    if max_size is None:
+        max_size = ARTIFACT_STORE_MAX_SIZE
+    artifacts = []
+    total_size = 0
+    for (dirpath, dirnames, filenames) in os.walk(ARTIFACT_STORE_DIR):
+        for filename in filenames:
+            if filename.startswith("."):
+                continue
+            path = os.path.join(dirpath, filename)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            artifacts.append((stat.st_mtime, stat.st_size, path))
+            total_size += stat.st_size
+    for (mtime, size, path) in sorted(artifacts):
+        if total_size <= max_size:
+            break
+        if path == keep:
+            continue
+        logging.debug("Evicting {} from the artifact store".format(path))
+        with ignored(OSError):
+            os.remove(path)
+        total_size -= size
+
+
+def download_source(urls):
+    '''Download all files of a source package from urls in the current directory
+
+    Files listed in the .dsc are fetched concurrently through the store, anything else is downloaded directly.'''
+    filenames = dict((url, urllib.unquote(url.split('/')[-1])) for url in urls)
+    checksums = {}
+    for url in urls:
+        if filenames[url].endswith(".dsc"):
+            with open(filenames[url], 'w+b') as f:
+                downloader.download(url, f)
+            checksums.update(get_dsc_checksums(filenames[url]))
+
+    def fetch_file(url):
+        filename = filenames[url]
+        if filename in checksums:
+            (sha256, size) = checksums[filename]
+            fetch(url, filename, sha256, size)
+        else:
+            logging.debug("No checksum for {}, downloading it outside of the artifact store".format(filename))
+            with open(filename, 'w+b') as f:
+                downloader.download(url, f)
+    concurrent_map(fetch_file, [url for url in urls if not filenames[url].endswith(".dsc")], DOWNLOAD_WORKERS)
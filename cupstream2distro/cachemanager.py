@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2014 Canonical
+#
+# Authors:
+#  Didier Roche
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+import hashlib
+import json
+import logging
+import os
+import time
+
+from .settings import COMMON_CACHE_DIR
+from .utils import ignored
+
+
+def _get_entry_path(namespace, key_repr):
+    '''Return the file path storing key_repr in namespace'''
+    key_hash = hashlib.sha1(key_repr.encode('utf-8')).hexdigest()
+    return os.path.join(COMMON_CACHE_DIR, namespace, key_hash[:2], key_hash)
+
+
+def _get_key_repr(key):
+    '''Return a stable string representation of key (any json serializable object)'''
+    return json.dumps(key, sort_keys=True)
+
+
+def load(namespace, key):
+    '''Return the cached value for key in namespace
+
+    Raise KeyError if there is no such entry or if it expired'''
+    key_repr = _get_key_repr(key)
+    entry_path = _get_entry_path(namespace, key_repr)
+    try:
+        with open(entry_path) as f:
+            entry = json.load(f)
+    except (IOError, ValueError):
+        raise KeyError(key_repr)
+
+    # protect against hash collisions
+    if entry.get("key") != key_repr:
+        raise KeyError(key_repr)
+    if entry["expires"] < time.time():
+        with ignored(OSError):
+            os.remove(entry_path)
+        raise KeyError(key_repr)
+    logging.debug("Cache hit in {} for {}".format(namespace, key_repr))
+    return entry["value"]
+
+
+def save(namespace, key, value, ttl):
+    '''Save value for key in namespace for ttl seconds
+
+    Return False if the entry couldn't be saved, the cache is only an optimization.'''
+    key_repr = _get_key_repr(key)
+    entry_path = _get_entry_path(namespace, key_repr)
+    with ignored(OSError):
+        os.makedirs(os.path.dirname(entry_path))
+    # multiple scripts can write the same entry at the same time, rename is atomic
+    new_file = "{}.{}.new".format(entry_path, os.getpid())
+    try:
+        with open(new_file, 'w') as f:
+            json.dump({"key": key_repr, "expires": time.time() + ttl, "value": value}, f)
+        os.rename(new_file, entry_path)
+    except (IOError, OSError, TypeError) as e:
+        logging.warning("Can't save cache entry for {}: {}".format(key_repr, e))
+        with ignored(OSError):
+            os.remove(new_file)
+        return False
+    return True
+
+
+def invalidate(namespace, key):
+    '''Remove any cached value for key in namespace'''
+    with ignored(OSError):
+        os.remove(_get_entry_path(namespace, _get_key_repr(key)))
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2014 Canonical
+#
+# Authors:
+#  Didier Roche
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+import os
+import re
+import threading
+
+from .settings import REV_STRING_FORMAT
+
+_header_regexp = re.compile("^(\S+) \(([^)]+)\) ([^;]+);(.*)$")
+_urgency_regexp = re.compile("urgency=(\S+)", re.IGNORECASE)
+_trailer_regexp = re.compile("^ -- (.*?)(?:  (.*))?$")
+_snapshot_regexp = re.compile("{} (\d+)(?: \(ppa:([^)]*)\))?".format(REV_STRING_FORMAT))
+# matching only bug format that launchpad accepts
+_group_bugs_regexp = re.compile("lp: ?(.*\d{5,})", re.IGNORECASE)
+_bug_decipher_regexp = re.compile("#(\d{5,})")
+
+# parsed changelogs: {path: ((mtime, size, inode), [entries])}
+_index = {}
+_index_lock = threading.Lock()
+
+
+class ChangelogEntry(object):
+    '''One upload in a debian/changelog
+
+    start and end are the byte offsets of the entry, from its header to its trailer line included.
+    snapshot_revs are the (revision, ppa) snapshot markers in their order, ppa being None for distro markers.'''
+
+    def __init__(self, package, version, distribution, urgency, start):
+        self.package = package
+        self.version = version
+        self.distribution = distribution
+        self.urgency = urgency
+        self.maintainer = None
+        self.date = None
+        self.snapshot_revs = []
+        self.bugs = set()
+        self.start = start
+        self.end = start
+
+    @property
+    def released(self):
+        return not self.distribution.startswith("UNRELEASED")
+
+    def __repr__(self):
+        return "<ChangelogEntry {} ({}) {}>".format(self.package, self.version, self.distribution)
+
+
+def parse(f, first_only=False):
+    '''Return the entries of the changelog file object f, newest first, in one pass
+
+    If first_only, stop reading after the first trailer line.'''
+    entries = []
+    entry = None
+    offset = 0
+    # a snapshot marker can be wrapped in the middle of the ppa name
+    pending_marker = None
+    for line in f:
+        line_start = offset
+        offset += len(line)
+        line = line.rstrip("\n")
+
+        header = _header_regexp.match(line)
+        if header and first_only and entries:
+            break
+        if header:
+            (package, version, distribution, options) = header.groups()
+            urgency = _urgency_regexp.search(options)
+            entry = ChangelogEntry(package, version, distribution.strip(), urgency.group(1) if urgency else None,
+                                   line_start)
+            entries.append(entry)
+            pending_marker = None
+        if not entry:
+            continue
+        if line.strip():
+            entry.end = offset
+        if header:
+            continue
+
+        if line.startswith(" -- "):
+            trailer = _trailer_regexp.match(line)
+            if trailer:
+                (entry.maintainer, entry.date) = trailer.groups()
+            if first_only:
+                break
+            pending_marker = None
+            continue
+
+        if pending_marker:
+            line = pending_marker + line.strip()
+            pending_marker = None
+        marker_start = line.rfind(REV_STRING_FORMAT)
+        if marker_start >= 0 and "(ppa:" in line[marker_start:] and ")" not in line[marker_start:]:
+            # incomplete marker, read it with the next line
+            (line, pending_marker) = (line[:marker_start], line[marker_start:])
+        for (rev, ppa) in _snapshot_regexp.findall(line):
+            entry.snapshot_revs.append((int(rev), ppa or None))
+        for grouped_bugs in _group_bugs_regexp.findall(line):
+            entry.bugs.update(_bug_decipher_regexp.findall(grouped_bugs))
+    return entries
+
+
+def get_entries(f):
+    '''Return the entries of changelog file object f, newest first
+
+    The index is kept per file path until the file changes, so that every reader of the same changelog
+    only parses it once.'''
+    path = getattr(f, "name", None)
+    try:
+        stat = os.fstat(f.fileno())
+    except (AttributeError, IOError, OSError, ValueError):
+        return parse(f)
+    path = os.path.abspath(path)
+    signature = (stat.st_mtime, stat.st_size, stat.st_ino)
+    with _index_lock:
+        try:
+            (cached_signature, entries) = _index[path]
+            if cached_signature == signature:
+                return entries
+        except KeyError:
+            pass
+    entries = parse(f)
+    with _index_lock:
+        _index[path] = (signature, entries)
+    return entries
+
+
+def read_top_entry(f):
+    '''Return the top entry of changelog file object f, only reading up to its trailer line
+
+    Return None if the top entry isn't in a format we know about.'''
+    entries = parse(f, first_only=True)
+    if not entries or not entries[0].date:
+        return None
+    return entries[0]
+
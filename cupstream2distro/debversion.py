@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2014 Canonical
+#
+# Authors:
+#  Didier Roche
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+'''Debian version ordering, as done by dpkg --compare-versions, without forking dpkg'''
+
+import re
+
+from .settings import VERSION_CACHE_SIZE
+from .utils import lru_cache
+
+_part_regexp = re.compile(r"(\D*)(\d*)")
+
+
+def parse(version):
+    '''Return (epoch, upstream, revision) of version
+
+    Raise ValueError on versions dpkg refuses to compare'''
+    version = version.strip()
+    if re.search(r"\s", version):
+        raise ValueError("version '{}' has embedded spaces".format(version))
+    (epoch, colon, rest) = version.partition(":")
+    if colon:
+        if not epoch:
+            raise ValueError("epoch in version '{}' is empty".format(version))
+        if not epoch.isdigit():
+            raise ValueError("epoch in version '{}' is not number".format(version))
+        if not rest:
+            raise ValueError("nothing after colon in version '{}'".format(version))
+        epoch = int(epoch)
+    else:
+        (epoch, rest) = (0, version)
+    (upstream, hyphen, revision) = rest.rpartition("-")
+    if not hyphen:
+        (upstream, revision) = (rest, "")
+    elif not revision:
+        raise ValueError("revision number of version '{}' is empty".format(version))
+    if not upstream and (colon or hyphen):
+        raise ValueError("version number of version '{}' is empty".format(version))
+    return (epoch, upstream, revision)
+
+
+def _order(char):
+    '''Weight of a non digit char: ~ sorts before everything, even the end of the part, then letters, then others'''
+    if char == "~":
+        return -1
+    if char.isalpha():
+        return ord(char)
+    return ord(char) + 256
+
+
+def _part_key(part):
+    '''Return a key sorting upstream or revision parts as dpkg does
+
+    The part is a list of (non digits, number) chunks, the non digits being ordered by _order() and
+    terminated by 0 (the weight of the end of the string). A missing chunk is the same than ((0,), 0), which
+    is thus stripped from the end and appended once as a terminator, so that "1" sorts after "1~".'''
+    chunks = [(tuple(_order(char) for char in letters) + (0,), int(digits or 0))
+              for (letters, digits) in _part_regexp.findall(part) if letters or digits]
+    empty = ((0,), 0)
+    # the first chunk is kept even if empty so that a terminator can only match another terminator
+    if not chunks:
+        chunks = [empty]
+    while len(chunks) > 1 and chunks[-1] == empty:
+        chunks.pop()
+    chunks.append(empty)
+    return tuple(chunks)
+
+
+@lru_cache(VERSION_CACHE_SIZE)
+def sort_key(version):
+    '''Return a key to sort versions in Debian order
+
+    An empty version (not installed) sorts before any other one.'''
+    if not version:
+        return (-1,)
+    (epoch, upstream, revision) = parse(version)
+    return (epoch, _part_key(upstream), _part_key(revision))
+
+
+def compare(version1, version2):
+    '''Return a negative, zero or positive number if version1 is lower, equal or higher than version2'''
+    return cmp(sort_key(version1), sort_key(version2))
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2014 Canonical
+#
+# Authors:
+#  Didier Roche
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+'''Download files over pooled keep-alive connections, resuming interrupted transfers and checking them as they arrive'''
+
+from contextlib import contextmanager
+import hashlib
+import httplib
+import logging
+import random
+import socket
+import threading
+import time
+import urllib
+import urlparse
+
+from .settings import (DOWNLOAD_TIMEOUT, DOWNLOAD_MAX_RETRIES, DOWNLOAD_MAX_REDIRECTS, DOWNLOAD_BACKOFF_BASE,
+                       DOWNLOAD_BACKOFF_MAX)
+
+_CHUNK_SIZE = 1024 * 1024
+_REDIRECT_STATUS = (301, 302, 303, 307, 308)
+
+
+class ConnectionPool(object):
+    '''Idle http connections per host, reused by the next request to the same host from any thread'''
+
+    def __init__(self):
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self, scheme, netloc):
+        '''Yield a connection to netloc, given back to the pool unless the request failed'''
+        key = (scheme, netloc)
+        with self._lock:
+            connections = self._idle.get(key)
+            connection = connections.pop() if connections else None
+        if connection is None:
+            connection_class = httplib.HTTPSConnection if scheme == "https" else httplib.HTTPConnection
+            connection = connection_class(netloc, timeout=DOWNLOAD_TIMEOUT)
+        try:
+            yield connection
+        except:
+            connection.close()
+            raise
+        with self._lock:
+            self._idle.setdefault(key, []).append(connection)
+
+    def clear(self):
+        '''Close all idle connections'''
+        with self._lock:
+            for connections in self._idle.values():
+                for connection in connections:
+                    connection.close()
+            self._idle.clear()
+
+
+_pool = ConnectionPool()
+
+
+class _Transfer(object):
+    '''Content written to a file object, hashed as it arrives'''
+
+    def __init__(self, f):
+        self.f = f
+        self.digest = hashlib.sha256()
+        # resume after what the file already contains
+        f.seek(0)
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+            self.digest.update(chunk)
+        self.size = f.tell()
+
+    def reset(self):
+        self.f.seek(0)
+        self.f.truncate()
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    def write(self, chunk):
+        self.f.write(chunk)
+        self.digest.update(chunk)
+        self.size += len(chunk)
+
+    def copy_from(self, response):
+        for chunk in iter(lambda: response.read(_CHUNK_SIZE), b''):
+            self.write(chunk)
+
+
+def _fetch_http(url, transfer, size):
+    '''Write url content from transfer.size on, following redirections'''
+    for redirect in range(DOWNLOAD_MAX_REDIRECTS + 1):
+        parsed_url = urlparse.urlsplit(url)
+        path = parsed_url.path or "/"
+        if parsed_url.query:
+            path = "{}?{}".format(path, parsed_url.query)
+        headers = {}
+        if transfer.size:
+            headers["Range"] = "bytes={}-".format(transfer.size)
+        with _pool.connection(parsed_url.scheme, parsed_url.netloc) as connection:
+            connection.request("GET", path, headers=headers)
+            response = connection.getresponse()
+            if response.status in _REDIRECT_STATUS:
+                response.read()
+                url = urlparse.urljoin(url, response.getheader("location"))
+                continue
+            if response.status == 416:
+                response.read()
+                if transfer.size == size:
+                    # we already have everything, the checksum will tell if it's the right content
+                    return
+                transfer.reset()
+                raise httplib.HTTPException("Can't resume {}, starting over".format(url))
+            if response.status == 200 and transfer.size:
+                logging.debug("{} doesn't support resuming downloads, starting over".format(parsed_url.netloc))
+                transfer.reset()
+            elif response.status not in (200, 206):
+                response.read()
+                raise httplib.HTTPException("{} returned http status {}".format(url, response.status))
+            start = transfer.size
+            transfer.copy_from(response)
+            # httplib doesn't complain about an interrupted body, it only returns less content
+            content_length = response.getheader("content-length")
+            if content_length is not None and transfer.size - start < int(content_length):
+                raise httplib.HTTPException("connection closed after {} bytes".format(transfer.size))
+            if response.will_close:
+                connection.close()
+            return
+    raise httplib.HTTPException("Too many redirections for {}".format(url))
+
+
+def _fetch(url, transfer, size):
+    if urlparse.urlsplit(url).scheme in ("http", "https"):
+        _fetch_http(url, transfer, size)
+    else:
+        # local files
+        transfer.reset()
+        response = urllib.urlopen(url)
+        try:
+            transfer.copy_from(response)
+        finally:
+            response.close()
+
+
+def download(url, f, sha256=None, size=None):
+    '''Download url at the end of file object f, resuming after what it already contains
+
+    The content is checked against sha256 and size if provided. Interrupted transfers are resumed, with a jittered
+    exponential backoff. f is emptied before raising an Exception if the content doesn't match.'''
+    transfer = _Transfer(f)
+    attempt = 0
+    while True:
+        try:
+            _fetch(url, transfer, size)
+            if size is None or transfer.size >= size:
+                break
+            error = "got {} bytes out of {}".format(transfer.size, size)
+        except (httplib.HTTPException, socket.error, IOError) as e:  # socket.error includes socket.timeout
+            error = e
+        if attempt >= DOWNLOAD_MAX_RETRIES:
+            raise IOError("Couldn't download {}: {}".format(url, error))
+        delay = random.uniform(0, min(DOWNLOAD_BACKOFF_MAX, DOWNLOAD_BACKOFF_BASE * 2 ** attempt))
+        logging.warning("Download of {} interrupted ({}), resuming in {:.1f}s".format(url, error, delay))
+        time.sleep(delay)
+        attempt += 1
+    f.flush()
+
+    if (size is not None and transfer.size != size) or (sha256 is not None and transfer.digest.hexdigest() != sha256):
+        transfer.reset()
+        raise Exception("{} doesn't match the checksum listed in the source package".format(url))
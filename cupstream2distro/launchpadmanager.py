@@ -20,51 +20,375 @@
 
 from __future__ import unicode_literals
 
-from launchpadlib.launchpad import Launchpad
+import collections
+from contextlib import contextmanager
+import atexit
+import json
 import lazr
 import logging
 import os
+import Queue
+import random
+import socket
+import threading
+import time
+import urllib
+import urlparse
 launchpad = None
+_login_options = {}
 
-from .settings import ARCHS_TO_EVENTUALLY_IGNORE, ARCHS_TO_UNCONDITIONALLY_IGNORE, VIRTUALIZED_PPA_ARCH, CRED_FILE_PATH, COMMON_LAUNCHPAD_CACHE_DIR
+# pool of additional launchpad sessions, one per concurrent thread. _local.launchpad is the session bound to the current thread
+_session_pool = Queue.Queue()
+_session_pool_lock = threading.Lock()
+_session_count = 0
+_local = threading.local()
+
+# parsed service descriptions, shared by all sessions: {wadl url: wadllib Application}
+_wadl_applications = {}
+_wadl_lock = threading.Lock()
+
+# launchpad requests made by this process, per API method: {method: {"calls", "pages", "time", "bytes", "errors"}}
+_api_stats = {}
+_api_stats_lock = threading.Lock()
+
+# per session caches of launchpad objects: {(session id, self_link): resource} and {(session id, kind, names…): resource}
+# only the LAUNCHPAD_RESOURCE_CACHE_SIZE last loaded ones are kept in each
+_resources = collections.OrderedDict()
+_named_resources = collections.OrderedDict()
+_resources_lock = threading.Lock()
+
+from . import cachemanager, ratelimiter
+from .settings import ARCHS_TO_EVENTUALLY_IGNORE, ARCHS_TO_UNCONDITIONALLY_IGNORE, VIRTUALIZED_PPA_ARCH, CRED_FILE_PATH, COMMON_LAUNCHPAD_CACHE_DIR, LAUNCHPAD_PAGE_SIZE, LAUNCHPAD_MEMOIZED_RESOURCE_TYPES, LAUNCHPAD_RESOURCE_CACHE_SIZE, LAUNCHPAD_SESSIONS, LAUNCHPAD_STATS_FILENAME_FORMAT, LAUNCHPAD_MAX_RETRIES, LAUNCHPAD_BACKOFF_BASE, LAUNCHPAD_BACKOFF_MAX, LAUNCHPAD_RETRY_STATUS, LAUNCHPAD_IDEMPOTENT_METHODS, LAUNCHPAD_UNSAFE_RETRY_STATUS, LAUNCHPAD_WADL_CACHE_NAMESPACE, LAUNCHPAD_WADL_CACHE_TTL, LAUNCHPAD_SERVICE_ROOT_ENV, SERIES_ARCHS_CACHE_NAMESPACE, SERIES_ARCHS_CACHE_TTL, BUG_TITLE_CACHE_NAMESPACE, BUG_TITLE_CACHE_TTL, BUG_TITLE_WORKERS
+from .utils import concurrent_map, ignored
 
 
 def get_launchpad(use_staging=False, use_cred_file=os.path.expanduser(CRED_FILE_PATH)):
-    '''Get THE Launchpad'''
+    '''Get THE Launchpad
+
+    Return the session bound to the current thread if we are running inside launchpad_session()'''
     global launchpad
+    session = getattr(_local, "launchpad", None)
+    if session:
+        return session
     if not launchpad:
-        if use_staging:
-            server = 'staging'
-        else:
-            server = 'production'
+        _login_options.update(use_staging=use_staging, use_cred_file=use_cred_file)
 
         # as launchpadlib isn't multiproc, fiddling the cache dir if any
         launchpadlib_dir = os.getenv("JOB_NAME")
         if launchpadlib_dir:
             launchpadlib_dir = os.path.join(COMMON_LAUNCHPAD_CACHE_DIR, launchpadlib_dir)
 
-        if use_cred_file:
-            launchpad = Launchpad.login_with('cupstream2distro', server, allow_access_levels=["WRITE_PRIVATE"],
-                                             version='devel',  # devel because copyPackage is only available there
-                                             credentials_file=use_cred_file,
-                                             launchpadlib_dir=launchpadlib_dir)
-        else:
-            launchpad = Launchpad.login_with('cupstream2distro', server, allow_access_levels=["WRITE_PRIVATE"],
-                                             version='devel',  # devel because copyPackage is only available there
-                                             launchpadlib_dir=launchpadlib_dir)
+        launchpad = _login(launchpadlib_dir, use_staging, use_cred_file)
 
     return launchpad
 
 
+def _login(launchpadlib_dir, use_staging, use_cred_file):
+    '''Return a new authenticated Launchpad instance, using launchpadlib_dir as cache
+
+    If the cached service description doesn't match the service anymore, it's fetched again from launchpad.'''
+    from lazr.restfulclient.errors import HTTPError
+    _install_wadl_cache()
+    try:
+        return _login_with_service_description(launchpadlib_dir, use_staging, use_cred_file)
+    except (HTTPError, socket.error):
+        raise
+    except Exception as e:
+        logging.warning("Can't login with the cached launchpad service description, fetching it again: {}".format(e))
+        forget_wadl()
+        return _login_with_service_description(launchpadlib_dir, use_staging, use_cred_file)
+
+
+def _login_with_service_description(launchpadlib_dir, use_staging, use_cred_file):
+    '''Return a new authenticated Launchpad instance, using launchpadlib_dir as cache'''
+    from launchpadlib.launchpad import Launchpad
+    if use_staging:
+        server = 'staging'
+    else:
+        server = 'production'
+
+    service_root = os.getenv(LAUNCHPAD_SERVICE_ROOT_ENV)
+    if service_root:
+        # local stand-in server, there is nobody to authenticate against
+        lp = Launchpad.login_anonymously('cupstream2distro', service_root, version='devel',
+                                         launchpadlib_dir=launchpadlib_dir)
+    elif use_cred_file:
+        lp = Launchpad.login_with('cupstream2distro', server, allow_access_levels=["WRITE_PRIVATE"],
+                                  version='devel',  # devel because copyPackage is only available there
+                                  credentials_file=use_cred_file,
+                                  launchpadlib_dir=launchpadlib_dir)
+    else:
+        lp = Launchpad.login_with('cupstream2distro', server, allow_access_levels=["WRITE_PRIVATE"],
+                                  version='devel',  # devel because copyPackage is only available there
+                                  launchpadlib_dir=launchpadlib_dir)
+    _instrument(lp)
+    _rate_limit(lp)
+    return lp
+
+
+def _install_wadl_cache():
+    '''Make launchpadlib get the service description from our cache
+
+    Parsing the WADL (and fetching it, even if it's only to be told it didn't change) is most of the login time.
+    The markup is kept in the common cache, and parsed only once per process. It's keyed on the service root and
+    the description url, and fetched again if it can't be parsed.'''
+    from lazr.restfulclient._browser import Browser
+    if getattr(Browser.get_wadl_application, "cached", False):
+        return
+
+    def get_wadl_application(browser, url):
+        from wadllib.application import Application
+        url = str(url)
+        with _wadl_lock:
+            try:
+                return _wadl_applications[url]
+            except KeyError:
+                pass
+            cache_key = _get_wadl_cache_key(url)
+            application = None
+            with ignored(KeyError):
+                markup = cachemanager.load(LAUNCHPAD_WADL_CACHE_NAMESPACE, cache_key).encode("utf-8")
+                try:
+                    application = Application(url, markup)
+                except Exception as e:
+                    logging.warning("Can't parse the cached launchpad service description, fetching it again: "
+                                    "{}".format(e))
+                    cachemanager.invalidate(LAUNCHPAD_WADL_CACHE_NAMESPACE, cache_key)
+            if not application:
+                # the http cache of launchpadlib ensures we only download it again if the service revision changed
+                (response, markup) = browser._request(url, media_type="application/vnd.sun.wadl+xml")
+                if not isinstance(markup, bytes):
+                    markup = markup.encode("utf-8")
+                application = Application(url, markup)
+                cachemanager.save(LAUNCHPAD_WADL_CACHE_NAMESPACE, cache_key, markup.decode("utf-8"),
+                                  LAUNCHPAD_WADL_CACHE_TTL)
+            _wadl_applications[url] = application
+            return application
+    get_wadl_application.cached = True
+    Browser.get_wadl_application = get_wadl_application
+
+
+def _get_wadl_cache_key(url):
+    '''Return the common cache key of the service description at url'''
+    return [os.getenv(LAUNCHPAD_SERVICE_ROOT_ENV) or urlparse.urlsplit(url).netloc, url]
+
+
+def forget_wadl():
+    '''Forget the cached service descriptions, to get them again from launchpad on next login'''
+    with _wadl_lock:
+        for url in _wadl_applications.keys():
+            cachemanager.invalidate(LAUNCHPAD_WADL_CACHE_NAMESPACE, _get_wadl_cache_key(url))
+        _wadl_applications.clear()
+
+
+def _get_api_method(url, data, method):
+    '''Return the API method name (named operation like getPublishedSources or plain http method) and if it's a follow-up page'''
+    params = dict(urlparse.parse_qsl(urlparse.urlsplit(url).query))
+    # named POST operations (like copyPackage) pass their parameters in the body
+    if method == "POST" and isinstance(data, basestring):
+        with ignored(ValueError):
+            params.update(urlparse.parse_qsl(data))
+    return (params.get("ws.op", method), "ws.start" in params)
+
+
+def record_api_call(api_method, duration, size=0, next_page=False, error=False):
+    '''Record one launchpad request for api_method'''
+    with _api_stats_lock:
+        stats = _api_stats.setdefault(api_method, {"calls": 0, "pages": 0, "time": 0.0, "bytes": 0, "errors": 0})
+        if not next_page:
+            stats["calls"] += 1
+        stats["pages"] += 1
+        stats["time"] += duration
+        stats["bytes"] += size
+        if error:
+            stats["errors"] += 1
+
+
+def _instrument(lp):
+    '''Record every http request made by this Launchpad instance'''
+    browser = lp._browser
+    request = browser._request
+
+    def instrumented_request(url, data=None, method="GET", *args, **kwargs):
+        (api_method, next_page) = _get_api_method(str(url), data, method)
+        start = time.time()
+        try:
+            (response, content) = request(url, data, method, *args, **kwargs)
+        except:
+            record_api_call(api_method, time.time() - start, next_page=next_page, error=True)
+            raise
+        size = len(content) if isinstance(content, basestring) else 0
+        record_api_call(api_method, time.time() - start, size, next_page)
+        return (response, content)
+
+    browser._request = instrumented_request
+
+
+def _rate_limit(lp):
+    '''Make every http request of this Launchpad instance go through the host wide rate limiter
+
+    Server errors and timeouts of GET and HEAD requests are retried with a jittered exponential backoff,
+    replacing launchpadlib own retries on 502 and 503 (fixed delays, which makes all jobs retry at once).
+    Other requests are only retried on 502 and 503, like launchpadlib did.'''
+    browser = lp._browser
+    request = browser._connection.request
+    browser.max_retries = 0
+
+    def rate_limited_request(uri, method="GET", *args, **kwargs):
+        idempotent = method in LAUNCHPAD_IDEMPOTENT_METHODS
+        retry_status = LAUNCHPAD_RETRY_STATUS if idempotent else LAUNCHPAD_UNSAFE_RETRY_STATUS
+        attempt = 0
+        while True:
+            ratelimiter.acquire()
+            try:
+                (response, content) = request(uri, method, *args, **kwargs)
+                if response.status not in retry_status or attempt >= LAUNCHPAD_MAX_RETRIES:
+                    return (response, content)
+                error = "http status {}".format(response.status)
+            except socket.error as e:  # includes socket.timeout
+                if not idempotent or attempt >= LAUNCHPAD_MAX_RETRIES:
+                    raise
+                error = e
+            ratelimiter.report_throttled()
+            delay = random.uniform(0, min(LAUNCHPAD_BACKOFF_MAX, LAUNCHPAD_BACKOFF_BASE * 2 ** attempt))
+            logging.warning("Launchpad request failed ({}), retrying in {:.1f}s".format(error, delay))
+            time.sleep(delay)
+            attempt += 1
+
+    browser._connection.request = rate_limited_request
+
+
+def get_api_stats():
+    '''Return a summary of launchpad requests made by this process'''
+    with _api_stats_lock:
+        methods = dict((api_method, stats.copy()) for (api_method, stats) in _api_stats.items())
+    total = {"calls": 0, "pages": 0, "time": 0.0, "bytes": 0, "errors": 0}
+    for stats in methods.values():
+        for key in total:
+            total[key] += stats[key]
+    return {"total": total, "methods": methods}
+
+
+def clear_api_stats():
+    '''Forget the launchpad requests made so far by this process'''
+    with _api_stats_lock:
+        _api_stats.clear()
+
+
+def write_api_stats(filename):
+    '''Write the summary of launchpad requests made by this process in filename, as json'''
+    stats = get_api_stats()
+    logging.info("{} launchpad requests ({} pages, {} bytes) in {:.1f}s".format(stats["total"]["calls"], stats["total"]["pages"],
+                                                                          stats["total"]["bytes"], stats["total"]["time"]))
+    new_filename = "{}.new".format(filename)
+    with open(new_filename, 'w') as f:
+        json.dump(stats, f, indent=4, sort_keys=True)
+    os.rename(new_filename, filename)
+
+
+def write_api_stats_at_exit(script_name):
+    '''Write launchpad requests stats as an artefact of script_name in current dir once we exit'''
+    atexit.register(write_api_stats, os.path.abspath(LAUNCHPAD_STATS_FILENAME_FORMAT.format(script_name)))
+
+
+def _new_session():
+    '''Create a new pooled session, with its own cache directory
+
+    Return None if we already reached LAUNCHPAD_SESSIONS'''
+    global _session_count
+    with _session_pool_lock:
+        if _session_count >= LAUNCHPAD_SESSIONS:
+            return None
+        _session_count += 1
+        session_num = _session_count
+    # launchpadlib cache isn't safe to share between instances
+    launchpadlib_dir = os.path.join(COMMON_LAUNCHPAD_CACHE_DIR, os.getenv("JOB_NAME", "cupstream2distro"),
+                                    "session{}".format(session_num))
+    logging.debug("Opening launchpad session {}".format(session_num))
+    try:
+        return _login(launchpadlib_dir, _login_options.get("use_staging", False),
+                      _login_options.get("use_cred_file", os.path.expanduser(CRED_FILE_PATH)))
+    except Exception:
+        # nobody would ever put that session back in the pool
+        with _session_pool_lock:
+            _session_count -= 1
+        raise
+
+
+@contextmanager
+def launchpad_session():
+    '''Bind a pooled Launchpad session to the current thread for the duration of the context
+
+    launchpadlib objects aren't thread safe: each thread doing launchpad requests needs its own session,
+    and should only use objects loaded from it (see get_resource_from_token).
+    Block if all LAUNCHPAD_SESSIONS sessions are in use.'''
+    previous_session = getattr(_local, "launchpad", None)
+    try:
+        session = _session_pool.get_nowait()
+    except Queue.Empty:
+        session = _new_session()
+        if not session:
+            session = _session_pool.get()
+    _local.launchpad = session
+    try:
+        yield session
+    finally:
+        _local.launchpad = previous_session
+        _session_pool.put(session)
+
+
+def map_with_sessions(func, items, workers=LAUNCHPAD_SESSIONS):
+    '''Return [func(item) for item in items], running them in workers threads each having its own Launchpad session
+
+    The first exception raised by func is raised back once all items are processed.
+    Items are processed serially when called from a thread already holding a session.'''
+    items = list(items)
+    # nested calls from a worker thread would wait forever on sessions held by their parents
+    if min(workers, len(items)) <= 1 or getattr(_local, "launchpad", None):
+        return [func(item) for item in items]
+
+    # ensure the main session (and the login options for pooled sessions) is initialized before any thread starts
+    get_launchpad()
+
+    def call_in_session(item):
+        with launchpad_session():
+            return func(item)
+    return concurrent_map(call_in_session, items, workers)
+
+
+def _get_session_key():
+    '''Return a key identifying the session in use in the current thread'''
+    return id(get_launchpad())
+
+
+def _remember(cache, key, resource):
+    '''Keep resource in cache for key, forgetting the oldest ones over LAUNCHPAD_RESOURCE_CACHE_SIZE'''
+    with _resources_lock:
+        cache.pop(key, None)
+        cache[key] = resource
+        while len(cache) > LAUNCHPAD_RESOURCE_CACHE_SIZE:
+            cache.popitem(last=False)
+
+
+def _get_named_resource(key, loader):
+    '''Return the resource for key, calling loader() only the first time it's requested'''
+    key = (_get_session_key(),) + key
+    try:
+        return _named_resources[key]
+    except KeyError:
+        resource = loader()
+        _remember(_named_resources, key, resource)
+        return resource
+
+
 def get_distribution(name):
     '''Get the given distribution, e.g. ubuntu'''
-    lp = get_launchpad()
-    return lp.distributions[name]
+    return _get_named_resource(("distribution", name), lambda: get_launchpad().distributions[name])
 
 
 def get_distribution_archive(name):
     '''Get the archive for the given distribution'''
-    return get_distribution(name).main_archive
+    return _get_named_resource(("archive", name), lambda: get_distribution(name).main_archive)
 
 
 def get_ubuntu():
@@ -74,50 +398,88 @@ def get_ubuntu():
 
 def get_ubuntu_archive():
     '''Get the ubuntu main archive'''
-    return get_ubuntu().main_archive
+    return get_distribution_archive('ubuntu')
 
 
 def get_series(series_name, distribution='ubuntu'):
     '''Return the launchpad object for the requested series'''
-    return get_distribution(distribution).getSeries(name_or_version=series_name)
+    return _get_named_resource(("series", distribution, series_name),
+                               lambda: get_distribution(distribution).getSeries(name_or_version=series_name))
 
 
 def get_bugs_titles(author_bugs):
-    lp = get_launchpad()
+    '''Return {author: set of "title (LP: #bug)"} for {author: bugs}
+
+    Titles are fetched concurrently and kept in the common cache as they rarely change'''
+    all_bugs = set(bug for bugs in author_bugs.values() for bug in bugs)
+    titles = {}
+    for bug in all_bugs:
+        with ignored(KeyError):
+            titles[bug] = cachemanager.load(BUG_TITLE_CACHE_NAMESPACE, unicode(bug))
+
+    def get_bug_title(bug):
+        try:
+            return get_launchpad().bugs[bug].title
+        except KeyError:
+            # still list non existing or if launchpad timeouts bugs
+            return None
+
+    bugs_to_fetch = [bug for bug in all_bugs if bug not in titles]
+    for (bug, title) in zip(bugs_to_fetch, map_with_sessions(get_bug_title, bugs_to_fetch, workers=BUG_TITLE_WORKERS)):
+        titles[bug] = title
+        if title is not None:
+            cachemanager.save(BUG_TITLE_CACHE_NAMESPACE, unicode(bug), title, BUG_TITLE_CACHE_TTL)
+
     author_bugs_with_title = author_bugs.copy()
     for author in author_bugs:
         bug_title_sets = set()
         for bug in author_bugs[author]:
-            try:
-                bug_title_sets.add("{} (LP: #{})".format(lp.bugs[bug].title, bug))
-            except KeyError:
-                # still list non existing or if launchpad timeouts bugs
+            if titles[bug] is None:
                 bug_title_sets.add(u"Fix LP: #{}".format(bug))
+            else:
+                bug_title_sets.add("{} (LP: #{})".format(titles[bug], bug))
         author_bugs_with_title[author] = bug_title_sets
 
     return author_bugs_with_title
 
 
 def open_bugs_for_source(bugs_list, source_name, series_name, distribution_name='ubuntu'):
-    lp = get_launchpad()
-    distro = get_distribution(distribution_name)
 
-    # don't nominate for current series
-    if distro.current_series.name == series_name:
-        package = distro.getSourcePackage(name=source_name)
-    else:
-        series = get_series(series_name, distribution_name)
-        package = series.getSourcePackage(name=source_name)
+    def get_package():
+        distro = get_distribution(distribution_name)
+        # don't nominate for current series
+        if distro.current_series.name == series_name:
+            return distro.getSourcePackage(name=source_name)
+        return get_series(series_name, distribution_name).getSourcePackage(name=source_name)
 
-    for bug_num in bugs_list:
+    def open_bug(bug_num):
         try:
-            bug = lp.bugs[bug_num]
+            # the package is looked up once in the session of each worker
+            package = _get_named_resource(("source_package", distribution_name, series_name, source_name),
+                                          get_package)
+            bug = get_launchpad().bugs[bug_num]
             bug.addTask(target=package)
             bug.lp_save()
         except (KeyError, lazr.restfulclient.errors.BadRequest, lazr.restfulclient.errors.ServerError):
             # ignore non existing or available bugs
             logging.info("Can't synchronize upstream/downstream bugs for bug #{}. Not blocking on that.".format(bug_num))
 
+    map_with_sessions(open_bug, bugs_list)
+
+
+def _get_series_archs(series):
+    '''Return [(arch tag, is nominated arch indep)] for all series archs
+
+    Those barely change, so they are kept in the common cache'''
+    series_link = getattr(series, "self_link", None)
+    if isinstance(series_link, basestring):
+        with ignored(KeyError):
+            return cachemanager.load(SERIES_ARCHS_CACHE_NAMESPACE, series_link)
+    archs = [(arch.architecture_tag, arch.is_nominated_arch_indep) for arch in series.architectures]
+    if isinstance(series_link, basestring):
+        cachemanager.save(SERIES_ARCHS_CACHE_NAMESPACE, series_link, archs, SERIES_ARCHS_CACHE_TTL)
+    return archs
+
 
 def get_available_all_and_ignored_archs(series, ppa=None):
     '''Return a set of available archs, the all arch and finally the archs we can eventually ignored if nothing is published in dest'''
@@ -126,19 +488,24 @@ def get_available_all_and_ignored_archs(series, ppa=None):
         available_arch = set(VIRTUALIZED_PPA_ARCH)
         arch_all_arch = VIRTUALIZED_PPA_ARCH[0]
     else:
-        for arch in series.architectures:
+        for (arch_tag, is_nominated_arch_indep) in _get_series_archs(series):
             # HACK: filters armel as it's still seen as available on raring: https://launchpad.net/bugs/1077257
-            if arch.architecture_tag == "armel":
+            if arch_tag == "armel":
                 continue
-            available_arch.add(arch.architecture_tag)
-            if arch.is_nominated_arch_indep:
-                arch_all_arch = arch.architecture_tag
+            available_arch.add(arch_tag)
+            if is_nominated_arch_indep:
+                arch_all_arch = arch_tag
 
     return (available_arch, arch_all_arch, ARCHS_TO_EVENTUALLY_IGNORE, ARCHS_TO_UNCONDITIONALLY_IGNORE)
 
 
 def get_ppa(ppa_name):
     '''Return a launchpad ppa'''
+    return _get_named_resource(("ppa", ppa_name), lambda: _load_ppa(ppa_name))
+
+
+def _load_ppa(ppa_name):
+    '''Load a launchpad ppa from its name'''
     ppa_dispatch = ppa_name.split("/")
 
     # we still need to handle the case of PPAs that follow the old alias, defaulting to ubuntu
@@ -160,16 +527,109 @@ def get_resource_from_url(url):
     return lp.load(url)
 
 def get_resource_from_token(url):
-    '''Return a lp resource from a launchpad token'''
+    '''Return a lp resource from a launchpad token
+
+    Resources of LAUNCHPAD_MEMOIZED_RESOURCE_TYPES, which don't change while we use them, are only loaded once
+    per session. Others (merge proposals, branches, publications…) are loaded on each call.'''
+    session_key = _get_session_key()
+    try:
+        return _resources[(session_key, url)]
+    except KeyError:
+        pass
     lp = get_launchpad()
-    return lp.load(url)
+    resource = lp.load(url)
+    resource_type = getattr(resource, "resource_type_link", "").split("#")[-1]
+    if resource_type not in LAUNCHPAD_MEMOIZED_RESOURCE_TYPES:
+        return resource
+    _remember(_resources, (session_key, url), resource)
+    # share the same object whatever link was used to get it
+    self_link = getattr(resource, "self_link", None)
+    if self_link:
+        _remember(_resources, (session_key, self_link), resource)
+    return resource
+
+def in_current_session(resource):
+    '''Return resource as loaded from the session of the current thread
+
+    launchpadlib objects can't be shared between threads: resources from another session are loaded again
+    (once per session).'''
+    if resource is None or getattr(resource, "_root", None) is get_launchpad():
+        return resource
+    return get_resource_from_token(resource.self_link)
+
+def forget_resource(url):
+    '''Forget a cached lp resource in every session so that it's loaded again on next request'''
+    links = set([url])
+    for (key, resource) in _resources.items():
+        if key[1] == url:
+            self_link = getattr(resource, "self_link", None)
+            if self_link:
+                links.add(self_link)
+    with _resources_lock:
+        for key in _resources.keys():
+            if key[1] in links:
+                _resources.pop(key, None)
+        for key in _named_resources.keys():
+            if key[1:] == ("is_dest_distro_archive", url):
+                _named_resources.pop(key, None)
+
+def clear_resources():
+    '''Forget every cached lp resource in every session, so that long running processes don't keep them forever'''
+    with _resources_lock:
+        _resources.clear()
+        _named_resources.clear()
 
 def is_dest_distro_archive(series_link):
     '''return if series_link is the given distribution's main archive'''
-    archive = get_resource_from_token(series_link)
-    return archive.distribution.main_archive_link == series_link
+    def _is_dest_distro_archive():
+        archive = get_resource_from_token(series_link)
+        return archive.distribution.main_archive_link == series_link
+    return _get_named_resource(("is_dest_distro_archive", series_link), _is_dest_distro_archive)
 
 def get_person(nickname):
     '''Return a launchpad person'''
     lp = get_launchpad()
     return lp.people[nickname]
+
+
+def to_date_param(date):
+    '''Return a launchpad date as a request parameter'''
+    try:
+        return date.isoformat()
+    except AttributeError:
+        return date
+
+
+def _with_page_size(url, page_size):
+    '''Return the collection url, requesting pages of page_size entries'''
+    (scheme, netloc, path, query, fragment) = urlparse.urlsplit(url)
+    params = [(key, value) for (key, value) in urlparse.parse_qsl(query, keep_blank_values=True) if key != "ws.size"]
+    params.append(("ws.size", str(page_size)))
+    return urlparse.urlunsplit((scheme, netloc, path, urllib.urlencode(params), fragment))
+
+
+def get_all_entries(collection, page_size=LAUNCHPAD_PAGE_SIZE):
+    '''Iterate over all entries of a launchpad collection
+
+    launchpadlib follows the server default batch size (75 entries), ask for pages of page_size entries instead
+    to reduce the number of round trips on big collections. The first page of a named operation result is
+    already fetched by launchpadlib, at the default size: only the following ones are bigger.'''
+    from lazr.restfulclient.resource import Collection
+    if not isinstance(collection, Collection):
+        for entry in collection:
+            yield entry
+        return
+
+    def get_page(url):
+        return json.loads(collection._root._browser.get(_with_page_size(str(url), page_size)))
+
+    page = collection._wadl_resource.representation
+    if page is None:
+        page = get_page(collection._wadl_resource.url)
+    while True:
+        for entry in collection._convert_dicts_to_entries(page.get("entries", [])):
+            yield entry
+        next_link = page.get("next_collection_link")
+        if not next_link:
+            break
+        page = get_page(next_link)
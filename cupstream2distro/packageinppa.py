@@ -21,7 +21,14 @@ import logging
 import os
 import re
 
+import launchpadmanager
 import packagemanager
+import pollscheduler
+
+
+def get_arch_tag(binary):
+    '''Return the arch tag of a binary publication, without fetching its distro arch series'''
+    return binary.distro_arch_series_link.rstrip('/').split('/')[-1]
 
 
 class PackageInPPA():
@@ -30,17 +37,24 @@ class PackageInPPA():
 
     def __init__(self, source_name, version, ppa, destarchive, series,
                  available_archs_in_ppa, arch_all_arch, archs_to_eventually_ignore,
-                 archs_to_unconditionually_ignore):
+                 archs_to_unconditionually_ignore, workdir="."):
         self.source_name = source_name
         self.version = version
         self.series = series
         self.arch_all_arch = arch_all_arch
         self.ppa = ppa
+        # directory with the .dsc and the arch .ignore files of the package
+        self.workdir = workdir
         self.current_status = {}
+        # {arch: timestamp} when builds still in progress are expected to complete (None if we can't tell)
+        self.build_etas = {}
+        self._build_durations_recorded = set()
+        # archs which reached a terminal state, we don't look at their binaries and builds anymore
+        self._published_archs = set()
 
         # Get archs we should look at
         version_for_source_file = version.split(':')[-1]
-        dsc_filename = "{}_{}.dsc".format(source_name, version_for_source_file)
+        dsc_filename = os.path.join(workdir, "{}_{}.dsc".format(source_name, version_for_source_file))
         regexp = re.compile("^Architecture: (.*)\n")
         for line in open(dsc_filename):
             arch_lists = regexp.findall(line)
@@ -59,19 +73,8 @@ class PackageInPPA():
         # ignore some eventual archs if doesn't exist in latest published version in dest
         archs_to_eventually_ignore = archs_to_eventually_ignore.copy()
         if archs_to_eventually_ignore:
-            try:
-                source_collection = destarchive.getPublishedSources(exact_match=True, source_name=self.source_name,
-                                                                    distro_series=self.series, status="Published")
-                previous_source = packagemanager.sort_by_date_created(source_collection)[0]
-                for binary in previous_source.getPublishedBinaries():
-                    if binary.architecture_specific and binary.distro_arch_series.architecture_tag in archs_to_eventually_ignore:
-                        archs_to_eventually_ignore -= set([binary.distro_arch_series.architecture_tag])
-                    if not archs_to_eventually_ignore:
-                        break
-
-            except IndexError:
-                # no package in dest, don't wait on any archs_to_eventually_ignore
-                pass
+            # only wait on those archs if the latest version in dest was built on them (none if no package in dest)
+            archs_to_eventually_ignore -= packagemanager.get_archs_built_in_dest(self.source_name, self.series, destarchive)
             # remove from the inspection remaining archs to ignore
             if archs_to_eventually_ignore:
                 self.archs -= archs_to_eventually_ignore
@@ -79,12 +82,14 @@ class PackageInPPA():
                 self.archs -= archs_to_unconditionually_ignore
 
 
-    def get_status(self, on_particular_arch=None):
+    def get_status(self, on_particular_arch=None, sweep=None):
         '''Look at the package status in the ppa
 
-        Can scope to a particular arch to watch for'''
+        Can scope to a particular arch to watch for. sweep is the {source publication link: (binaries, builds)}
+        of the whole ppa from packageinppamanager.sweep_ppa_status(), to avoid querying launchpad for this package
+        only.'''
 
-        self._refresh_status()
+        self._refresh_status(sweep)
         if not self.current_status:
             return None
 
@@ -110,11 +115,37 @@ class PackageInPPA():
         # if it's not None, not BUILDING, nor FAILED, it's PUBLISHED
         return self.PUBLISHED
 
+    def get_build_etas(self, on_particular_arch=None):
+        '''Return when the builds still in progress are expected to complete, as of the last status refresh
+
+        The list contains a timestamp per arch still building, or None if we can't tell.'''
+        if not self.current_status:
+            # the source isn't even published
+            return [None]
+        return [self.build_etas.get(arch) for (arch, status) in self.current_status.items()
+                if status == self.BUILDING and (not on_particular_arch or arch == on_particular_arch)]
+
+    def _get_published_binaries(self, archs):
+        '''Return the published binaries of the source which can settle archs
+
+        When only one arch is left, only the binaries published on it since the source was created are listed
+        instead of all binaries of the source.'''
+        if not archs:
+            return []
+        if len(archs) > 1:
+            return launchpadmanager.in_current_session(self.source).getPublishedBinaries()
+        ppa = launchpadmanager.in_current_session(self.ppa)
+        binaries = ppa.getPublishedBinaries(distro_arch_series="{}/{}".format(self.series.self_link, list(archs)[0]),
+                                            created_since_date=launchpadmanager.to_date_param(self.source.date_created),
+                                            status="Published", order_by_date=True)
+        return [binary for binary in launchpadmanager.get_all_entries(binaries)
+                if binary.source_package_name == self.source_name and binary.source_package_version == self.version]
+
     def _refresh_archs_skipped(self):
         '''Refresh archs that we should skip for this build'''
 
         for arch in self.archs.copy():
-            if os.path.isfile("{}.{}.ignore".format(self.source_name, arch)):
+            if os.path.isfile(os.path.join(self.workdir, "{}.{}.ignore".format(self.source_name, arch))):
                 logging.warning("Request to ignore {} on {}.".format(self.source_name, arch))
                 try:
                     self.archs.remove(arch)
@@ -125,7 +156,7 @@ class PackageInPPA():
                 except KeyError:
                     pass
 
-    def _refresh_status(self):
+    def _refresh_status(self, sweep=None):
         '''Refresh status from the ppa'''
 
         self._refresh_archs_skipped()
@@ -135,7 +166,7 @@ class PackageInPPA():
             (self.current_status, self.source) = self._get_status_for_source_package_in_ppa()
         # check the binary status
         if self.current_status:
-            self.current_status = self._get_status_for_binary_packages_in_ppa()
+            self.current_status = self._get_status_for_binary_packages_in_ppa(sweep)
 
     def _get_status_for_source_package_in_ppa(self):
         '''Return current_status for source package in ppa.
@@ -150,16 +181,20 @@ class PackageInPPA():
             for the others.'''
 
         try:
-            source = packagemanager.sort_by_date_created(self.ppa.getPublishedSources(exact_match=True, source_name=self.source_name, version=self.version, distro_series=self.series))[0]
-            logging.info("Source available in ppa")
-            current_status = {}
-            for arch in self.archs:
-                current_status[arch] = self.BUILDING
-            return (current_status, source)
-        except (KeyError, IndexError):
+            source = packagemanager.get_published_source(self.source_name, self.version,
+                                                         launchpadmanager.in_current_session(self.series),
+                                                         launchpadmanager.in_current_session(self.ppa))
+        except KeyError:
+            source = None
+        if not source:
             return ({}, None)
+        logging.info("Source available in ppa")
+        current_status = {}
+        for arch in self.archs:
+            current_status[arch] = self.BUILDING
+        return (current_status, source)
 
-    def _get_status_for_binary_packages_in_ppa(self):
+    def _get_status_for_binary_packages_in_ppa(self, sweep=None):
         '''Return current status for package in ppa
 
         The status is dict (if not None) with {arch: status} and can be:
@@ -171,39 +206,63 @@ class PackageInPPA():
             Only the 3 last statuses are returned by this call. See _get_status_for_source_package_in_ppa
             for the other.'''
 
-        # Try to see if all binaries availables for this arch are built, including arch:all on other archs
+        # archs whose binaries were published in a previous check are settled
         status = self.current_status
-        for binary in self.source.getPublishedBinaries():
+        for arch in self._published_archs:
+            status[arch] = self.PUBLISHED
+        unresolved_archs = set(arch for arch in self.archs if status.get(arch) == self.BUILDING)
+
+        (binaries, builds) = (None, None)
+        if sweep is not None:
+            (binaries, builds) = sweep.get(self.source.self_link, (None, None))
+        if binaries is None:
+            binaries = self._get_published_binaries(unresolved_archs)
+
+        # Try to see if all binaries availables for this arch are built, including arch:all on other archs
+        for binary in binaries:
             # all binaries for an arch are published at the same time
             # launchpad is lying, it's telling that archs not in the ppa are built (for arch:all). Even for non supported arch!
             # for instance, we can have the case of self.arch_all_arch (arch:all), built before the others and amd64 will be built for it
-            if binary.status == "Published" and (binary.distro_arch_series.architecture_tag == self.arch_all_arch or
-               (binary.distro_arch_series.architecture_tag != self.arch_all_arch and binary.architecture_specific)):
-                status[binary.distro_arch_series.architecture_tag] = self.PUBLISHED
+            arch = get_arch_tag(binary)
+            if binary.status == "Published" and (arch == self.arch_all_arch or
+               (arch != self.arch_all_arch and binary.architecture_specific)):
+                status[arch] = self.PUBLISHED
+                self._published_archs.add(arch)
 
-        # Looking for builds on archs still BUILDING (just loop on builds once to avoid too many lp requests)
-        needs_checking_build = False
+        # Looking for builds on archs still BUILDING or FAILED, as a failed build can be retried (just loop on builds once
+        # to avoid too many lp requests)
         build_state_failed = ('Failed to build', 'Chroot problem', 'Failed to upload', 'Cancelled build', 'Build for superseded Source')
-        for arch in self.archs:
-            if self.current_status[arch] == self.BUILDING:
-                needs_checking_build = True
-        if needs_checking_build:
-            for build in self.source.getBuilds():
+        if any(self.current_status[arch] in (self.BUILDING, self.FAILED) for arch in self.archs):
+            if builds is None:
+                builds = launchpadmanager.in_current_session(self.source).getBuilds()
+            for build in builds:
                 # ignored archs
                 if not build.arch_tag in self.current_status:
                     continue
+                if self.current_status[build.arch_tag] == self.FAILED:
+                    if build.buildstate in build_state_failed:
+                        continue
+                    logging.info("{}: Build {} ({}) was retried".format(build.arch_tag, build.title, build.web_link))
+                    status[build.arch_tag] = self.BUILDING
                 if self.current_status[build.arch_tag] == self.BUILDING:
                     if build.buildstate in build_state_failed:
                         logging.error("{}: Build {} ({}) failed because of {}".format(build.arch_tag, build.title,
                                                                                        build.web_link, build.buildstate))
                         status[build.arch_tag] = self.FAILED
+                        continue
                     # Another launchpad trick: if a binary arch was published, but then is superseeded, getPublishedBinaries() won't list
                     # those binaries anymore. So it's seen as BUILDING again.
                     # If there is a successful build record of it and the source is superseded, it means that it built fine at some point,
                     # Another arch will fail as superseeded.
                     # We don't just retain the old state of "PUBLISHED" because maybe we started the script with that situation already
-                    elif build.buildstate not in build_state_failed and self.source.status == "Superseded":
+                    if self.source.status == "Superseded":
                         status[build.arch_tag] = self.PUBLISHED
+                        self._published_archs.add(build.arch_tag)
+                        continue
+                    if build.buildstate == 'Successfully built' and build.arch_tag not in self._build_durations_recorded:
+                        pollscheduler.record_build_duration(self.source_name, build)
+                        self._build_durations_recorded.add(build.arch_tag)
+                    self.build_etas[build.arch_tag] = pollscheduler.get_build_eta(self.source_name, build)
 
         # There is no way to know if there are some arch:all packages (and there are not in publishedBinaries for this arch until
         # it's built on arch_all_arch). So mark all arch to BUILDING if self.arch_all_arch is building or FAILED if it failed.
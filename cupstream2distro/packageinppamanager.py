@@ -22,9 +22,11 @@ import logging
 import os
 import re
 
+from . import launchpadmanager, packagemanager
 from .branchhandling import _get_parent_branch
-from .packageinppa import PackageInPPA
-from .settings import PROJECT_CONFIG_SUFFIX
+from .packageinppa import PackageInPPA, get_arch_tag
+from .settings import PPA_STATUS_WORKERS, PROJECT_CONFIG_SUFFIX
+from .utils import emit_logs, held_logs
 
 
 def _ensure_removed_from_set(target_set, content_to_remove):
@@ -68,12 +70,80 @@ def get_packages_and_versions_uploaded():
     return result
 
 
-def update_all_packages_status(packages_not_in_ppa, packages_building, packages_failed, particular_arch=None):
-    '''Update all packages status, checking in the ppa'''
-
-    for current_package in (packages_not_in_ppa.union(packages_building)):
-        logging.info("current_package: " + current_package.source_name + " " + current_package.version)
-        package_status = current_package.get_status(particular_arch)
+def sweep_ppa_status(packages):
+    '''Fetch the source publications, published binaries and builds of all packages at once, per ppa and series
+
+    Return {source publication link: (binaries, builds)} for the packages whose source is published. Their
+    get_status() can answer from it, instead of querying the ppa for every package. Only binaries and builds
+    created after the oldest of those sources are fetched.'''
+    packages_per_ppa = {}
+    for package in packages:
+        packages_per_ppa.setdefault((package.ppa.self_link, package.series.self_link), []).append(package)
+
+    sweep = {}
+    for packages in packages_per_ppa.values():
+        # the packages may have been loaded from another session
+        ppa = launchpadmanager.in_current_session(packages[0].ppa)
+        series = launchpadmanager.in_current_session(packages[0].series)
+        index = packagemanager.index_published_sources(ppa, series)
+        sources = {}
+        for package in packages:
+            for source in index.get(package.source_name, []):
+                if source.source_package_version == package.version:
+                    sources[(package.source_name, package.version)] = source
+                    break
+        if not sources:
+            continue
+        since = min(source.date_created for source in sources.values())
+        source_links = set(source.self_link for source in sources.values())
+        for source in sources.values():
+            sweep[source.self_link] = ([], [])
+
+        series_prefix = series.self_link.rstrip('/') + '/'
+        for binary in launchpadmanager.get_all_entries(ppa.getPublishedBinaries(
+                status="Published", created_since_date=launchpadmanager.to_date_param(since), order_by_date=True)):
+            source = sources.get((binary.source_package_name, binary.source_package_version))
+            if source and binary.distro_arch_series_link.startswith(series_prefix):
+                sweep[source.self_link][0].append(binary)
+        for build in launchpadmanager.get_all_entries(ppa.getBuildRecords()):
+            if build.current_source_publication_link in source_links:
+                sweep[build.current_source_publication_link][1].append(build)
+            # builds are listed newest first (unfinished ones first): finished builds before since are older
+            # than all our sources
+            elif build.datebuilt and build.datebuilt < since:
+                break
+        logging.debug("Swept builds and binaries of {} sources in {}".format(len(sources), ppa.self_link))
+    return sweep
+
+
+def update_all_packages_status(packages_not_in_ppa, packages_building, packages_failed, particular_arch=None,
+                               workers=PPA_STATUS_WORKERS, sweep=None):
+    '''Update all packages status, checking in the ppa
+
+    The ppa is swept once for all packages, see sweep_ppa_status(), unless a sweep covering them is given.
+    Statuses are then refreshed in up to workers threads. Logs of each package are kept together and the sets
+    are updated in the same package order, whatever the order in which refreshes complete.'''
+
+    packages = sorted(packages_not_in_ppa.union(packages_building), key=lambda package: (package.source_name,
+                                                                                          package.version))
+    if sweep is None:
+        sweep = sweep_ppa_status(packages)
+
+    def refresh_status(package):
+        with held_logs() as records:
+            try:
+                logging.info("current_package: " + package.source_name + " " + package.version)
+                return (package.get_status(particular_arch, sweep), records, None)
+            except Exception as e:
+                return (None, records, e)
+
+    errors = []
+    for (current_package, (package_status, records, error)) in zip(packages, launchpadmanager.map_with_sessions(
+            refresh_status, packages, workers)):
+        emit_logs(records)
+        if error:
+            errors.append(error)
+            continue
         if package_status != None:  # global package_status can be 0 (building), 1 (failed), 2 (published)
             # if one arch building, still considered as building
             if package_status == PackageInPPA.BUILDING:
@@ -87,6 +157,8 @@ def update_all_packages_status(packages_not_in_ppa, packages_building, packages_
             elif package_status == PackageInPPA.PUBLISHED:
                 _ensure_removed_from_set(packages_building, current_package)  # in case we missed the "build" step
                 _ensure_removed_from_set(packages_not_in_ppa, current_package)  # in case we missed the "wait" step
+    if errors:
+        raise errors[0]
 
 
 def _get_current_packaging_version_from_config(source_package_name):
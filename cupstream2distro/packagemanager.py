@@ -21,6 +21,7 @@
 
 import datetime
 import fileinput
+import hashlib
 import logging
 from operator import attrgetter
 import os
@@ -28,14 +29,23 @@ import re
 import shutil
 import sys
 import subprocess
-import urllib
 import socket
 
+import artifactstore
+import cachemanager
+import changelogmanager
+import debversion
 import launchpadmanager
 import settings
+import sourcediff
+import sourcepackage
+import sourcetree
 from .utils import ignored
 import silomanager
 
+# snapshots of published sources: {(archive_link, series_link): {source_name: [publications, newest first]}}
+_published_sources_index = {}
+
 
 def sort_by_date_created(sources, all_packages=False):
     # we also filter out any non-published or not-pending packages by default
@@ -46,26 +56,216 @@ def sort_by_date_created(sources, all_packages=False):
     return sorted(filtered_sources, key=attrgetter("date_created"), reverse=True)
 
 
+def get_latest_by_date_created(sources, all_packages=False):
+    '''Return the most recent source (Published or Pending by default), None if there is none
+
+    Unlike sort_by_date_created()[0], sources are only walked once and never kept in memory.'''
+    latest = None
+    for source in sources:
+        if not all_packages and source.status not in ("Published", "Pending"):
+            continue
+        if latest is None or source.date_created > latest.date_created:
+            latest = source
+    return latest
+
+
+def _get_source_and_version(record):
+    '''Return (source, version) of a (source, version) tuple or a source publication'''
+    try:
+        return (record.source_package_name, record.source_package_version)
+    except AttributeError:
+        return record
+
+
+def get_highest_versions(records):
+    '''Return {source: highest version} of records
+
+    records are (source, version) tuples or source publications. They are compared on their precomputed
+    version keys in one pass. Invalid versions are skipped.'''
+    highest = {}
+    for record in records:
+        (source, version) = _get_source_and_version(record)
+        try:
+            key = debversion.sort_key(version)
+        except ValueError as e:
+            logging.warning("Ignoring {} {}: {}".format(source, version, e))
+            continue
+        if source not in highest or key > highest[source][0]:
+            highest[source] = (key, version)
+    return dict((source, version) for (source, (key, version)) in highest.items())
+
+
+def get_sorted_versions(records):
+    '''Return {source: [versions, highest first]} of records, without duplicates
+
+    records are (source, version) tuples or source publications. Invalid versions are skipped.'''
+    versions = {}
+    for record in records:
+        (source, version) = _get_source_and_version(record)
+        try:
+            key = debversion.sort_key(version)
+        except ValueError as e:
+            logging.warning("Ignoring {} {}: {}".format(source, version, e))
+            continue
+        versions.setdefault(source, {})[version] = key
+    return dict((source, sorted(source_versions, key=source_versions.get, reverse=True))
+                for (source, source_versions) in versions.items())
+
+
+def index_published_sources(archive, series):
+    '''Fetch once all Published and Pending sources of archive in series and index them by source name
+
+    Return the {source_name: [publications, newest first]} index. get_current_version_for_series,
+    is_version_for_series_in_dest and get_published_source will answer from it instead of querying
+    launchpad for every package, until the index is refreshed by calling this function again.'''
+    logging.debug("Indexing all published sources of {} in {}".format(archive.self_link, series.self_link))
+    publications = []
+    for status in ("Published", "Pending"):
+        publications.extend(launchpadmanager.get_all_entries(archive.getPublishedSources(distro_series=series, status=status)))
+    index = {}
+    for publication in sort_by_date_created(publications):
+        index.setdefault(publication.source_package_name, []).append(publication)
+    _published_sources_index[(archive.self_link, series.self_link)] = index
+    return index
+
+
+def clear_published_sources_index():
+    '''Forget every indexed archive'''
+    _published_sources_index.clear()
+
+
+def _get_indexed_publications(archive, series, source_package_name):
+    '''Return indexed publications for source_package_name, newest first
+
+    Raise KeyError if archive in series wasn't indexed'''
+    index = _published_sources_index[(archive.self_link, series.self_link)]
+    return index.get(source_package_name, [])
+
+
+def _get_publication_cache_key(archive, series, source_package_name, version=None, pocket=None, status=None):
+    '''Return the common cache key for a getPublishedSources request
+
+    None if the archive or series don't have any stable link to build it'''
+    archive_link = getattr(archive, "self_link", None)
+    series_link = getattr(series, "self_link", None)
+    if not isinstance(archive_link, basestring) or not isinstance(series_link, basestring):
+        return None
+    return [archive_link, series_link, source_package_name, version, pocket, status]
+
+
+def _load_cached_publication(cache_key):
+    '''Return the cached publication answer for cache_key. Raise KeyError if not available'''
+    if not cache_key:
+        raise KeyError(cache_key)
+    return cachemanager.load(settings.PUBLICATION_CACHE_NAMESPACE, cache_key)
+
+
+def _cache_publication(cache_key, value, status):
+    '''Cache a publication answer for cache_key, with a ttl depending on the publication status'''
+    if not cache_key:
+        return
+    ttl = settings.PUBLICATION_CACHE_TTL.get(status, settings.PUBLICATION_CACHE_DEFAULT_TTL)
+    cachemanager.save(settings.PUBLICATION_CACHE_NAMESPACE, cache_key, value, ttl)
+
+
+def get_archs_built_in_dest(source_package_name, series, dest):
+    '''Return the set of archs for which the latest published version of source in dest has arch specific binaries
+
+    The set is empty if there is no such source in dest'''
+    cache_key = _get_publication_cache_key(dest, series, source_package_name)
+    if cache_key:
+        with ignored(KeyError):
+            return set(cachemanager.load(settings.DEST_ARCHS_CACHE_NAMESPACE, cache_key))
+
+    try:
+        publications = _get_indexed_publications(dest, series, source_package_name)
+    except KeyError:
+        publications = [get_latest_by_date_created(dest.getPublishedSources(exact_match=True,
+                                                                            source_name=source_package_name,
+                                                                            distro_series=series, status="Published"))]
+    publications = [publication for publication in publications if publication and publication.status == "Published"]
+
+    archs = set()
+    if publications:
+        for binary in launchpadmanager.get_all_entries(publications[0].getPublishedBinaries()):
+            if binary.architecture_specific:
+                archs.add(binary.distro_arch_series.architecture_tag)
+    if cache_key:
+        cachemanager.save(settings.DEST_ARCHS_CACHE_NAMESPACE, cache_key, sorted(archs), settings.DEST_ARCHS_CACHE_TTL)
+    return archs
+
+
 def get_current_version_for_series(source_package_name, series_name, ppa_name=None, dest=None):
-    '''Get current version for a package name in that series'''
+    '''Get current version for a package name in that series
+
+    The latest version changes on any upload or copy, it's only answered from the index of the current process,
+    never from the common cache.'''
     if not dest:
         if ppa_name:
             dest = launchpadmanager.get_ppa(ppa_name)
         else:
             dest = launchpadmanager.get_ubuntu_archive()
     series = launchpadmanager.get_series(series_name, dest.distribution.name)
-    source_collection = dest.getPublishedSources(exact_match=True, source_name=source_package_name, distro_series=series)
     try:
-        return sort_by_date_created(source_collection)[0].source_package_version
-    # was never in the dest, set the lowest possible version
+        return _get_indexed_publications(dest, series, source_package_name)[0].source_package_version
     except IndexError:
         return "0"
+    except KeyError:
+        pass
+    source_collection = dest.getPublishedSources(exact_match=True, source_name=source_package_name, distro_series=series)
+    source = get_latest_by_date_created(source_collection)
+    # was never in the dest, set the lowest possible version
+    if not source:
+        return "0"
+    return source.source_package_version
 
 
 def is_version_for_series_in_dest(source_package_name, version, series, dest, pocket="Release"):
     '''Return if version for a package name in that series is in dest'''
-    return dest.getPublishedSources(exact_match=True, source_name=source_package_name, version=version,
-                                    distro_series=series, pocket=pocket).total_size > 0
+    # the index only contains active publications, we still need to query the history if not found
+    with ignored(KeyError):
+        for publication in _get_indexed_publications(dest, series, source_package_name):
+            if publication.source_package_version == version and publication.pocket == pocket:
+                return True
+    cache_key = _get_publication_cache_key(dest, series, source_package_name, version, pocket)
+    try:
+        return _load_cached_publication(cache_key)
+    except KeyError:
+        pass
+    in_dest = dest.getPublishedSources(exact_match=True, source_name=source_package_name, version=version,
+                                       distro_series=series, pocket=pocket).total_size > 0
+    # once a version was published, it stays in the publishing history, while it can be copied anytime otherwise
+    if in_dest:
+        _cache_publication(cache_key, in_dest, "Published")
+    return in_dest
+
+
+def get_published_source(source_package_name, version, series, dest):
+    '''Return the most recent Published or Pending source publication of version in dest
+
+    None if this version isn't visible in dest yet'''
+    with ignored(KeyError):
+        for publication in _get_indexed_publications(dest, series, source_package_name):
+            if publication.source_package_version == version:
+                return publication
+    cache_key = _get_publication_cache_key(dest, series, source_package_name, version)
+    try:
+        source_link = _load_cached_publication(cache_key)
+        if not source_link:
+            return None
+        # the publication status changes while we watch it, always get a fresh one
+        launchpadmanager.forget_resource(source_link)
+        return launchpadmanager.get_resource_from_token(source_link)
+    except KeyError:
+        pass
+    source = get_latest_by_date_created(dest.getPublishedSources(exact_match=True, source_name=source_package_name,
+                                                                 version=version, distro_series=series))
+    if not source:
+        _cache_publication(cache_key, None, None)
+        return None
+    _cache_publication(cache_key, source.self_link, source.status)
+    return source
+
 
 def is_version_in_queue(source_package_name, version, dest_serie, queue):
     '''Return if version for a package name in that series is in dest'''
@@ -75,7 +275,11 @@ def is_version_in_queue(source_package_name, version, dest_serie, queue):
 
 def is_version1_higher_than_version2(version1, version2):
     '''return if version1 is higher than version2'''
-    return (subprocess.call(["dpkg", "--compare-versions", version1, 'gt', version2], stdout=subprocess.PIPE, stderr=subprocess.PIPE) == 0)
+    try:
+        return debversion.compare(version1, version2) > 0
+    except ValueError as e:
+        logging.warning("Can't compare {} and {}: {}".format(version1, version2, e))
+        return False
 
 
 def is_version_in_changelog(version, f):
@@ -84,9 +288,8 @@ def is_version_in_changelog(version, f):
     if version == "0":
         return True
 
-    desired_changelog_line = re.compile("\({}\) (?!UNRELEASED).*\; urgency=".format(version.replace('+', '\+')))
-    for line in f.readlines():
-        if desired_changelog_line.search(line):
+    for entry in changelogmanager.get_entries(f):
+        if entry.version == version and entry.released:
             return True
 
     return False
@@ -96,56 +299,17 @@ def get_latest_upstream_bzr_rev(f, dest_ppa=None):
     '''Report latest bzr rev in the file
 
     If dest_ppa, first try to fetch the dest ppa tag. Otherwise, fallback to first distro version'''
-    distro_regex = re.compile("{} (\d+)".format(settings.REV_STRING_FORMAT))
-    destppa_regexp = re.compile("{} (\d+) \(ppa:{}\)".format(settings.REV_STRING_FORMAT, dest_ppa))
-    distro_rev = None
-    candidate_destppa_rev = None
-    candidate_distro_rev = None
-    destppa_element_found = False
-
-    # handle marker spread on two lines
-    end_of_line_regexp = re.compile(" *(.*\))")
-    previous_line = None
-
-    for line in f:
-        line = line[:-1]
-
-        if previous_line:
-            try:
-                line = previous_line + end_of_line_regexp.findall(line)[0]
-            except IndexError:
-                None
-            previous_line = None
-
-        if dest_ppa:
-            try:
-                candidate_destppa_rev = int(destppa_regexp.findall(line)[0])
-                destppa_element_found = True
-            except IndexError:
-                destppa_element_found = False
-        if not distro_rev and not destppa_element_found and not "(ppa:" in line:
-            try:
-                candidate_distro_rev = int(distro_regex.findall(line)[0])
-                distro_element_found = True
-            except IndexError:
-                distro_element_found = False
-
-        # try to catchup next line if we have a marker start without anything found
-        if settings.REV_STRING_FORMAT in line and (dest_ppa and not destppa_element_found) and not distro_element_found:
-            previous_line = line
-
-        if line.startswith(" -- "):
-            # first grab the dest ppa
-            if candidate_destppa_rev:
-                return candidate_destppa_rev
-            if not distro_rev and candidate_distro_rev:
-                distro_rev = candidate_distro_rev
-            if not dest_ppa and distro_rev:
-                return distro_rev
-
-    # we didn't find any dest ppa result but there is a distro_rev one
-    if dest_ppa and distro_rev:
-        return distro_rev
+    entries = changelogmanager.get_entries(f)
+    if dest_ppa:
+        for entry in entries:
+            revs = [rev for (rev, ppa) in entry.snapshot_revs if ppa == dest_ppa]
+            if revs:
+                return revs[-1]
+
+    for entry in entries:
+        revs = [rev for (rev, ppa) in entry.snapshot_revs if not ppa]
+        if revs:
+            return revs[-1]
 
     # we force a bootstrap commit for new components
     return 0
@@ -160,19 +324,32 @@ def list_packages_info_in_str(packages_set):
     return " ".join(results)
 
 
-def get_packaging_version():
-    '''Get current packaging version'''
+def _get_top_changelog_field(field, description):
+    '''Return field (Source or Version) of the top debian/changelog entry
+
+    The entry is read in process, dpkg-parsechangelog is only used for formats we don't know about (and errors).'''
+    with ignored(IOError):
+        with open(os.path.join("debian", "changelog")) as f:
+            entry = changelogmanager.read_top_entry(f)
+        if entry:
+            return {"Source": entry.package, "Version": entry.version}[field]
+
     instance = subprocess.Popen(["dpkg-parsechangelog"], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
     (stdout, stderr) = instance.communicate()
     if instance.returncode != 0:
         raise Exception(stderr.decode("utf-8").strip())
-    expr = re.compile("Version: (.*)")
+    expr = re.compile("{}: (.*)".format(field))
     for line in stdout.splitlines():
-        packaging_version = expr.findall(line)
-        if packaging_version:
-            return packaging_version[0]
+        value = expr.findall(line)
+        if value:
+            return value[0]
+
+    raise Exception("Didn't find any {} in the package: {}".format(description, stdout))
+
 
-    raise Exception("Didn't find any Version in the package: {}".format(stdout))
+def get_packaging_version():
+    '''Get current packaging version'''
+    return _get_top_changelog_field("Version", "Version")
 
 def get_upstream_version(version, remove_epoch=True):
     """Return upstream version"""
@@ -185,9 +362,11 @@ def get_upstream_version(version, remove_epoch=True):
     return '-'.join(splitted_version)
 
 
-def get_source_package_from_dest(source_package_name, dest_archive, dest_current_version, series_name, download_dir='ubuntu'):
+def get_source_package_from_dest(source_package_name, dest_archive, dest_current_version, series_name, download_dir='ubuntu', extract=True):
     '''Download and return a path containing a checkout of the current dest version.
 
+    If not extract, and if the source package can be read without extracting it, that path only contains
+    debian/control and debian/changelog, the content manifest of the whole tree being next to it.
     None if this package was never published to dest archive'''
 
     if dest_current_version == "0":
@@ -201,30 +380,88 @@ def get_source_package_from_dest(source_package_name, dest_archive, dest_current
         os.makedirs(source_package_download_dir)
     os.chdir(source_package_download_dir)
 
-    try:
-        sourcepkg = sort_by_date_created(dest_archive.getPublishedSources(exact_match=True, source_name=source_package_name, distro_series=series, version=dest_current_version), True)[0]
-    except IndexError:
+    sourcepkg = get_latest_by_date_created(dest_archive.getPublishedSources(exact_match=True, source_name=source_package_name, distro_series=series, version=dest_current_version), True)
+    if not sourcepkg:
         raise Exception("Couldn't get in the destination the expected version")
     logging.info('Downloading %s version %s', source_package_name, dest_current_version)
-    for url in sourcepkg.sourceFileUrls():
-        urllib.urlretrieve(url, urllib.unquote(url.split('/')[-1]))
-    instance = subprocess.Popen("dpkg-source -x *dsc", shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    (stdout, stderr) = instance.communicate()
-    if instance.returncode != 0:
-        raise Exception(stderr.decode("utf-8").strip())
+    artifactstore.download_source(sourcepkg.sourceFileUrls())
 
-    # check the dir exist
     splitted_version = dest_current_version.split(':')[-1].split('-')  # remove epoch is there is one
     if len(splitted_version) > 1:
         splitted_version = splitted_version[:-1]  # we don't want the ubuntu or debian version (it's not in the source package name)
     version_for_source_file = '-'.join(splitted_version)
     source_directory_name = "{}-{}".format(source_package_name, version_for_source_file)
-    if not os.path.isdir(source_directory_name):
-        raise Exception("We tried to download and check that the directory {} is present, but it's not the case".format(source_directory_name))
+    dsc_path = "{}_{}.dsc".format(source_package_name, dest_current_version.split(':')[-1])
+
+    if extract or not _write_source_without_extracting(dsc_path, source_directory_name):
+        # a previous run may have only written part of the tree
+        with ignored(OSError):
+            shutil.rmtree(source_directory_name)
+        instance = subprocess.Popen("dpkg-source -x *dsc", shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        (stdout, stderr) = instance.communicate()
+        if instance.returncode != 0:
+            raise Exception(stderr.decode("utf-8").strip())
+
+        # check the dir exist
+        if not os.path.isdir(source_directory_name):
+            raise Exception("We tried to download and check that the directory {} is present, but it's not the case".format(source_directory_name))
+        _write_source_manifest(dsc_path, source_directory_name)
     os.chdir('../..')
     return (os.path.join(source_package_download_dir, source_directory_name))
 
 
+def _write_source_without_extracting(dsc_path, source_directory):
+    '''Write the content manifest of dsc_path and its debian/control and debian/changelog files in source_directory
+
+    Return False if the source package can't be read without extracting it. The whole source is only read when
+    we don't have its manifest yet.'''
+    cache_key = _get_source_manifest_cache_key(dsc_path)
+    try:
+        try:
+            manifest = cachemanager.load(settings.SOURCE_MANIFEST_CACHE_NAMESPACE, cache_key)
+        except KeyError:
+            (manifest, contents) = sourcepackage.read_source(dsc_path, settings.SOURCE_SUMMARY_FILES)
+            cachemanager.save(settings.SOURCE_MANIFEST_CACHE_NAMESPACE, cache_key, manifest,
+                              settings.SOURCE_MANIFEST_CACHE_TTL)
+        else:
+            contents = sourcepackage.read_members(dsc_path, settings.SOURCE_SUMMARY_FILES)
+    except sourcepackage.UnsupportedSourceException as e:
+        logging.info("Extracting {} as it can't be read in place: {}".format(dsc_path, e))
+        return False
+    with ignored(OSError):
+        shutil.rmtree(source_directory)
+    for (relpath, content) in contents.items():
+        path = os.path.join(source_directory, relpath)
+        with ignored(OSError):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as f:
+            f.write(content)
+    sourcetree.write_manifest(source_directory, manifest)
+    return True
+
+
+def _get_source_manifest_cache_key(dsc_path):
+    '''Return the key of the content manifest of dsc_path in the host wide cache
+
+    The same version can have a different content in different ppas or archives, but the .dsc lists the checksums
+    of all the source files: key on its own sha256.'''
+    with open(dsc_path, 'rb') as f:
+        return [hashlib.sha256(f.read()).hexdigest()]
+
+
+def _write_source_manifest(dsc_path, source_directory):
+    '''Write the content manifest of dsc_path next to the extracted source_directory
+
+    Reuse the manifest of any previous download of the same source, from any silo or stack.'''
+    cache_key = _get_source_manifest_cache_key(dsc_path)
+    try:
+        manifest = cachemanager.load(settings.SOURCE_MANIFEST_CACHE_NAMESPACE, cache_key)
+    except KeyError:
+        manifest = sourcetree.build_manifest(source_directory)
+        cachemanager.save(settings.SOURCE_MANIFEST_CACHE_NAMESPACE, cache_key, manifest, settings.SOURCE_MANIFEST_CACHE_TTL)
+    sourcetree.write_manifest(source_directory, manifest)
+
+
 def is_new_content_relevant_since_old_published_source(dest_version_source):
     '''Return True if a new snapshot is needed
 
@@ -234,32 +471,26 @@ def is_new_content_relevant_since_old_published_source(dest_version_source):
     if not dest_version_source:
         return True
 
-    # now check the relevance of the committed changes compared to the version in the repository (if any)
-    diffinstance = subprocess.Popen(['diff', '-Nrup', '.', dest_version_source], stdout=subprocess.PIPE)
-    filterinstance = subprocess.Popen(['filterdiff', '--clean', '-x', '*po', '-x', '*pot', '-x', '*local-options'], stdin=diffinstance.stdout, stdout=subprocess.PIPE)
-    lsdiffinstance = subprocess.Popen(['lsdiff'], stdin=filterinstance.stdout, stdout=subprocess.PIPE)
-    (relevant_changes, err) = subprocess.Popen(['grep', '-Ev', '.bzr|.pc'], stdin=lsdiffinstance.stdout, stdout=subprocess.PIPE).communicate()
+    # now check the relevance of the committed changes compared to the version in the repository (if any),
+    # from its content manifest if we have one to not read the whole destination tree again
+    try:
+        relevant_changes = sourcetree.get_changed_files_from_manifest('.', sourcetree.load_manifest(dest_version_source))
+    except (IOError, ValueError):
+        relevant_changes = sourcetree.get_changed_files('.', dest_version_source)
 
     # detect if the only change is a Vcs* target changes (with or without changelog edit). We won't release in that case
-    number_of_changed_files = relevant_changes.count("\n")
-    if ((number_of_changed_files == 1 and "debian/control" in relevant_changes) or
-       (number_of_changed_files == 2 and "debian/control" in relevant_changes and "debian/changelog" in relevant_changes)):
-        (results, err) = subprocess.Popen(['diff', os.path.join('debian', 'control'), os.path.join(dest_version_source, "debian", "control")], stdout=subprocess.PIPE).communicate()
-        for diff_line in results.split('\n'):
-            if diff_line.startswith("< ") or diff_line.startswith("> "):
-                if not diff_line[2:].startswith("Vcs-") and not diff_line[2:].startswith("#"):
-                    return True
-        return False
+    control = os.path.join("debian", "control")
+    if relevant_changes in (set([control]), set([control, os.path.join("debian", "changelog")])):
+        return sourcetree.has_relevant_control_changes(control, os.path.join(dest_version_source, control))
 
     logging.debug("Relevant changes are:")
-    logging.debug(relevant_changes)
+    logging.debug("\n".join(sorted(relevant_changes)))
 
-    return (relevant_changes != '')
+    return bool(relevant_changes)
 
 
-def is_relevant(newdsc_path, dest_version_source):
-    '''Extract and check if the generated source diff different from previous one'''
-
+def _extract_generated_source(newdsc_path):
+    '''Extract newdsc_path in the generated directory and return the extracted path'''
     with ignored(OSError):
         os.makedirs("generated")
     extracted_generated_source = os.path.join("generated", newdsc_path.split('_')[0])
@@ -269,15 +500,51 @@ def is_relevant(newdsc_path, dest_version_source):
     # remove epoch is there is one
     if subprocess.call(["dpkg-source", "-x", newdsc_path, extracted_generated_source]) != 0:
         raise Exception("dpkg-source command returned an error.")
+    return extracted_generated_source
 
-    # now check the relevance of the committed changes compared to the version in the repository (if any)
-    diffinstance = subprocess.Popen(['diff', '-Nrup', extracted_generated_source, dest_version_source], stdout=subprocess.PIPE)
-    (diff, err) = subprocess.Popen(['filterdiff', '--clean', '-x', '*po', '-x', '*pot', '-x', '*local-options'], stdin=diffinstance.stdout, stdout=subprocess.PIPE).communicate()
 
-    # there is no important diff if the diff only contains 12 lines, corresponding to "Automatic daily release" marker in debian/changelog
-    if (diff.count('\n') <= 12):
+def _has_only_new_changelog_entry(new_changelog, old_changelog):
+    '''Return True if new_changelog is old_changelog with a new top entry of one line, like the snapshot marker'''
+    entries = changelogmanager.parse(new_changelog.splitlines(True), first_only=True)
+    if not entries:
         return False
-    return True
+    top_entry = entries[0]
+    if new_changelog[top_entry.end:].lstrip("\n") != old_changelog.lstrip("\n"):
+        return False
+    changes = [line for line in new_changelog[top_entry.start:top_entry.end].splitlines()[1:-1] if line.strip()]
+    return len(changes) <= 1
+
+
+def is_relevant(newdsc_path, dest_version_source):
+    '''Check if the generated source is different from the previous one, apart from its new changelog entry
+
+    The generated source is only extracted if it can't be read in place.'''
+    changelog = os.path.join("debian", "changelog")
+    try:
+        (new_manifest, contents) = sourcepackage.read_source(newdsc_path, [changelog])
+        new_changelog = contents.get(changelog, "")
+    except sourcepackage.UnsupportedSourceException as e:
+        logging.info("Extracting {} as it can't be read in place: {}".format(newdsc_path, e))
+        extracted_generated_source = _extract_generated_source(newdsc_path)
+        new_manifest = sourcetree.build_manifest(extracted_generated_source)
+        with open(os.path.join(extracted_generated_source, changelog)) as f:
+            new_changelog = f.read()
+
+    # now check the relevance of the committed changes compared to the version in the repository (if any)
+    try:
+        dest_manifest = sourcetree.load_manifest(dest_version_source)
+    except (IOError, ValueError):
+        dest_manifest = sourcetree.build_manifest(dest_version_source)
+    relevant_changes = sourcetree.get_changed_files_between_manifests(new_manifest, dest_manifest)
+    relevant_changes.discard(changelog)
+    if relevant_changes:
+        logging.debug("Relevant changes are:")
+        logging.debug("\n".join(sorted(relevant_changes)))
+        return True
+
+    # there is no important diff if debian/changelog only has the "Automatic daily release" marker
+    with open(os.path.join(dest_version_source, changelog)) as f:
+        return not _has_only_new_changelog_entry(new_changelog, f.read())
 
 
 def _packaging_changes_between_dsc(oldsource_dsc, newsource_dsc):
@@ -288,13 +555,7 @@ def _packaging_changes_between_dsc(oldsource_dsc, newsource_dsc):
         return True
     if not os.path.isfile(oldsource_dsc) or not os.path.isfile(newsource_dsc):
         raise Exception("{} or {} doesn't not exist, can't create a diff".format(oldsource_dsc, newsource_dsc))
-    diffinstance = subprocess.Popen(['debdiff', oldsource_dsc, newsource_dsc], stdout=subprocess.PIPE)
-    filterinstance = subprocess.Popen(['filterdiff', '--clean', '-i', '*debian/*', '-x', '*changelog'], stdin=diffinstance.stdout, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    (change_in_debian, filter_err) = filterinstance.communicate()
-    # we can't rely on diffinstance returncode as the signature key is maybe not present and it will exit with 1
-    if filterinstance.returncode != 0:
-        raise Exception("Error in diff: {}".format(filter_err.decode("utf-8").strip()))
-    return(change_in_debian != "")
+    return sourcediff.get_source_diff(oldsource_dsc, newsource_dsc).has_packaging_changes()
 
 
 def generate_diff_between_dsc(diff_filepath, oldsource_dsc, newsource_dsc):
@@ -307,30 +568,14 @@ def generate_diff_between_dsc(diff_filepath, oldsource_dsc, newsource_dsc):
                 f.writelines("This source is a new package, if the destination is ubuntu, please ensure it has been preNEWed by an archive admin before publishing that stack.")
                 return
             f.write("/!\ Remember that this diff only represents packaging changes and build tools diff, not the whole content diff!\n\n")
-            diffinstance = subprocess.Popen(['debdiff', oldsource_dsc, newsource_dsc], stdout=subprocess.PIPE)
-            (changes_to_publish, err) = subprocess.Popen(['filterdiff', '--remove-timestamps', '--clean', '-i', '*setup.py',
-                                                          '-i', '*Makefile.am', '-i', '*configure.*', '-i', '*debian/*',
-                                                          '-i', '*CMakeLists.txt'], stdin=diffinstance.stdout, stdout=subprocess.PIPE).communicate()
-
-            # look for any modifications that might mean a new binary package has appeared
-            # TODO: make better, considering only changes for debian/control
-            split_diff = changes_to_publish.split('\n')
-            re_replace = re.compile('\+Package: *(.*)')
-            new_binary_packages = []
-
-            logging.debug("Looking for new binary packages in the diff")
-            for line in split_diff:
-                if line.startswith('+Package:'):
-                    logging.debug("Found a new binary package")
-                    reverse = '-' + line[1:]
-                    if reverse in split_diff:
-                        logging.debug("It seems to be a move, ignoring")
-                        continue
-                    new_binary_packages.append(re.sub(re_replace, '\\1', line))
+            source_diff = sourcediff.get_source_diff(oldsource_dsc, newsource_dsc)
+
+            logging.debug("Looking for new binary packages in debian/control")
+            new_binary_packages = source_diff.get_new_binary_packages()
             if new_binary_packages:
                 f.write("(!) Warning! This package seems to add new binary packages ({}). Please consult an archive admin before proceeding!\n\n".format(', '.join(new_binary_packages)))
 
-            f.write(changes_to_publish)
+            f.write(source_diff.render())
 
 
 def check_if_packages_require_twin_upload(sources):
@@ -437,35 +682,17 @@ def create_new_packaging_version(base_package_version, series_version, destppa='
 
 def get_packaging_sourcename():
     '''Get current packaging source name'''
-    instance = subprocess.Popen(["dpkg-parsechangelog"], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    (stdout, stderr) = instance.communicate()
-    if instance.returncode != 0:
-        raise Exception(stderr.decode("utf-8").strip())
-    expr = re.compile("Source: (.*)")
-    for line in stdout.splitlines():
-        source_name = expr.findall(line)
-        if source_name:
-            return source_name[0]
-
-    raise Exception("Didn't find any source name in the package: {}".format(stdout))
+    return _get_top_changelog_field("Source", "source name")
 
 
 def collect_bugs(f, source_package_name):
     '''Collect all bugs in the changelog until latest snapshot'''
     bugs = set()
-    # matching only bug format that launchpad accepts
-    group_bugs_regexp = re.compile("lp: ?(.*\d{5,})", re.IGNORECASE)
-    bug_decipher_regexp = re.compile("(#\d{5,})+")
-    new_upload_changelog_regexp = re.compile(settings.NEW_CHANGELOG_PATTERN.format(source_package_name))
-    for line in f:
-        grouped_bugs_list = group_bugs_regexp.findall(line)
-        for grouped_bugs in grouped_bugs_list:
-            for bug in map(lambda bug_with_hash: bug_with_hash.replace('#', ''), bug_decipher_regexp.findall(grouped_bugs)):
-                bugs.add(bug)
+    for entry in changelogmanager.get_entries(f):
         #  a released upload to distro (automated or manual)n exit as bugs before were already covered
-        if new_upload_changelog_regexp.match(line):
-            return bugs
-
+        if entry.package == source_package_name and entry.released:
+            break
+        bugs.update(entry.bugs)
     return bugs
 
 
@@ -622,6 +849,9 @@ def check_package_reached_destination(silo_config, packages_in_dest, ignoremissi
     dest_link = silo_config['global']['dest']
     dest = launchpadmanager.get_resource_from_token(dest_link)
     series = launchpadmanager.get_resource_from_token(silo_config['global']['series'])
+    # a ppa destination is small enough to be fetched at once
+    if not launchpadmanager.is_dest_distro_archive(dest_link):
+        index_published_sources(dest, series)
     additional_messages = ""
     for source in packages_in_dest:
         if (not is_version_for_series_in_dest(source, packages_in_dest[source], series, dest) and
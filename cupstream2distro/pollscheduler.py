@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2014 Canonical
+#
+# Authors:
+#  Didier Roche
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+'''Choose when to check the ppa again, from when pending builds are expected to complete
+
+The expected completion of a build is its start time plus the duration of the last successful build of the same
+source on the same arch, recorded in the common cache as builds complete.'''
+
+import calendar
+import datetime
+import logging
+import time
+
+from . import cachemanager
+from .settings import (BUILD_DURATION_CACHE_NAMESPACE, BUILD_DURATION_CACHE_TTL, PPA_CHECK_MAX_INTERVAL,
+                       TIME_BETWEEN_PPA_CHECKS)
+
+
+def _to_timestamp(date):
+    '''Return the timestamp of a launchpad date (UTC)
+
+    Dates are strings when the service description doesn't type them, like with tests/tools/fakelaunchpad.py.'''
+    if isinstance(date, basestring):
+        date = datetime.datetime.strptime(date[:19], "%Y-%m-%dT%H:%M:%S")
+    return calendar.timegm(date.utctimetuple())
+
+
+def get_build_duration(source_name, arch):
+    '''Return the last recorded build duration of source_name on arch, or None if we never saw one'''
+    try:
+        return cachemanager.load(BUILD_DURATION_CACHE_NAMESPACE, [source_name, arch])
+    except KeyError:
+        return None
+
+
+def record_build_duration(source_name, build):
+    '''Record how long a successful build took, if launchpad tells when it started and ended'''
+    date_started = getattr(build, "date_started", None)
+    datebuilt = getattr(build, "datebuilt", None)
+    if not date_started or not datebuilt:
+        return
+    duration = _to_timestamp(datebuilt) - _to_timestamp(date_started)
+    logging.debug("{} built in {}s on {}".format(source_name, duration, build.arch_tag))
+    cachemanager.save(BUILD_DURATION_CACHE_NAMESPACE, [source_name, build.arch_tag], duration,
+                      BUILD_DURATION_CACHE_TTL)
+
+
+def get_build_eta(source_name, build):
+    '''Return the timestamp when build is expected to complete, or None if we can't tell
+
+    Builds already done are only waiting for their binaries to be published.'''
+    datebuilt = getattr(build, "datebuilt", None)
+    if datebuilt:
+        return _to_timestamp(datebuilt)
+    date_started = getattr(build, "date_started", None)
+    if not date_started:
+        # still waiting for a builder
+        return None
+    duration = get_build_duration(source_name, build.arch_tag)
+    if duration is None:
+        return None
+    return _to_timestamp(date_started) + duration
+
+
+def get_next_check_delay(etas, now=None):
+    '''Return how many seconds to wait before checking again builds expected to complete at etas
+
+    An eta is None when we can't tell. We wake up when the next build is expected to complete, and back off as a
+    build gets late. We never wait less than TIME_BETWEEN_PPA_CHECKS, so that a build is never checked more times
+    than with that fixed interval, but up to PPA_CHECK_MAX_INTERVAL.'''
+    if now is None:
+        now = time.time()
+    delays = []
+    for eta in etas:
+        if eta is None:
+            delays.append(TIME_BETWEEN_PPA_CHECKS)
+        elif eta > now:
+            delays.append(eta - now)
+        else:
+            # wait as long as the build is already late
+            delays.append(now - eta)
+    if not delays:
+        return TIME_BETWEEN_PPA_CHECKS
+    return int(min(max(min(delays), TIME_BETWEEN_PPA_CHECKS), PPA_CHECK_MAX_INTERVAL))
@@ -0,0 +1,324 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2014 Canonical
+#
+# Authors:
+#  Didier Roche
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+'''Watch packages building in a ppa, either in the job itself or through the ppa watcher daemon of the host
+
+Jobs register what they watch to the daemon over a unix socket, as a json object on one line. The daemon loads
+what a job watches from the thread handling its registration, then checks each distinct ppa once per cycle for all
+jobs watching it, from a single thread. It sends back to each job the logs of its packages, then the result, as
+json objects on one line each.'''
+
+import json
+import logging
+import os
+import Queue
+import socket
+import SocketServer
+import threading
+import time
+
+from . import launchpadmanager, packageinppamanager, packagemanager, pollscheduler
+from .packageinppa import PackageInPPA
+from .packagemanager import list_packages_info_in_str
+from .settings import PPA_WATCHER_SOCKET, TIME_BEFORE_STOP_LOOKING_FOR_SOURCE_PUBLISH, TIME_BETWEEN_PPA_CHECKS
+from .utils import emit_logs, held_logs, ignored
+
+
+def get_registration(ppa_name, series_name, packages, distribution="ubuntu", dest_ppa=None, arch=None, workdir=".",
+                     name=None):
+    '''Return the registration of a watch on packages [(source, version)] in ppa_name for series_name
+
+    workdir contains the .dsc and .ignore files of the packages. name identifies the job in the daemon logs.'''
+    return {"ppa": ppa_name, "series": series_name, "packages": [list(package) for package in packages],
+            "distribution": distribution, "destppa": dest_ppa, "arch": arch, "workdir": os.path.abspath(workdir),
+            "name": name or ppa_name}
+
+
+class Watch(object):
+    '''Packages of a registration building in a ppa, and the outcome of watching them'''
+
+    def __init__(self, registration):
+        self.name = registration["name"]
+        self.ppa_name = registration["ppa"]
+        self.arch = registration["arch"]
+        self.series = launchpadmanager.get_series(registration["series"], registration["distribution"])
+        self.ppa = launchpadmanager.get_ppa(registration["ppa"])
+        if registration["destppa"]:
+            dest_archive = launchpadmanager.get_ppa(registration["destppa"])
+        else:
+            dest_archive = launchpadmanager.get_distribution(registration["distribution"]).main_archive
+        (available_archs_in_ppa, arch_all_arch, archs_to_eventually_ignore,
+         archs_to_unconditionally_ignore) = launchpadmanager.get_available_all_and_ignored_archs(self.series, self.ppa)
+
+        self.packages_not_in_ppa = set()
+        self.packages_building = set()
+        self.packages_failed = set()
+        for (source, version) in registration["packages"]:
+            self.packages_not_in_ppa.add(PackageInPPA(source, version, self.ppa, dest_archive, self.series,
+                                                      available_archs_in_ppa, arch_all_arch,
+                                                      archs_to_eventually_ignore, archs_to_unconditionally_ignore,
+                                                      registration["workdir"]))
+        self.start_time = time.time()
+
+    def get_key(self):
+        '''Return the key of the ppa and series we watch, shared by watches which can be checked together'''
+        return (self.ppa.self_link, self.series.self_link)
+
+    def get_packages(self):
+        '''Return the packages we still wait for'''
+        return self.packages_not_in_ppa.union(self.packages_building)
+
+    def get_etas(self):
+        '''Return when the builds we wait for are expected to complete, see PackageInPPA.get_build_etas()'''
+        etas = []
+        for package in self.get_packages():
+            etas.extend(package.get_build_etas(self.arch))
+        return etas
+
+    def update(self, sweep=None):
+        '''Refresh the status of the packages we wait for, from sweep if it covers them'''
+        logging.info("Checking the status for {}".format(list_packages_info_in_str(self.get_packages())))
+        packageinppamanager.update_all_packages_status(self.packages_not_in_ppa, self.packages_building,
+                                                       self.packages_failed, self.arch, sweep=sweep)
+
+    def get_result(self):
+        '''Return None while we have to keep watching, (success, message) otherwise'''
+        # if we have some packages failing and no more build in progress, we are done
+        if self.packages_failed and not (self.packages_building and self.packages_not_in_ppa):
+            return (False, "Some of the packages failed to build: {}".format(
+                list_packages_info_in_str(self.packages_failed)))
+
+        # if we have no package building or failing and have wait for long enough to have some package appearing
+        # in the ppa, we are done
+        if (self.packages_not_in_ppa and not self.packages_building and
+                (time.time() - self.start_time) > TIME_BEFORE_STOP_LOOKING_FOR_SOURCE_PUBLISH):
+            return (False, "Some source packages were never published in the ppa: {}".format(
+                list_packages_info_in_str(self.packages_not_in_ppa)))
+
+        if not (self.packages_not_in_ppa or self.packages_building or self.packages_failed):
+            return (True, "All packages are published in the ppa")
+        return None
+
+
+def watch_in_process(watch):
+    '''Watch until we are done, return (success, message)'''
+    while True:
+        watch.update()
+        result = watch.get_result()
+        if result:
+            return result
+        # wake up when the next build is expected to complete
+        delay = pollscheduler.get_next_check_delay(watch.get_etas())
+        logging.info("Next check in {}s".format(delay))
+        time.sleep(delay)
+
+
+def delegate(registration, socket_path=PPA_WATCHER_SOCKET):
+    '''Watch registration through the ppa watcher daemon, logging what it sends back
+
+    Return (success, message). Raise socket.error if the daemon isn't running, can't watch registration or stopped
+    before the end.'''
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+        stream = sock.makefile('rw')
+        stream.write(json.dumps(registration) + "\n")
+        stream.flush()
+        for line in stream:
+            reply = json.loads(line)
+            if "log" in reply:
+                logging.log(reply["log"]["level"], reply["log"]["message"])
+            if "handled" in reply:
+                raise socket.error(reply["message"])
+            if "success" in reply:
+                return (reply["success"], reply["message"])
+    finally:
+        sock.close()
+    raise socket.error("The ppa watcher stopped before being done with our packages")
+
+
+class _RegistrationHandler(SocketServer.StreamRequestHandler):
+    '''Hand a registration to the watcher and send back everything it replies, until the result'''
+
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            # only checking that we are listening
+            return
+        try:
+            registration = json.loads(line)
+        except ValueError as e:
+            self.wfile.write(json.dumps({"success": False, "message": "Invalid registration: {}".format(e)}) + "\n")
+            return
+        # load what we watch here, so that a slow registration doesn't delay the checks of other jobs
+        try:
+            with launchpadmanager.launchpad_session():
+                watch = Watch(registration)
+        except Exception as e:
+            logging.warning("Can't watch {}: {}".format(registration.get("name"), e))
+            # not a result on the packages, the job can still watch them itself
+            self.wfile.write(json.dumps({"handled": False,
+                                         "message": "Can't watch {}: {}".format(registration.get("ppa"), e)}) + "\n")
+            return
+        replies = Queue.Queue()
+        cancelled = threading.Event()
+        self.server.watcher.registrations.put((watch, replies, cancelled))
+        while True:
+            reply = replies.get()
+            try:
+                self.wfile.write(json.dumps(reply) + "\n")
+                self.wfile.flush()
+            except socket.error:
+                # the job is gone
+                cancelled.set()
+                return
+            if "success" in reply:
+                return
+
+
+class _RegistrationServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    daemon_threads = True
+
+
+class PPAWatcher(object):
+    '''Watch the packages registered by all jobs of the host
+
+    Registrations are received from their own threads, while a single thread checks the ppas (see run()).
+    The launchpad requests of each cycle are written to stats_filename if set.'''
+
+    def __init__(self, socket_path=PPA_WATCHER_SOCKET, stats_filename=None):
+        self.socket_path = socket_path
+        self.stats_filename = stats_filename
+        self.registrations = Queue.Queue()
+        # {(ppa link, series link): [(watch, replies, cancelled)]} and when to check them next
+        self.watches = {}
+        self.next_checks = {}
+        self.server = None
+
+    def listen(self):
+        '''Start accepting registrations on the socket
+
+        Raise socket.error if another watcher is already listening there.'''
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.socket_path)
+        except socket.error:
+            # nobody listens, remove the stale socket of a previous watcher
+            with ignored(OSError):
+                os.remove(self.socket_path)
+        else:
+            raise socket.error("A ppa watcher is already listening on {}".format(self.socket_path))
+        finally:
+            sock.close()
+        # registrations open pooled sessions, which need the main one
+        launchpadmanager.get_launchpad()
+        self.server = _RegistrationServer(self.socket_path, _RegistrationHandler)
+        self.server.watcher = self
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        logging.info("Waiting for registrations on {}".format(self.socket_path))
+
+    def stop(self):
+        '''Stop accepting registrations and make run() return'''
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            with ignored(OSError):
+                os.remove(self.socket_path)
+        self.registrations.put(None)
+
+    def run(self):
+        '''Check the registered watches until stop() is called'''
+        while True:
+            now = time.time()
+            delay = None
+            if self.next_checks:
+                delay = max(0, min(self.next_checks.values()) - now)
+            try:
+                registration = self.registrations.get(timeout=delay)
+                while True:
+                    if registration is None:
+                        return
+                    self._register(*registration)
+                    registration = self.registrations.get_nowait()
+            except Queue.Empty:
+                pass
+            now = time.time()
+            keys = [key for (key, next_check) in self.next_checks.items() if next_check <= now]
+            for key in keys:
+                self._check(key)
+            if keys:
+                self._end_cycle()
+
+    def _register(self, watch, replies, cancelled):
+        '''Start watching watch, replying to replies'''
+        logging.info("Watching {} in {} for {}".format(list_packages_info_in_str(watch.get_packages()),
+                                                         watch.ppa_name, watch.name))
+        key = watch.get_key()
+        self.watches.setdefault(key, []).append((watch, replies, cancelled))
+        # check it right away with the other watches of the ppa
+        self.next_checks[key] = time.time()
+
+    def _check(self, key):
+        '''Check all watches of a ppa and series, sweeping the ppa once for all of them'''
+        watches = [(watch, replies, cancelled) for (watch, replies, cancelled) in self.watches[key]
+                   if not cancelled.is_set()]
+        try:
+            sweep = packageinppamanager.sweep_ppa_status(set().union(*[watch.get_packages()
+                                                                      for (watch, replies, cancelled) in watches]))
+        except Exception as e:
+            logging.warning("Can't check {}, retrying later: {}".format(key[0], e))
+            self.next_checks[key] = time.time() + TIME_BETWEEN_PPA_CHECKS
+            return
+
+        remaining_watches = []
+        etas = []
+        for (watch, replies, cancelled) in watches:
+            with held_logs() as records:
+                try:
+                    watch.update(sweep)
+                    result = watch.get_result()
+                except Exception as e:
+                    logging.error("Error while watching the packages: {}".format(e))
+                    result = (False, "Error while watching the packages: {}".format(e))
+            emit_logs(records)
+            for record in records:
+                replies.put({"log": {"level": record.levelno, "message": record.getMessage()}})
+            if result:
+                logging.info("Done watching for {}: {}".format(watch.name, result[1]))
+                replies.put({"success": result[0], "message": result[1]})
+                continue
+            remaining_watches.append((watch, replies, cancelled))
+            etas.extend(watch.get_etas())
+
+        if remaining_watches:
+            self.watches[key] = remaining_watches
+            self.next_checks[key] = time.time() + pollscheduler.get_next_check_delay(etas)
+        else:
+            del self.watches[key]
+            del self.next_checks[key]
+
+    def _end_cycle(self):
+        '''Forget what we loaded from launchpad during the cycle, so that we don't grow as we keep running'''
+        launchpadmanager.clear_resources()
+        packagemanager.clear_published_sources_index()
+        if self.stats_filename:
+            launchpadmanager.write_api_stats(self.stats_filename)
+        launchpadmanager.clear_api_stats()
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2014 Canonical
+#
+# Authors:
+#  Didier Roche
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+import fcntl
+import json
+import logging
+import os
+import time
+
+from .settings import (LAUNCHPAD_RATE_LIMIT_FILE, LAUNCHPAD_BURST, LAUNCHPAD_MAX_REQUESTS_PER_SECOND,
+                       LAUNCHPAD_MIN_REQUESTS_PER_SECOND, LAUNCHPAD_RATE_INCREASE)
+from .utils import ignored
+
+# The token bucket is shared by every process on the host through LAUNCHPAD_RATE_LIMIT_FILE:
+# {"tokens": available requests, "updated": last refill time, "rate": current requests per second}
+# The rate slowly increases on each granted request and is halved each time launchpad is struggling,
+# so that we stay close to the highest rate launchpad tolerates.
+
+
+def _update_state(update):
+    '''Call update(state, now) with the host wide state locked, save it and return update result
+
+    Return None if the state file can't be used'''
+    with ignored(OSError):
+        os.makedirs(os.path.dirname(LAUNCHPAD_RATE_LIMIT_FILE))
+    try:
+        with open(LAUNCHPAD_RATE_LIMIT_FILE, 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    state = json.load(f)
+                except ValueError:
+                    state = {}
+                now = time.time()
+                state.setdefault("rate", float(LAUNCHPAD_MAX_REQUESTS_PER_SECOND))
+                state.setdefault("tokens", float(LAUNCHPAD_BURST))
+                state.setdefault("updated", now)
+                result = update(state, now)
+                f.seek(0)
+                f.truncate()
+                json.dump(state, f)
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+    except IOError as e:
+        logging.debug("Can't use launchpad rate limiter: {}".format(e))
+        return None
+    return result
+
+
+def _take_token(state, now):
+    '''Take a token from the bucket, return 0 if granted or the time to wait before the next one'''
+    state["tokens"] = min(float(LAUNCHPAD_BURST), state["tokens"] + max(0, now - state["updated"]) * state["rate"])
+    state["updated"] = now
+    if state["tokens"] >= 1:
+        state["tokens"] -= 1
+        state["rate"] = min(float(LAUNCHPAD_MAX_REQUESTS_PER_SECOND), state["rate"] + LAUNCHPAD_RATE_INCREASE)
+        return 0
+    return (1 - state["tokens"]) / state["rate"]
+
+
+def _slow_down(state, now):
+    '''Halve the rate and empty the bucket'''
+    state["rate"] = max(float(LAUNCHPAD_MIN_REQUESTS_PER_SECOND), state["rate"] / 2)
+    state["tokens"] = 0.0
+    state["updated"] = now
+    return state["rate"]
+
+
+def acquire():
+    '''Wait until we are allowed to make a launchpad request'''
+    while True:
+        wait = _update_state(_take_token)
+        if not wait:
+            return
+        time.sleep(wait)
+
+
+def report_throttled():
+    '''Signal that launchpad is struggling (server errors or timeouts) so that all processes slow down'''
+    rate = _update_state(_slow_down)
+    if rate:
+        logging.info("Slowing down launchpad requests to {:.2f}/s".format(rate))
@@ -44,8 +44,87 @@ if not os.path.isdir(os.path.join(GNUPG_DIR, '.gnupg')):
     GNUPG_DIR = home_dir
 CRED_FILE_PATH = os.path.join(CU2D_DIR, ".cupstream_cred")
 COMMON_LAUNCHPAD_CACHE_DIR = os.path.join(CU2D_DIR, "launchpad.cache")
+COMMON_CACHE_DIR = os.path.join(CU2D_DIR, "cu2d.cache")
 BOT_KEY = "B879A3E9"
 
+# number of entries of a launchpad collection fetched at once when iterating over it
+LAUNCHPAD_PAGE_SIZE = 300
+# launchpad objects kept per session: only types which don't change while we use them, and at most that many
+LAUNCHPAD_MEMOIZED_RESOURCE_TYPES = ("archive", "distribution", "distro_series", "distro_arch_series", "person", "team")
+LAUNCHPAD_RESOURCE_CACHE_SIZE = 1000
+# maximum number of launchpad sessions used concurrently by one process
+LAUNCHPAD_SESSIONS = 4
+
+# host wide launchpad rate limiting, shared by all jobs
+LAUNCHPAD_RATE_LIMIT_FILE = os.path.join(CU2D_DIR, "launchpad.ratelimit")
+LAUNCHPAD_MAX_REQUESTS_PER_SECOND = 10
+LAUNCHPAD_MIN_REQUESTS_PER_SECOND = 0.5
+LAUNCHPAD_BURST = 20
+# requests per second regained on each granted request
+LAUNCHPAD_RATE_INCREASE = 0.05
+# retries on server errors and timeouts, with a random delay up to BASE * 2^attempt seconds (capped to MAX)
+LAUNCHPAD_MAX_RETRIES = 5
+LAUNCHPAD_BACKOFF_BASE = 1
+LAUNCHPAD_BACKOFF_MAX = 60
+LAUNCHPAD_RETRY_STATUS = (429, 500, 502, 503, 504)
+# requests changing launchpad content (copyPackage, lp_save…) may have been processed despite a timeout or a 500/504,
+# they are only retried when the server tells it didn't process them
+LAUNCHPAD_IDEMPOTENT_METHODS = ("GET", "HEAD")
+LAUNCHPAD_UNSAFE_RETRY_STATUS = (502, 503)
+# launchpad service description (WADL), only revalidated against launchpad after that time
+LAUNCHPAD_WADL_CACHE_NAMESPACE = "wadl"
+LAUNCHPAD_WADL_CACHE_TTL = 6 * 60 * 60
+# talk anonymously to this launchpad service root (like tests/tools/fakelaunchpad.py) instead of production or staging
+LAUNCHPAD_SERVICE_ROOT_ENV = "CU2D_LAUNCHPAD_SERVICE_ROOT"
+
+# time (in seconds) we keep getPublishedSources answers in the common cache, depending on the publication status
+PUBLICATION_CACHE_NAMESPACE = "publications"
+PUBLICATION_CACHE_TTL = {
+    'Published': 24 * 60 * 60,
+    'Superseded': 24 * 60 * 60,
+    'Pending': 60,
+}
+# not published (yet) or unknown status
+PUBLICATION_CACHE_DEFAULT_TTL = 30
+
+# architectures of a series, and archs for which the latest version of a source in a destination has binaries
+SERIES_ARCHS_CACHE_NAMESPACE = "series_archs"
+SERIES_ARCHS_CACHE_TTL = 24 * 60 * 60
+DEST_ARCHS_CACHE_NAMESPACE = "dest_archs"
+DEST_ARCHS_CACHE_TTL = 6 * 60 * 60
+
+# bug titles barely change once the bug is fixed, keep them for a week
+BUG_TITLE_CACHE_NAMESPACE = "bug_titles"
+BUG_TITLE_CACHE_TTL = 7 * 24 * 60 * 60
+BUG_TITLE_WORKERS = 4
+
+# files and directories never considered as relevant changes between a branch and the destination source
+RELEVANCE_EXCLUDED_FILES = ('*po', '*pot', '*local-options')
+RELEVANCE_EXCLUDED_DIRS = ('.bzr', '.pc')
+# content manifests of destination sources, keyed on the sha256 of their .dsc
+SOURCE_MANIFEST_CACHE_NAMESPACE = "source_manifests"
+SOURCE_MANIFEST_CACHE_TTL = 30 * 24 * 60 * 60
+# the only files written for destination sources we don't need to extract
+SOURCE_SUMMARY_FILES = ("debian/changelog", "debian/control")
+# files shown in the packaging diff between two sources, and number of source pairs whose diff is kept in memory
+PACKAGING_DIFF_FILES = ('*setup.py', '*Makefile.am', '*configure.*', '*debian/*', '*CMakeLists.txt')
+SOURCE_DIFF_CACHE_SIZE = 16
+
+# host wide store of downloaded source package files, shared by all silos and stacks, and its disk budget (in bytes)
+ARTIFACT_STORE_DIR = os.path.join(CU2D_DIR, "artifacts")
+ARTIFACT_STORE_MAX_SIZE = 20 * 1024 * 1024 * 1024
+# source package files are downloaded concurrently, interrupted downloads are resumed with a random delay
+# up to BASE * 2^attempt seconds (capped to MAX)
+DOWNLOAD_WORKERS = 4
+DOWNLOAD_TIMEOUT = 60
+DOWNLOAD_MAX_RETRIES = 5
+DOWNLOAD_MAX_REDIRECTS = 5
+DOWNLOAD_BACKOFF_BASE = 1
+DOWNLOAD_BACKOFF_MAX = 30
+
+# number of parsed package versions kept in memory
+VERSION_CACHE_SIZE = 4096
+
 # selected arch for building arch:all packages
 VIRTUALIZED_PPA_ARCH = ["i386", "amd64"]
 # an arch we will ignore for publication if latest published version in dest doesn't build it
@@ -54,11 +133,23 @@ ARCHS_TO_UNCONDITIONALLY_IGNORE = set([])
 SRU_PPA = "ubuntu-unity/sru-staging"
 
 TIME_BETWEEN_PPA_CHECKS = 5 * 60
+# once we know when builds are expected to complete, the ppa is checked when they are, and less and less often
+# as they get late, waiting between TIME_BETWEEN_PPA_CHECKS (also used while we don't know) and
+# PPA_CHECK_MAX_INTERVAL seconds
+PPA_CHECK_MAX_INTERVAL = 15 * 60
+# packages whose status is refreshed concurrently, each worker having its own launchpad session
+PPA_STATUS_WORKERS = 4
+# last successful build duration of a source on an arch, used to predict the next one
+BUILD_DURATION_CACHE_NAMESPACE = "build_durations"
+BUILD_DURATION_CACHE_TTL = 90 * 24 * 60 * 60
+# unix socket of the ppa watcher daemon (citrain/ppa-watcher), watching the ppas of all jobs of the host
+PPA_WATCHER_SOCKET = os.path.join(CU2D_DIR, "ppa-watcher.socket")
 TIME_BETWEEN_STACK_CHECKS = 60
 TIME_BEFORE_STOP_LOOKING_FOR_SOURCE_PUBLISH = 20 * 60
 
 PUBLISHER_ARTEFACTS_FILENAME = 'publisher.xml'
 PREPARE_ARTEFACTS_FILENAME_FORMAT = 'prepare_{}.xml'
+LAUNCHPAD_STATS_FILENAME_FORMAT = 'launchpad_stats_{}.json'
 
 OLD_STACK_DIR = 'old'
 PACKAGE_LIST_RSYNC_FILENAME_PREFIX = 'packagelist_rsync'
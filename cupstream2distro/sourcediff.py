@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2014 Canonical
+#
+# Authors:
+#  Didier Roche
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+'''Diff two source packages in process, once per pair of .dsc'''
+
+import difflib
+import fnmatch
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+
+from . import sourcepackage, sourcetree
+from .settings import PACKAGING_DIFF_FILES, SOURCE_DIFF_CACHE_SIZE
+from .utils import lru_cache
+
+
+def _get_source_directory_name(dsc_path):
+    '''Return the directory name dpkg-source -x extracts dsc_path to'''
+    fields = sourcepackage.get_dsc_fields(dsc_path)
+    upstream_version = fields.get("Version", "").split(":")[-1]
+    if "-" in upstream_version:
+        upstream_version = upstream_version.rsplit("-", 1)[0]
+    return "{}-{}".format(fields.get("Source", ""), upstream_version)
+
+
+def _read_source(dsc_path, patterns):
+    '''Return the manifest of dsc_path and the content of its files matching patterns, extracting it if needed'''
+    try:
+        return sourcepackage.read_source(dsc_path, patterns=patterns)
+    except sourcepackage.UnsupportedSourceException as e:
+        logging.info("Extracting {} as it can't be read in place: {}".format(dsc_path, e))
+    extract_dir = tempfile.mkdtemp()
+    try:
+        tree = os.path.join(extract_dir, "source")
+        if subprocess.call(["dpkg-source", "-x", dsc_path, tree], stdout=subprocess.PIPE) != 0:
+            raise Exception("dpkg-source command returned an error.")
+        manifest = sourcetree.build_manifest(tree)
+        contents = {}
+        for relpath in manifest:
+            if any(fnmatch.fnmatch(relpath, pattern) for pattern in patterns) and not os.path.islink(os.path.join(tree, relpath)):
+                with open(os.path.join(tree, relpath), 'rb') as f:
+                    contents[relpath] = f.read()
+        return (manifest, contents)
+    finally:
+        shutil.rmtree(extract_dir)
+
+
+def _is_text(content):
+    return b'\0' not in content[:8192]
+
+
+class SourceDiff(object):
+    '''Difference between two source packages, on the files matching PACKAGING_DIFF_FILES'''
+
+    def __init__(self, olddsc_path, newdsc_path):
+        (self.old_manifest, self.old_contents) = _read_source(olddsc_path, PACKAGING_DIFF_FILES)
+        (self.new_manifest, self.new_contents) = _read_source(newdsc_path, PACKAGING_DIFF_FILES)
+        self.old_dir = _get_source_directory_name(olddsc_path)
+        self.new_dir = _get_source_directory_name(newdsc_path)
+        self.changed_files = sourcetree.get_changed_files_between_manifests(self.old_manifest, self.new_manifest,
+                                                                            excluded_files=())
+
+    def has_packaging_changes(self):
+        '''Return True if anything but a changelog changed in debian/'''
+        return any(fnmatch.fnmatch(relpath, "*debian/*") and not fnmatch.fnmatch(relpath, "*changelog")
+                   for relpath in self.changed_files)
+
+    def get_new_binary_packages(self):
+        '''Return the binary packages of debian/control which weren't in the old source, in their order'''
+        control = os.path.join("debian", "control")
+        old_packages = set(paragraph.get("Package") for paragraph in
+                           sourcepackage.parse_control(self.old_contents.get(control, "")))
+        return [paragraph["Package"] for paragraph in sourcepackage.parse_control(self.new_contents.get(control, ""))
+                if paragraph.get("Package") and paragraph["Package"] not in old_packages]
+
+    def render(self):
+        '''Return the unified diff of the changed text files matching PACKAGING_DIFF_FILES'''
+        diff = []
+        for relpath in sorted(self.changed_files):
+            if relpath not in self.old_contents and relpath not in self.new_contents:
+                # symlinks, or files we didn't keep
+                continue
+            old_content = self.old_contents.get(relpath, b'')
+            new_content = self.new_contents.get(relpath, b'')
+            if not _is_text(old_content) or not _is_text(new_content):
+                continue
+            for line in difflib.unified_diff(old_content.splitlines(True), new_content.splitlines(True),
+                                             "{}/{}".format(self.old_dir, relpath),
+                                             "{}/{}".format(self.new_dir, relpath), lineterm="\n"):
+                if not line.endswith("\n"):
+                    line = "{}\n\\ No newline at end of file\n".format(line)
+                diff.append(line)
+        return "".join(diff)
+
+
+@lru_cache(SOURCE_DIFF_CACHE_SIZE)
+def _get_source_diff(olddsc_path, old_signature, newdsc_path, new_signature):
+    return SourceDiff(olddsc_path, newdsc_path)
+
+
+def get_source_diff(olddsc_path, newdsc_path):
+    '''Return the SourceDiff between olddsc_path and newdsc_path, only computed once while they don't change'''
+    signatures = []
+    for dsc_path in (olddsc_path, newdsc_path):
+        stat = os.stat(dsc_path)
+        signatures.append((stat.st_mtime, stat.st_size, stat.st_ino))
+    return _get_source_diff(os.path.abspath(olddsc_path), signatures[0], os.path.abspath(newdsc_path), signatures[1])
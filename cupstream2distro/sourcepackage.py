@@ -0,0 +1,421 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2014 Canonical
+#
+# Authors:
+#  Didier Roche
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+'''Read source packages without extracting them
+
+The tree dpkg-source -x would extract is computed by streaming the tarballs, the debian diff or quilt patches
+being applied in memory on the only files they touch.'''
+
+from contextlib import contextmanager
+import fnmatch
+import gzip
+import hashlib
+import os
+import re
+import stat
+import subprocess
+import tarfile
+
+_CHUNK_SIZE = 1024 * 1024
+_hunk_regexp = re.compile("^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+# git extended headers we can't apply
+_unsupported_patch_regexp = re.compile("^(rename from|copy from|GIT binary patch|Binary files)")
+
+
+class UnsupportedSourceException(Exception):
+    '''The source package can't be read without extracting it'''
+
+
+@contextmanager
+def _open_tar(tar_path):
+    '''Yield tar_path opened for streaming, raise UnsupportedSourceException if it can't be read'''
+    try:
+        if tar_path.endswith((".xz", ".lzma")):
+            # not supported by tarfile, decompress it on the fly
+            process = subprocess.Popen(["xz", "-dc", tar_path], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            try:
+                with tarfile.open(fileobj=process.stdout, mode="r|") as tar:
+                    yield tar
+            finally:
+                process.stdout.close()
+                process.stderr.close()
+                if process.wait() not in (0, -13):  # SIGPIPE, when we didn't read everything
+                    raise UnsupportedSourceException("Can't decompress {}".format(tar_path))
+        else:
+            with tarfile.open(tar_path, mode="r|*") as tar:
+                yield tar
+    except (tarfile.TarError, IOError, OSError, EOFError) as e:
+        raise UnsupportedSourceException("Can't stream {}: {}".format(tar_path, e))
+
+
+def parse_control(content):
+    '''Return the list of {field: value} paragraphs of a deb822 file content (like debian/control)'''
+    paragraphs = []
+    paragraph = None
+    field = None
+    for line in content.splitlines():
+        if not line.strip():
+            paragraph = None
+            continue
+        if line.startswith("#"):
+            continue
+        if paragraph is None:
+            paragraph = {}
+            paragraphs.append(paragraph)
+            field = None
+        if line.startswith((" ", "\t")) and field:
+            paragraph[field] = "{}\n{}".format(paragraph[field], line.strip()).strip("\n")
+        elif ":" in line:
+            (field, value) = line.split(":", 1)
+            paragraph[field] = value.strip()
+    return paragraphs
+
+
+def get_dsc_fields(dsc_path):
+    '''Return {field: value} of dsc_path, continuation lines of multiline fields being joined with newlines'''
+    with open(dsc_path) as f:
+        lines = f.read().splitlines()
+    if lines and lines[0].startswith("-----BEGIN PGP SIGNED MESSAGE"):
+        # skip the armor headers
+        lines = lines[lines.index("") + 1:] if "" in lines else []
+    for (i, line) in enumerate(lines):
+        if line.startswith("-----BEGIN PGP SIGNATURE"):
+            lines = lines[:i]
+            break
+    paragraphs = parse_control("\n".join(lines))
+    return paragraphs[0] if paragraphs else {}
+
+
+def _strip_path(path, strip):
+    '''Strip the strip leading components of path, return None for /dev/null or paths outside of the tree'''
+    path = path.split("\t")[0].strip()
+    if path == "/dev/null":
+        return None
+    components = [component for component in path.split("/") if component and component != "."]
+    if ".." in components or len(components) <= strip:
+        return None
+    return "/".join(components[strip:])
+
+
+def _strip_last_newline(previous_line, old, new):
+    '''Handle a "\\ No newline at end of file" marker following previous_line'''
+    if previous_line[:1] in (" ", "-") and old:
+        old[-1] = old[-1].rstrip("\n")
+    if previous_line[:1] in (" ", "+") and new:
+        new[-1] = new[-1].rstrip("\n")
+
+
+def parse_patch(content, strip=1):
+    '''Return [(old path, new path, hunks)] of unified diff content, hunks being [(old start, old lines, new lines)]
+
+    Paths are None for /dev/null.'''
+    patches = []
+    lines = content.splitlines(True)
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if _unsupported_patch_regexp.match(line):
+            raise UnsupportedSourceException("Can't apply patch line: {}".format(line.strip()))
+        if not (line.startswith("--- ") and i + 1 < len(lines) and lines[i + 1].startswith("+++ ")):
+            i += 1
+            continue
+        (old_path, new_path) = (_strip_path(line[4:], strip), _strip_path(lines[i + 1][4:], strip))
+        hunks = []
+        i += 2
+        while i < len(lines):
+            hunk = _hunk_regexp.match(lines[i])
+            if not hunk:
+                break
+            old_start = int(hunk.group(1))
+            (old_count, new_count) = (int(hunk.group(2) or 1), int(hunk.group(4) or 1))
+            (old, new) = ([], [])
+            i += 1
+            while (len(old) < old_count or len(new) < new_count) and i < len(lines):
+                (kind, text) = (lines[i][:1], lines[i][1:])
+                if kind == "\\":
+                    _strip_last_newline(lines[i - 1], old, new)
+                elif kind in (" ", "\n"):
+                    old.append(text or "\n")
+                    new.append(text or "\n")
+                elif kind == "-":
+                    old.append(text)
+                elif kind == "+":
+                    new.append(text)
+                else:
+                    raise UnsupportedSourceException("Malformed hunk in patch for {}".format(new_path or old_path))
+                i += 1
+            # "\ No newline at end of file" applies to the line before it
+            while i < len(lines) and lines[i].startswith("\\"):
+                _strip_last_newline(lines[i - 1], old, new)
+                i += 1
+            hunks.append((old_start, old, new))
+        patches.append((old_path, new_path, hunks))
+    return patches
+
+
+def _apply_hunks(content, hunks, path):
+    '''Return content with hunks applied, allowing them to be offset but without any fuzz'''
+    lines = content.splitlines(True)
+    offset = 0
+    min_position = 0
+    for (old_start, old, new) in hunks:
+        expected = old_start + offset if not old else old_start - 1 + offset
+        candidates = range(min_position, len(lines) - len(old) + 1)
+        for position in sorted(candidates, key=lambda position: abs(position - expected)):
+            if lines[position:position + len(old)] == old:
+                break
+        else:
+            raise UnsupportedSourceException("Patch doesn't apply cleanly on {}".format(path))
+        lines[position:position + len(old)] = new
+        offset = position + len(new) - len(old) - (old_start - 1 if old else old_start)
+        min_position = position + len(new)
+    return "".join(lines)
+
+
+class _Tree(object):
+    '''Manifest of a source tree, keeping the content of the files in wanted or matching one of patterns'''
+
+    def __init__(self, wanted, patterns=()):
+        self.manifest = {}
+        self.contents = {}
+        self.wanted = set(wanted)
+        self.patterns = patterns
+
+    def is_wanted(self, relpath):
+        return relpath in self.wanted or any(fnmatch.fnmatch(relpath, pattern) for pattern in self.patterns)
+
+    def set_content(self, relpath, content, mode=stat.S_IFREG | 0o644):
+        self.manifest[relpath] = [len(content), mode, hashlib.sha256(content).hexdigest()]
+        if self.is_wanted(relpath):
+            self.contents[relpath] = content
+
+    def remove(self, relpath):
+        '''Remove relpath, and everything under it if it's a directory'''
+        for path in list(self.manifest):
+            if path == relpath or path.startswith(relpath + "/"):
+                del self.manifest[path]
+                self.contents.pop(path, None)
+
+    def add_tar(self, tar_path, prefix="", strip=1):
+        '''Add all members of tar_path in prefix, stripping their strip leading components'''
+        with _open_tar(tar_path) as tar:
+            self._add_members(tar, tar_path, prefix, strip)
+
+    def _add_members(self, tar, tar_path, prefix, strip):
+        top_dirs = set()
+        for member in tar:
+            components = [component for component in member.name.split("/") if component and component != "."]
+            if not components:
+                continue
+            top_dirs.add(components[0])
+            if len(top_dirs) > 1 and strip:
+                raise UnsupportedSourceException("{} has more than one top directory".format(tar_path))
+            if len(components) <= strip or member.isdir():
+                continue
+            relpath = os.path.join(prefix, *components[strip:])
+            self.contents.pop(relpath, None)
+            if member.issym():
+                self.manifest[relpath] = [len(member.linkname), stat.S_IFLNK | member.mode,
+                                          "link:" + member.linkname]
+            elif member.islnk():
+                target = [component for component in member.linkname.split("/") if component and component != "."]
+                target = os.path.join(prefix, *target[strip:])
+                if target not in self.manifest:
+                    raise UnsupportedSourceException("Unknown hard link target in {}".format(tar_path))
+                self.manifest[relpath] = list(self.manifest[target])
+                if target in self.contents and self.is_wanted(relpath):
+                    self.contents[relpath] = self.contents[target]
+            elif member.isfile():
+                self._add_file(relpath, tar.extractfile(member), member)
+
+    def _add_file(self, relpath, f, member):
+        digest = hashlib.sha256()
+        chunks = [] if self.is_wanted(relpath) else None
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+            digest.update(chunk)
+            if chunks is not None:
+                chunks.append(chunk)
+        self.manifest[relpath] = [member.size, stat.S_IFREG | member.mode, digest.hexdigest()]
+        if chunks is not None:
+            self.contents[relpath] = b''.join(chunks)
+
+    def apply_patch(self, patches, name):
+        for (old_path, new_path, hunks) in patches:
+            path = new_path or old_path
+            if path is None:
+                raise UnsupportedSourceException("No path to patch in {}".format(name))
+            if new_path is None:
+                self.remove(old_path)
+                continue
+            if path in self.manifest and path not in self.contents:
+                raise UnsupportedSourceException("{} patches {} which wasn't read".format(name, path))
+            if path in self.manifest and self.manifest[path][2].startswith("link:"):
+                raise UnsupportedSourceException("{} patches the symlink {}".format(name, path))
+            mode = self.manifest[path][1] if path in self.manifest else stat.S_IFREG | 0o644
+            self.set_content(path, _apply_hunks(self.contents.get(path, ""), hunks, path), mode)
+
+
+def _get_patch_targets(patches):
+    return set(new_path or old_path for (old_path, new_path, hunks) in patches)
+
+
+def _find_file(files, *patterns):
+    '''Return the only file in files matching one of the regexp patterns, None if there is none'''
+    matches = [filename for filename in files if any(re.search(pattern, filename) for pattern in patterns)]
+    if len(matches) > 1:
+        raise UnsupportedSourceException("More than one file matching {}".format(patterns))
+    return matches[0] if matches else None
+
+
+def _read_quilt_series(debian_tar):
+    '''Return [(patch name, parsed patch)] listed in the quilt series of debian_tar'''
+    # a first pass on the (small) debian tarball tells which upstream files are patched
+    contents = {}
+    with _open_tar(debian_tar) as tar:
+        for member in tar:
+            name = os.path.normpath(member.name)
+            if member.isfile() and name.startswith("debian/patches/"):
+                contents[name] = tar.extractfile(member).read()
+    series = contents.get("debian/patches/debian.series", contents.get("debian/patches/series", ""))
+    patches = []
+    for line in series.splitlines():
+        line = line.split("#")[0].split()
+        if not line:
+            continue
+        (name, options) = (line[0], line[1:])
+        strip = 1
+        for option in options:
+            if not re.match("^-p\d+$", option):
+                raise UnsupportedSourceException("Unsupported quilt option {} for {}".format(option, name))
+            strip = int(option[2:])
+        try:
+            content = contents[os.path.normpath(os.path.join("debian/patches", name))]
+        except KeyError:
+            raise UnsupportedSourceException("Missing patch {}".format(name))
+        patches.append((name, parse_patch(content, strip)))
+    return patches
+
+
+def read_source(dsc_path, members=(), patterns=()):
+    '''Return (manifest, contents) of the tree dpkg-source -x would extract from dsc_path
+
+    manifest has the sourcetree.build_manifest format and contents maps the relative paths in members, or matching
+    one of the glob patterns, to their content. Raise UnsupportedSourceException if that tree can't be computed
+    without extracting it.'''
+    fields = get_dsc_fields(dsc_path)
+    source_format = fields.get("Format", "1.0")
+    files = [line.split()[-1] for line in fields.get("Files", "").splitlines() if line.strip()]
+    source_dir = os.path.dirname(dsc_path)
+    path = lambda filename: os.path.join(source_dir, filename)
+
+    if source_format in ("1.0", "3.0 (native)"):
+        diff = _find_file(files, "\.diff\.gz$")
+        tarball = _find_file(files, "\.orig\.tar\.gz$", "\.tar\.\w+$")
+        if not tarball:
+            raise UnsupportedSourceException("No tarball in {}".format(dsc_path))
+        patches = []
+        if diff:
+            try:
+                with gzip.open(path(diff)) as f:
+                    patches = [(diff, parse_patch(f.read()))]
+            except IOError as e:
+                raise UnsupportedSourceException("Can't read {}: {}".format(diff, e))
+        tree = _Tree(set(members).union(*[_get_patch_targets(patch) for (name, patch) in patches]), patterns)
+        tree.add_tar(path(tarball))
+    elif source_format == "3.0 (quilt)":
+        orig = _find_file(files, "\.orig\.tar\.\w+$")
+        debian_tar = _find_file(files, "\.debian\.tar\.\w+$")
+        if not orig or not debian_tar:
+            raise UnsupportedSourceException("Missing orig or debian tarball in {}".format(dsc_path))
+        patches = _read_quilt_series(path(debian_tar))
+        tree = _Tree(set(members).union(*[_get_patch_targets(patch) for (name, patch) in patches]), patterns)
+        tree.add_tar(path(orig))
+        for filename in files:
+            component = re.search("\.orig-([\w-]+)\.tar\.\w+$", filename)
+            if component:
+                tree.remove(component.group(1))
+                tree.add_tar(path(filename), prefix=component.group(1))
+        # the debian directory of the upstream tarball is replaced by the debian tarball one
+        tree.remove("debian")
+        tree.add_tar(path(debian_tar), strip=0)
+    else:
+        raise UnsupportedSourceException("Unsupported source format {}".format(source_format))
+
+    for (name, patch) in patches:
+        tree.apply_patch(patch, name)
+    return (tree.manifest, dict((relpath, content) for (relpath, content) in tree.contents.items()
+                                if relpath in members or any(fnmatch.fnmatch(relpath, pattern) for pattern in patterns)))
+
+
+def _read_tar_members(tar_path, members, strip):
+    '''Return {relpath: content} of the regular files in members of tar_path, stopping once they are all read'''
+    contents = {}
+    with _open_tar(tar_path) as tar:
+        for member in tar:
+            components = [component for component in member.name.split("/") if component and component != "."]
+            if len(components) <= strip or not member.isfile():
+                continue
+            relpath = os.path.join(*components[strip:])
+            if relpath in members:
+                contents[relpath] = tar.extractfile(member).read()
+                if len(contents) == len(members):
+                    break
+    return contents
+
+
+def read_members(dsc_path, members):
+    '''Return {relpath: content} of the files in members of the tree dpkg-source -x would extract from dsc_path
+
+    Unlike read_source(), only the files they come from are read when we can: the debian tarball of 3.0 (quilt)
+    sources for debian files which aren't patched, the debian diff of 1.0 sources creating them. Other sources
+    are streamed until all members are found. Raise UnsupportedSourceException like read_source().'''
+    members = set(members)
+    fields = get_dsc_fields(dsc_path)
+    source_format = fields.get("Format", "1.0")
+    files = [line.split()[-1] for line in fields.get("Files", "").splitlines() if line.strip()]
+    source_dir = os.path.dirname(dsc_path)
+    path = lambda filename: os.path.join(source_dir, filename)
+
+    if source_format == "3.0 (quilt)":
+        debian_tar = _find_file(files, "\.debian\.tar\.\w+$")
+        if debian_tar and all(member.startswith("debian/") for member in members):
+            patches = _read_quilt_series(path(debian_tar))
+            patched = set().union(*[_get_patch_targets(patch) for (name, patch) in patches])
+            if not members.intersection(patched):
+                return _read_tar_members(path(debian_tar), members, strip=0)
+    elif source_format in ("1.0", "3.0 (native)"):
+        diff = _find_file(files, "\.diff\.gz$")
+        if not diff:
+            tarball = _find_file(files, "\.tar\.\w+$")
+            if tarball:
+                return _read_tar_members(path(tarball), members, strip=1)
+        else:
+            try:
+                with gzip.open(path(diff)) as f:
+                    patches = parse_patch(f.read())
+            except IOError as e:
+                raise UnsupportedSourceException("Can't read {}: {}".format(diff, e))
+            # files created by the diff aren't in the tarball
+            contents = {}
+            for (old_path, new_path, hunks) in patches:
+                if new_path in members and len(hunks) == 1 and hunks[0][0] == 0 and not hunks[0][1]:
+                    contents[new_path] = "".join(hunks[0][2])
+            if len(contents) == len(members):
+                return contents
+    return read_source(dsc_path, members)[1]
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+# Copyright (C) 2014 Canonical
+#
+# Authors:
+#  Didier Roche
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+'''Compare source trees without generating any textual diff'''
+
+import difflib
+import fnmatch
+import hashlib
+import json
+import os
+
+from .settings import RELEVANCE_EXCLUDED_FILES, RELEVANCE_EXCLUDED_DIRS
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+def file_digest(path):
+    '''Return the sha256 hex digest of the file at path'''
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _is_excluded(relpath, excluded_files):
+    return any(fnmatch.fnmatch(relpath, pattern) for pattern in excluded_files)
+
+
+def list_files(root, excluded_files=RELEVANCE_EXCLUDED_FILES, excluded_dirs=RELEVANCE_EXCLUDED_DIRS):
+    '''Return {relative path: lstat result} of all files and symlinks under root
+
+    excluded_files are globs on the relative path, excluded_dirs are directory names skipped at any level.'''
+    files = {}
+    for (dirpath, dirnames, filenames) in os.walk(root):
+        dirnames[:] = [dirname for dirname in dirnames if dirname not in excluded_dirs]
+        reldir = os.path.relpath(dirpath, root)
+        # symlinks to directories are compared as links, not walked into
+        for name in filenames + [dirname for dirname in dirnames if os.path.islink(os.path.join(dirpath, dirname))]:
+            relpath = os.path.normpath(os.path.join(reldir, name))
+            if not _is_excluded(relpath, excluded_files):
+                files[relpath] = os.lstat(os.path.join(dirpath, name))
+    return files
+
+
+def _is_same_file(path1, stat1, path2, stat2):
+    '''Compare file types and sizes first, then content'''
+    if os.path.islink(path1) or os.path.islink(path2):
+        return os.path.islink(path1) and os.path.islink(path2) and os.readlink(path1) == os.readlink(path2)
+    if stat1.st_size != stat2.st_size:
+        return False
+    return file_digest(path1) == file_digest(path2)
+
+
+def get_changed_files(tree1, tree2, excluded_files=RELEVANCE_EXCLUDED_FILES, excluded_dirs=RELEVANCE_EXCLUDED_DIRS):
+    '''Return the set of relative paths which differ between tree1 and tree2
+
+    Files only present in one of the trees are changed files.'''
+    files1 = list_files(tree1, excluded_files, excluded_dirs)
+    files2 = list_files(tree2, excluded_files, excluded_dirs)
+    changed = set(files1).symmetric_difference(files2)
+    for relpath in set(files1).intersection(files2):
+        if not _is_same_file(os.path.join(tree1, relpath), files1[relpath],
+                             os.path.join(tree2, relpath), files2[relpath]):
+            changed.add(relpath)
+    return changed
+
+
+def build_manifest(root, excluded_dirs=RELEVANCE_EXCLUDED_DIRS):
+    '''Return {relative path: [size, mode, digest]} of all files and symlinks under root
+
+    The digest of a symlink is "link:" followed by its target. Excluded files are only filtered out when comparing,
+    so that the same manifest can serve any exclusion list.'''
+    manifest = {}
+    for (relpath, stat) in list_files(root, excluded_files=(), excluded_dirs=excluded_dirs).items():
+        path = os.path.join(root, relpath)
+        if os.path.islink(path):
+            digest = "link:" + os.readlink(path)
+        else:
+            digest = file_digest(path)
+        manifest[relpath] = [stat.st_size, stat.st_mode, digest]
+    return manifest
+
+
+def get_manifest_path(tree):
+    '''Return the path of the manifest stored next to tree'''
+    return os.path.normpath(tree) + ".manifest"
+
+
+def write_manifest(tree, manifest=None):
+    '''Write the manifest of tree next to it and return it
+
+    manifest is built from tree if not provided.'''
+    if manifest is None:
+        manifest = build_manifest(tree)
+    with open(get_manifest_path(tree), 'w') as f:
+        json.dump(manifest, f, sort_keys=True)
+    return manifest
+
+
+def load_manifest(tree):
+    '''Return the manifest stored next to tree
+
+    Raise IOError if there is none and ValueError if it's corrupted.'''
+    with open(get_manifest_path(tree)) as f:
+        manifest = json.load(f)
+    # paths on disk are native strings, and so must be the manifest ones to be compared with them
+    return dict((_to_native(relpath), [size, mode, _to_native(digest)])
+                for (relpath, (size, mode, digest)) in manifest.items())
+
+
+def _to_native(value):
+    if not isinstance(value, str):
+        value = value.encode('utf-8')
+    return value
+
+
+def get_changed_files_from_manifest(tree, manifest, excluded_files=RELEVANCE_EXCLUDED_FILES,
+                                    excluded_dirs=RELEVANCE_EXCLUDED_DIRS):
+    '''Return the set of relative paths which differ between tree and the tree manifest was built from
+
+    Only files of tree having the same size than in the manifest are read.'''
+    files = list_files(tree, excluded_files, excluded_dirs)
+    manifest_files = set(relpath for relpath in manifest if not _is_excluded(relpath, excluded_files))
+    changed = set(files).symmetric_difference(manifest_files)
+    for relpath in set(files).intersection(manifest_files):
+        (size, mode, digest) = manifest[relpath]
+        path = os.path.join(tree, relpath)
+        if os.path.islink(path):
+            if digest != "link:" + os.readlink(path):
+                changed.add(relpath)
+        elif digest.startswith("link:") or files[relpath].st_size != size or file_digest(path) != digest:
+            changed.add(relpath)
+    return changed
+
+
+def get_changed_files_between_manifests(manifest1, manifest2, excluded_files=RELEVANCE_EXCLUDED_FILES):
+    '''Return the set of relative paths which differ between the trees manifest1 and manifest2 were built from'''
+    files1 = set(relpath for relpath in manifest1 if not _is_excluded(relpath, excluded_files))
+    files2 = set(relpath for relpath in manifest2 if not _is_excluded(relpath, excluded_files))
+    changed = files1.symmetric_difference(files2)
+    for relpath in files1.intersection(files2):
+        # the mode isn't part of the content
+        if (manifest1[relpath][0], manifest1[relpath][2]) != (manifest2[relpath][0], manifest2[relpath][2]):
+            changed.add(relpath)
+    return changed
+
+
+def has_relevant_control_changes(control1, control2):
+    '''Return True if control files at control1 and control2 differ on something else than Vcs-* fields or comments'''
+    with open(control1) as f:
+        lines1 = f.read().splitlines()
+    with open(control2) as f:
+        lines2 = f.read().splitlines()
+    # skip the file headers, then only changed lines and hunk headers are left
+    for line in list(difflib.unified_diff(lines1, lines2, n=0, lineterm=""))[2:]:
+        if line.startswith("@@"):
+            continue
+        if not line[1:].startswith("Vcs-") and not line[1:].startswith("#"):
+            return True
+    return False
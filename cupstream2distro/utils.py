@@ -17,7 +17,16 @@
 # this program; if not, write to the Free Software Foundation, Inc.,
 # 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
 
+from collections import OrderedDict
 from contextlib import contextmanager
+from functools import wraps
+import logging
+import Queue
+import threading
+
+_held_logs = threading.local()
+_held_logs_filter = None
+_held_logs_lock = threading.Lock()
 
 
 # this is stolen from python 3.4 :)
@@ -27,3 +36,113 @@ def ignored(*exceptions):
         yield
     except exceptions:
         pass
+
+
+def lru_cache(maxsize=128):
+    '''Memoize the last maxsize results of a function with hashable positional arguments
+
+    Simplified version of the python 3.2 functools one. The cache is cleared with the cache_clear() attribute.'''
+
+    def decorator(func):
+        cache = OrderedDict()
+        lock = threading.Lock()
+
+        @wraps(func)
+        def wrapper(*args):
+            with lock:
+                try:
+                    result = cache.pop(args)
+                except KeyError:
+                    pass
+                else:
+                    cache[args] = result
+                    return result
+            result = func(*args)
+            with lock:
+                cache[args] = result
+                if len(cache) > maxsize:
+                    cache.popitem(last=False)
+            return result
+
+        def cache_clear():
+            with lock:
+                cache.clear()
+        wrapper.cache_clear = cache_clear
+        return wrapper
+    return decorator
+
+
+def concurrent_map(func, items, workers):
+    '''Return [func(item) for item in items], running them in up to workers threads
+
+    The first exception raised by func is raised back once all items are processed.'''
+    items = list(items)
+    workers = min(workers, len(items))
+    if workers <= 1:
+        return [func(item) for item in items]
+    results = [None] * len(items)
+    errors = []
+    tasks = Queue.Queue()
+    for task in enumerate(items):
+        tasks.put(task)
+
+    def worker():
+        while True:
+            try:
+                (index, item) = tasks.get_nowait()
+            except Queue.Empty:
+                return
+            try:
+                results[index] = func(item)
+            except Exception as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=worker) for i in xrange(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return results
+
+
+class _HeldLogsFilter(logging.Filter):
+    '''Keep the records of threads holding their logs back instead of emitting them'''
+
+    def filter(self, record):
+        records = getattr(_held_logs, "records", None)
+        if records is None:
+            return True
+        # the same record goes through the filter of each handler
+        if not records or records[-1] is not record:
+            records.append(record)
+        return False
+
+
+@contextmanager
+def held_logs():
+    '''Hold back the records logged from the current thread to the root logger handlers during the context
+
+    Yield the list of held records, to be emitted later with emit_logs(). This keeps the logs of tasks running
+    concurrently grouped per task.'''
+    global _held_logs_filter
+    with _held_logs_lock:
+        if not _held_logs_filter:
+            _held_logs_filter = _HeldLogsFilter()
+        # logger filters don't see the records propagated from child loggers, handler filters do
+        for handler in logging.getLogger().handlers:
+            if _held_logs_filter not in handler.filters:
+                handler.addFilter(_held_logs_filter)
+    previous_records = getattr(_held_logs, "records", None)
+    _held_logs.records = []
+    try:
+        yield _held_logs.records
+    finally:
+        _held_logs.records = previous_records
+
+
+def emit_logs(records):
+    '''Emit records held back by held_logs()'''
+    for record in records:
+        logging.getLogger(record.name).handle(record)
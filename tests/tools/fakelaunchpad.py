@@ -0,0 +1,691 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2014 Canonical
+#
+# Authors:
+#  Didier Roche
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+'''Local stand-in for the subset of the Launchpad web service we are using
+
+The service is described by SCHEMA, from which we generate the WADL given to launchpadlib.
+Objects are seeded from a json fixture:
+    {"objects": {path: {"resource_type": type, attribute: value, "<link>_link": path, …}}}
+where paths are relative to the service root, like "ubuntu/+archive/primary".
+
+Latency and failures can be injected per API method (named operation or http method, "*" for any),
+so that we can benchmark or test launchpad bound paths without any network.
+Set CU2D_LAUNCHPAD_SERVICE_ROOT to the server url to make launchpadmanager use it.'''
+
+import BaseHTTPServer
+import copy
+import hashlib
+import json
+import random
+import SocketServer
+import threading
+import time
+import urllib
+import urlparse
+from xml.sax.saxutils import quoteattr
+
+API_VERSION = "devel"
+DEFAULT_PAGE_SIZE = 75
+MAX_PAGE_SIZE = 300
+
+# {resource type: {"attributes": [names], "links": {name: resource type},
+#                  "collections": {name: (resource type, link on the collection entries back to the entry)},
+#                  "operations": {name: (http method, [parameters], result)}}}
+# operation result is a resource type for an entry, [resource type] for a collection or None for no content
+SCHEMA = {
+    "distribution": {
+        "attributes": ["name", "display_name"],
+        "links": {"main_archive": "archive", "current_series": "distro_series"},
+        "collections": {"series": ("distro_series", "distribution")},
+        "operations": {"getSeries": ("GET", ["name_or_version"], "distro_series"),
+                       "getSourcePackage": ("GET", ["name"], "distribution_source_package")},
+    },
+    "distro_series": {
+        "attributes": ["name", "version", "status"],
+        "links": {"distribution": "distribution"},
+        "collections": {"architectures": ("distro_arch_series", "distroseries")},
+        "operations": {"getSourcePackage": ("GET", ["name"], "source_package"),
+                       "getPackageUploads": ("GET", ["name", "version", "exact_match", "status", "pocket", "archive"],
+                                             ["package_upload"])},
+    },
+    "distro_arch_series": {
+        "attributes": ["name", "architecture_tag", "is_nominated_arch_indep"],
+        "links": {"distroseries": "distro_series"},
+    },
+    "archive": {
+        "attributes": ["name", "displayname", "reference", "require_virtualized", "private"],
+        "links": {"distribution": "distribution", "owner": "team"},
+        "operations": {"getPublishedSources": ("GET", ["source_name", "version", "distro_series", "status", "pocket",
+                                                       "exact_match", "created_since_date", "order_by_date"],
+                                               ["source_package_publishing_history"]),
+                       "getPublishedBinaries": ("GET", ["binary_name", "version", "distro_arch_series", "status",
+                                                        "pocket", "exact_match", "created_since_date",
+                                                        "order_by_date"],
+                                                ["binary_package_publishing_history"]),
+                       "getBuildRecords": ("GET", ["build_state", "source_name", "pocket"], ["build"]),
+                       "copyPackage": ("POST", ["source_name", "version", "from_archive", "to_pocket", "to_series",
+                                                "include_binaries", "from_pocket", "from_series", "unembargo",
+                                                "sponsored"], None)},
+    },
+    "team": {
+        "attributes": ["name", "display_name"],
+        "operations": {"getPPAByName": ("GET", ["name", "distribution"], "archive")},
+    },
+    "source_package_publishing_history": {
+        "attributes": ["source_package_name", "source_package_version", "status", "pocket", "component_name",
+                       "date_created", "date_published", "display_name"],
+        "links": {"archive": "archive", "distro_series": "distro_series"},
+        "operations": {"getPublishedBinaries": ("GET", [], ["binary_package_publishing_history"]),
+                       "getBuilds": ("GET", [], ["build"]),
+                       "requestDeletion": ("POST", ["removal_comment"], None)},
+    },
+    "binary_package_publishing_history": {
+        "attributes": ["binary_package_name", "binary_package_version", "source_package_name",
+                       "source_package_version", "status", "pocket", "architecture_specific", "date_created",
+                       "display_name"],
+        "links": {"archive": "archive", "distro_arch_series": "distro_arch_series", "build": "build"},
+    },
+    "build": {
+        "attributes": ["title", "arch_tag", "buildstate", "source_package_name", "source_package_version",
+                       "datecreated", "date_started", "datebuilt"],
+        "links": {"archive": "archive", "current_source_publication": "source_package_publishing_history"},
+    },
+    "bug": {
+        "attributes": ["id", "title"],
+        "operations": {"addTask": ("POST", ["target"], "bug_task")},
+    },
+    "bug_task": {
+        "attributes": ["title", "status"],
+        "links": {"bug": "bug"},
+    },
+    "distribution_source_package": {
+        "attributes": ["name", "display_name"],
+        "links": {"distribution": "distribution"},
+    },
+    "source_package": {
+        "attributes": ["name", "display_name"],
+        "links": {"distribution": "distribution", "distroseries": "distro_series"},
+    },
+    "project": {
+        "attributes": ["name", "display_name"],
+    },
+    "branch": {
+        "attributes": ["name", "unique_name", "bzr_identity", "revision_count"],
+        "links": {"project": "project", "owner": "team"},
+    },
+    "branch_merge_proposal": {
+        "attributes": ["queue_status", "commit_message"],
+        "links": {"source_branch": "branch", "target_branch": "branch", "prerequisite_branch": "branch"},
+        "collections": {"all_comments": ("code_review_comment", "branch_merge_proposal")},
+        "operations": {"getRelatedBugTasks": ("GET", [], ["bug_task"])},
+    },
+    "code_review_comment": {
+        "attributes": ["title", "vote"],
+        "links": {"author": "team", "branch_merge_proposal": "branch_merge_proposal"},
+    },
+    "package_upload": {
+        "attributes": ["status", "pocket", "display_name", "display_version"],
+        "links": {"archive": "archive", "distroseries": "distro_series"},
+    },
+}
+# launchpad makes no difference between persons and teams when looking them up
+SCHEMA["person"] = SCHEMA["team"]
+
+# {collection name: resource type} linked from the service root
+ROOT_COLLECTIONS = {"distributions": "distribution", "people": "team", "bugs": "bug", "projects": "project"}
+
+WADL_MEDIA_TYPE = "application/vnd.sun.wadl+xml"
+JSON_MEDIA_TYPE = "application/json"
+
+
+def generate_wadl(root):
+    '''Return the WADL describing SCHEMA for a service at root'''
+    lines = ['<?xml version="1.0"?>',
+             '<wadl:application xmlns:wadl="http://research.sun.com/wadl/2006/10" '
+             'xmlns:xsd="http://www.w3.org/2001/XMLSchema">',
+             '<wadl:resources base={}>'.format(quoteattr(root)),
+             '<wadl:resource path="" type="{}#service-root"/>'.format(root),
+             '</wadl:resources>']
+
+    def link(resource_type=None):
+        if resource_type is None:
+            return '<wadl:link/>'
+        return '<wadl:link resource_type="{}#{}"/>'.format(root, resource_type)
+
+    def param(name, style="plain", content="", extra=""):
+        path = ' path="$[\'{}\']"'.format(name) if style == "plain" else ""
+        return '<wadl:param style="{}" name="{}"{}{}>{}</wadl:param>'.format(style, name, path, extra, content)
+
+    def get_method(method_id, representation):
+        return ('<wadl:method name="GET" id="{}"><wadl:response><wadl:representation href="{}#{}"/>'
+                '</wadl:response></wadl:method>'.format(method_id, root, representation))
+
+    # service root and its collections
+    lines.append('<wadl:resource_type id="service-root">{}</wadl:resource_type>'.format(
+        get_method("service-root-get", "service-root-json")))
+    lines.append('<wadl:representation mediaType="{}" id="service-root-json">'.format(JSON_MEDIA_TYPE))
+    lines.append(param("resource_type_link", content=link()))
+    for (name, resource_type) in sorted(ROOT_COLLECTIONS.items()):
+        lines.append(param("{}_collection_link".format(name), content=link(name)))
+    lines.append('</wadl:representation>')
+    for (name, resource_type) in sorted(ROOT_COLLECTIONS.items()):
+        lines.append('<wadl:resource_type id="{}">{}</wadl:resource_type>'.format(
+            name, get_method("{}-get".format(name), "{}-page".format(resource_type))))
+
+    for (resource_type, definition) in sorted(SCHEMA.items()):
+        methods = [get_method("{}-get".format(resource_type), "{}-full".format(resource_type))]
+        for (operation, (http_method, params, result)) in sorted(definition.get("operations", {}).items()):
+            request_params = [param("ws.op", "query", extra=' required="true" fixed="{}"'.format(operation))]
+            request_params.extend(param(name, "query") for name in params)
+            if http_method == "GET":
+                request = '<wadl:request>{}</wadl:request>'.format("".join(request_params))
+            else:
+                request = ('<wadl:request><wadl:representation mediaType="application/x-www-form-urlencoded">{}'
+                           '</wadl:representation></wadl:request>'.format("".join(request_params)))
+            if result is None:
+                response = '<wadl:response/>'
+            elif isinstance(result, list):
+                response = '<wadl:response><wadl:representation href="{}#{}-page"/></wadl:response>'.format(
+                    root, result[0])
+            elif http_method == "POST":
+                # created entries are returned through the Location header
+                response = '<wadl:response><wadl:param name="Location" style="header">{}</wadl:param></wadl:response>'.format(
+                    link(result))
+            else:
+                response = '<wadl:response><wadl:representation href="{}#{}-full"/></wadl:response>'.format(
+                    root, result)
+            methods.append('<wadl:method name="{}" id="{}-{}">{}{}</wadl:method>'.format(
+                http_method, resource_type, operation, request, response))
+        lines.append('<wadl:resource_type id="{}">{}</wadl:resource_type>'.format(resource_type, "".join(methods)))
+        lines.append('<wadl:resource_type id="{0}-page-resource">{1}</wadl:resource_type>'.format(
+            resource_type, get_method("{}-page-resource-get".format(resource_type), "{}-page".format(resource_type))))
+
+        # entry representation
+        lines.append('<wadl:representation mediaType="{}" id="{}-full">'.format(JSON_MEDIA_TYPE, resource_type))
+        lines.append(param("self_link", content=link(resource_type)))
+        lines.append(param("web_link", content=link()))
+        lines.append(param("resource_type_link", content=link()))
+        lines.append(param("http_etag"))
+        for name in definition.get("attributes", []):
+            extra = ' type="xsd:dateTime"' if name.startswith("date") else ""
+            lines.append(param(name, extra=extra))
+        for (name, linked_type) in sorted(definition.get("links", {}).items()):
+            lines.append(param("{}_link".format(name), content=link(linked_type)))
+        for (name, (linked_type, back_link)) in sorted(definition.get("collections", {}).items()):
+            lines.append(param("{}_collection_link".format(name),
+                               content=link("{}-page-resource".format(linked_type))))
+        lines.append('</wadl:representation>')
+
+        # page representation
+        lines.append('<wadl:representation mediaType="{}" id="{}-page">'.format(JSON_MEDIA_TYPE, resource_type))
+        lines.append(param("resource_type_link", content=link()))
+        lines.append(param("total_size"))
+        lines.append(param("start"))
+        lines.append(param("next_collection_link", content=link("{}-page-resource".format(resource_type))))
+        lines.append(param("prev_collection_link", content=link("{}-page-resource".format(resource_type))))
+        lines.append(param("entries"))
+        lines.append('<wadl:param style="plain" name="entry_links" path="$[\'entries\'][*][\'self_link\']">{}'
+                     '</wadl:param>'.format(link(resource_type)))
+        lines.append('</wadl:representation>')
+
+    lines.append('</wadl:application>')
+    return "\n".join(lines)
+
+
+class FakeLaunchpadError(Exception):
+    '''An http error answered to the client'''
+
+    def __init__(self, status, message):
+        super(FakeLaunchpadError, self).__init__(message)
+        self.status = status
+
+
+class FakeLaunchpad(object):
+    '''The launchpad objects and the named operations acting on them'''
+
+    def __init__(self, objects, latency=None, failures=None, seed=None):
+        self.objects = copy.deepcopy(objects)
+        self.latency = latency or {}
+        self.failures = failures or {}
+        self.random = random.Random(seed)
+        self.request_counts = {}
+        self.lock = threading.RLock()
+        self._next_id = 100000
+
+    def new_id(self):
+        with self.lock:
+            self._next_id += 1
+            return self._next_id
+
+    def find(self, resource_type, **criteria):
+        '''Return [(path, object)] of resource_type matching all criteria, sorted by path'''
+        result = []
+        for (path, obj) in sorted(self.objects.items()):
+            if obj["resource_type"] != resource_type:
+                continue
+            if all(obj.get(key) == value for (key, value) in criteria.items() if value is not None):
+                result.append((path, obj))
+        return result
+
+    def get(self, path):
+        try:
+            return self.objects[path]
+        except KeyError:
+            raise FakeLaunchpadError(404, "Object: {} not found".format(path))
+
+    def inject(self, api_method):
+        '''Count the request, sleep and raise according to the injected latency and failures for api_method'''
+        with self.lock:
+            self.request_counts[api_method] = self.request_counts.get(api_method, 0) + 1
+            failure_rate = self.failures.get(api_method, self.failures.get("*", 0))
+            failing = failure_rate and self.random.random() < failure_rate
+        latency = self.latency.get(api_method, self.latency.get("*", 0))
+        if latency:
+            time.sleep(latency)
+        if failing:
+            raise FakeLaunchpadError(503, "Injected failure for {}".format(api_method))
+
+    @staticmethod
+    def _newest_first(entries):
+        return sorted(entries, key=lambda entry: (entry[1].get("date_created") or entry[1].get("datecreated") or "",
+                                                  entry[0]), reverse=True)
+
+    @staticmethod
+    def _match_name(obj, key, name, exact_match):
+        if name is None:
+            return True
+        if exact_match:
+            return obj.get(key) == name
+        return name in (obj.get(key) or "")
+
+    # named operations, called with (path, object, **params). They return a path, [paths] or None
+
+    def distribution_getSeries(self, path, obj, name_or_version=None):
+        for (series_path, series) in self.find("distro_series", distribution_link=path):
+            if name_or_version in (series.get("name"), series.get("version")):
+                return series_path
+        raise FakeLaunchpadError(400, "No such distribution series: '{}'.".format(name_or_version))
+
+    def _get_source_package(self, path, resource_type, name, links):
+        package_path = "{}/+source/{}".format(path, name)
+        with self.lock:
+            if package_path not in self.objects:
+                package = {"resource_type": resource_type, "name": name, "display_name": name}
+                package.update(links)
+                self.objects[package_path] = package
+        return package_path
+
+    def distribution_getSourcePackage(self, path, obj, name=None):
+        return self._get_source_package(path, "distribution_source_package", name, {"distribution_link": path})
+
+    def distro_series_getSourcePackage(self, path, obj, name=None):
+        return self._get_source_package(path, "source_package", name,
+                                        {"distroseries_link": path, "distribution_link": obj.get("distribution_link")})
+
+    def distro_series_getPackageUploads(self, path, obj, name=None, version=None, exact_match=False, status=None,
+                                        pocket=None, archive=None):
+        uploads = [(upload_path, upload) for (upload_path, upload)
+                   in self.find("package_upload", distroseries_link=path, status=status, pocket=pocket,
+                                archive_link=archive, display_version=version)
+                   if self._match_name(upload, "display_name", name, exact_match)]
+        return [upload_path for (upload_path, upload) in self._newest_first(uploads)]
+
+    def team_getPPAByName(self, path, obj, name=None, distribution=None):
+        for (archive_path, archive) in self.find("archive", owner_link=path, name=name,
+                                                 distribution_link=distribution):
+            return archive_path
+        raise FakeLaunchpadError(404, "No such ppa: '{}'.".format(name))
+
+    person_getPPAByName = team_getPPAByName
+
+    def archive_getPublishedSources(self, path, obj, source_name=None, version=None, distro_series=None, status=None,
+                                    pocket=None, exact_match=False, created_since_date=None, order_by_date=False):
+        sources = [(source_path, source) for (source_path, source)
+                   in self.find("source_package_publishing_history", archive_link=path, distro_series_link=distro_series,
+                                status=status, pocket=pocket, source_package_version=version)
+                   if self._match_name(source, "source_package_name", source_name, exact_match) and
+                   (not created_since_date or source.get("date_created", "") >= created_since_date)]
+        return [source_path for (source_path, source) in self._newest_first(sources)]
+
+    def archive_getPublishedBinaries(self, path, obj, binary_name=None, version=None, distro_arch_series=None,
+                                     status=None, pocket=None, exact_match=False, created_since_date=None,
+                                     order_by_date=False):
+        binaries = [(binary_path, binary) for (binary_path, binary)
+                    in self.find("binary_package_publishing_history", archive_link=path,
+                                 distro_arch_series_link=distro_arch_series, status=status, pocket=pocket,
+                                 binary_package_version=version)
+                    if self._match_name(binary, "binary_package_name", binary_name, exact_match) and
+                    (not created_since_date or binary.get("date_created", "") >= created_since_date)]
+        return [binary_path for (binary_path, binary) in self._newest_first(binaries)]
+
+    def archive_getBuildRecords(self, path, obj, build_state=None, source_name=None, pocket=None):
+        builds = [(build_path, build) for (build_path, build) in self.find("build", archive_link=path,
+                                                                           buildstate=build_state)
+                  if self._match_name(build, "source_package_name", source_name, False)]
+        return [build_path for (build_path, build) in self._newest_first(builds)]
+
+    def archive_copyPackage(self, path, obj, source_name=None, version=None, from_archive=None, to_pocket=None,
+                            to_series=None, include_binaries=False, from_pocket=None, from_series=None, unembargo=False,
+                            sponsored=None):
+        sources = self.archive_getPublishedSources(from_archive, self.get(from_archive), source_name=source_name,
+                                                   version=version, exact_match=True)
+        if not sources:
+            raise FakeLaunchpadError(400, "{} {} not found in {}".format(source_name, version, from_archive))
+        source = copy.deepcopy(self.objects[sources[0]])
+        if to_series:
+            source["distro_series_link"] = self.distribution_getSeries(obj["distribution_link"], None, to_series)
+        source.update({"archive_link": path, "status": "Pending", "pocket": (to_pocket or "Release").capitalize(),
+                       "date_created": time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime()),
+                       "date_published": None})
+        with self.lock:
+            self.objects["{}/+sourcepub/{}".format(path, self.new_id())] = source
+        return None
+
+    def source_package_publishing_history_getPublishedBinaries(self, path, obj):
+        binaries = [(binary_path, binary) for (binary_path, binary)
+                    in self.find("binary_package_publishing_history", archive_link=obj.get("archive_link"),
+                                 source_package_name=obj.get("source_package_name"),
+                                 source_package_version=obj.get("source_package_version"))
+                    if binary.get("status") in ("Pending", "Published")]
+        return [binary_path for (binary_path, binary) in self._newest_first(binaries)]
+
+    def source_package_publishing_history_getBuilds(self, path, obj):
+        return [build_path for (build_path, build) in self.find("build", current_source_publication_link=path)]
+
+    def source_package_publishing_history_requestDeletion(self, path, obj, removal_comment=None):
+        obj["status"] = "Deleted"
+        return None
+
+    def bug_addTask(self, path, obj, target=None):
+        task_path = "{}/+bug/{}".format(target, obj.get("id"))
+        with self.lock:
+            self.objects[task_path] = {"resource_type": "bug_task", "title": obj.get("title"), "status": "New",
+                                       "bug_link": path}
+        return task_path
+
+    def branch_merge_proposal_getRelatedBugTasks(self, path, obj):
+        return [task for task in obj.get("related_bug_tasks", []) if task in self.objects]
+
+
+class FakeLaunchpadHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    '''Answer launchpadlib requests from the FakeLaunchpad of the server'''
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def fake(self):
+        return self.server.fake
+
+    @property
+    def root(self):
+        return "http://{}:{}/{}/".format(self.server.server_address[0], self.server.server_address[1], API_VERSION)
+
+    def to_url(self, path):
+        return None if path is None else self.root + path
+
+    def to_path(self, value):
+        '''Turn a json encoded parameter value to a python value, urls to our object paths'''
+        try:
+            value = json.loads(value)
+        except ValueError:
+            pass
+        if isinstance(value, basestring) and value.startswith(self.root):
+            value = value[len(self.root):]
+        return value
+
+    def representation(self, path):
+        obj = self.fake.get(path)
+        resource_type = obj["resource_type"]
+        definition = SCHEMA[resource_type]
+        result = {"self_link": self.to_url(path), "web_link": "https://launchpad.test/{}".format(path),
+                  "resource_type_link": "{}#{}".format(self.root, resource_type)}
+        for name in definition.get("attributes", []):
+            result[name] = obj.get(name)
+        for name in definition.get("links", {}):
+            result["{}_link".format(name)] = self.to_url(obj.get("{}_link".format(name)))
+        for name in definition.get("collections", {}):
+            result["{}_collection_link".format(name)] = self.to_url("{}/{}".format(path, name))
+        result["http_etag"] = '"{}"'.format(hashlib.sha1(json.dumps(result, sort_keys=True)).hexdigest())
+        return result
+
+    def page(self, paths, resource_type, query):
+        '''Return the page of paths requested in query'''
+        start = int(query.get("ws.start", 0))
+        size = min(int(query.get("ws.size", DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+        result = {"total_size": len(paths), "start": start,
+                  "resource_type_link": "{}#{}-page-resource".format(self.root, resource_type),
+                  "entries": [self.representation(path) for path in paths[start:start + size]]}
+
+        def page_link(page_start):
+            page_query = dict(query)
+            page_query.update({"ws.start": page_start, "ws.size": size})
+            return "{}{}?{}".format(self.root, self.path_in_api, urllib.urlencode(sorted(page_query.items())))
+        if start + size < len(paths):
+            result["next_collection_link"] = page_link(start + size)
+        if start > 0:
+            result["prev_collection_link"] = page_link(max(0, start - size))
+        return result
+
+    def answer(self, status, content=None, media_type=JSON_MEDIA_TYPE, headers=None):
+        if content is None:
+            body = "null" if status == 200 else ""
+        elif isinstance(content, basestring):
+            body = content
+        else:
+            body = json.dumps(content)
+        self.send_response(status)
+        self.send_header("Content-Type", media_type)
+        self.send_header("Content-Length", str(len(body)))
+        for (key, value) in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def parse_request_path(self):
+        (scheme, netloc, path, query, fragment) = urlparse.urlsplit(self.path)
+        prefix = "/{}/".format(API_VERSION)
+        if not path.startswith(prefix) and path != prefix[:-1]:
+            raise FakeLaunchpadError(404, "Unknown api version: {}".format(path))
+        self.path_in_api = urllib.unquote(path[len(prefix):]).rstrip("/")
+        return dict(urlparse.parse_qsl(query, keep_blank_values=True))
+
+    def run_operation(self, params):
+        '''Run the named operation in params on the requested object, return (status, content, headers)'''
+        operation = params["ws.op"]
+        obj = self.fake.get(self.path_in_api)
+        resource_type = obj["resource_type"]
+        try:
+            (http_method, param_names, result) = SCHEMA[resource_type]["operations"][operation]
+        except KeyError:
+            raise FakeLaunchpadError(400, "No such operation: {}".format(operation))
+        kwargs = dict((key, self.to_path(value)) for (key, value) in params.items()
+                      if key in param_names)
+        answer = getattr(self.fake, "{}_{}".format(resource_type, operation))(self.path_in_api, obj, **kwargs)
+        if result is None:
+            return (200, None, {})
+        if isinstance(result, list):
+            return (200, self.page(answer, result[0], params), {})
+        if http_method == "POST":
+            return (201, "", {"Location": self.to_url(answer)})
+        return (200, self.representation(answer), {})
+
+    def handle_request(self, method, params):
+        api_method = params.get("ws.op", method)
+        self.fake.inject(api_method)
+        if "ws.op" in params:
+            return self.run_operation(params)
+        if method == "PATCH":
+            return (209, self.representation(self.path_in_api), {})
+        if not self.path_in_api:
+            if WADL_MEDIA_TYPE in self.headers.get("Accept", ""):
+                return (200, generate_wadl(self.root), {"Content-Type": WADL_MEDIA_TYPE})
+            root = {"resource_type_link": "{}#service-root".format(self.root)}
+            for name in ROOT_COLLECTIONS:
+                root["{}_collection_link".format(name)] = self.to_url(name)
+            return (200, root, {})
+        if self.path_in_api in ROOT_COLLECTIONS:
+            resource_type = ROOT_COLLECTIONS[self.path_in_api]
+            return (200, self.page([path for (path, obj) in self.fake.find(resource_type)], resource_type, params), {})
+        if self.path_in_api in self.fake.objects:
+            return (200, self.representation(self.path_in_api), {})
+        # collection of an entry
+        (parent_path, sep, name) = self.path_in_api.rpartition("/")
+        parent = self.fake.get(parent_path)
+        try:
+            (resource_type, back_link) = SCHEMA[parent["resource_type"]]["collections"][name]
+        except KeyError:
+            raise FakeLaunchpadError(404, "Object: {} not found".format(self.path_in_api))
+        paths = [path for (path, obj) in self.fake.find(resource_type, **{"{}_link".format(back_link): parent_path})]
+        return (200, self.page(paths, resource_type, params), {})
+
+    def dispatch(self, method):
+        body = ""
+        if "Content-Length" in self.headers:
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+        try:
+            params = self.parse_request_path()
+            if method == "POST":
+                params.update(urlparse.parse_qsl(body, keep_blank_values=True))
+            elif method == "PATCH":
+                obj = self.fake.get(self.path_in_api)
+                for (key, value) in json.loads(body).items():
+                    obj[key] = self.to_path(json.dumps(value))
+            (status, content, headers) = self.handle_request(method, params)
+        except FakeLaunchpadError as e:
+            self.answer(e.status, str(e), "text/plain")
+            return
+        media_type = headers.pop("Content-Type", JSON_MEDIA_TYPE)
+        self.answer(status, content, media_type, headers)
+
+    def do_GET(self):
+        self.dispatch("GET")
+
+    def do_POST(self):
+        self.dispatch("POST")
+
+    def do_PATCH(self):
+        self.dispatch("PATCH")
+
+
+class FakeLaunchpadServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    '''A threaded http server answering from a FakeLaunchpad'''
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, fake, port=0):
+        BaseHTTPServer.HTTPServer.__init__(self, ("127.0.0.1", port), FakeLaunchpadHandler)
+        self.fake = fake
+
+    @property
+    def service_root(self):
+        '''The root url to give to launchpadlib'''
+        return "http://{}:{}/".format(*self.server_address)
+
+
+def load_fixture(path):
+    '''Return the objects of a json fixture'''
+    with open(path) as f:
+        return json.load(f)["objects"]
+
+
+def add_packages(objects, archive_path, series_path, count, prefix="generated"):
+    '''Add count source packages published in archive_path, with builds and binaries on all series archs
+
+    This is used to benchmark at a bigger scale than the fixtures'''
+    archs = [(path, obj) for (path, obj) in sorted(objects.items())
+             if obj["resource_type"] == "distro_arch_series" and obj.get("distroseries_link") == series_path]
+    for num in xrange(count):
+        name = "{}{}".format(prefix, num)
+        source_path = "{}/+sourcepub/{}".format(archive_path, 200000 + num)
+        objects[source_path] = {"resource_type": "source_package_publishing_history", "source_package_name": name,
+                                "source_package_version": "1.0-0ubuntu1", "status": "Published",
+                                "pocket": "Release", "component_name": "main",
+                                "date_created": "2014-08-01T10:00:00+00:00", "archive_link": archive_path,
+                                "distro_series_link": series_path}
+        for (arch_path, arch) in archs:
+            build_path = "{}/+build/{}{}".format(archive_path, 300000 + num, arch["architecture_tag"])
+            objects[build_path] = {"resource_type": "build", "arch_tag": arch["architecture_tag"],
+                                   "buildstate": "Successfully built", "source_package_name": name,
+                                   "source_package_version": "1.0-0ubuntu1",
+                                   "title": "{} build of {} 1.0-0ubuntu1".format(arch["architecture_tag"], name),
+                                   "archive_link": archive_path, "current_source_publication_link": source_path}
+            objects["{}/+binarypub/{}{}".format(archive_path, 400000 + num, arch["architecture_tag"])] = {
+                "resource_type": "binary_package_publishing_history", "binary_package_name": name,
+                "binary_package_version": "1.0-0ubuntu1", "source_package_name": name,
+                "source_package_version": "1.0-0ubuntu1", "status": "Published", "pocket": "Release",
+                "architecture_specific": True, "date_created": "2014-08-01T11:00:00+00:00",
+                "archive_link": archive_path, "distro_arch_series_link": arch_path, "build_link": build_path}
+
+
+def start_server(objects, port=0, latency=None, failures=None, seed=None):
+    '''Start a fake launchpad server in a background thread for objects, return the server'''
+    server = FakeLaunchpadServer(FakeLaunchpad(objects, latency, failures, seed), port)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+def _parse_per_method(values):
+    '''Turn ["method=value", …] into {method: float(value)}'''
+    result = {}
+    for value in values:
+        (method, sep, number) = value.rpartition("=")
+        result[method or "*"] = float(number)
+    return result
+
+
+if __name__ == '__main__':
+    import argparse
+    import logging
+    import os
+
+    parser = argparse.ArgumentParser(description="Serve a local stand-in of the launchpad web service from a fixture",
+                                     epilog="Point scripts to it with CU2D_LAUNCHPAD_SERVICE_ROOT=http://localhost:<port>/")
+    parser.add_argument("-p", "--port", type=int, default=8089, help="Port to listen to")
+    parser.add_argument("-f", "--fixture", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..",
+                                                                 "data", "launchpad", "silo.json"),
+                        help="Json file of the launchpad objects to serve")
+    parser.add_argument("--latency", action="append", default=[], metavar="METHOD=SECONDS",
+                        help="Add latency to a named operation or http method (* or no method for all)")
+    parser.add_argument("--failure-rate", action="append", default=[], metavar="METHOD=RATE",
+                        help="Answer a 503 to this ratio of requests of a named operation or http method")
+    parser.add_argument("--packages", type=int, default=0,
+                        help="Generate that number of additional built packages in --archive for --series")
+    parser.add_argument("--archive", default="~ci-train-ppa-service/+archive/ubuntu/landing-001")
+    parser.add_argument("--series", default="ubuntu/utopic")
+    args = parser.parse_args()
+    logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s', level=logging.INFO)
+
+    objects = load_fixture(args.fixture)
+    if args.packages:
+        add_packages(objects, args.archive, args.series, args.packages)
+    server = FakeLaunchpadServer(FakeLaunchpad(objects, _parse_per_method(args.latency),
+                                               _parse_per_method(args.failure_rate)), args.port)
+    logging.info("Serving {} objects on {}".format(len(objects), server.service_root))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    for (method, count) in sorted(server.fake.request_counts.items()):
+        logging.info("{}: {} requests".format(method, count))
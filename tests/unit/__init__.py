@@ -18,9 +18,13 @@
 # 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
 
 
+from lazr.restfulclient._browser import Browser
+from mock import patch
 import os
+import Queue
+import threading
 
-from ..tools import basetestcase
+from ..tools import basetestcase, fakelaunchpad
 
 
 class BaseUnitTestCase(basetestcase.BaseTestCase):
@@ -54,3 +58,52 @@ class BaseUnitTestCaseWithErrors(BaseUnitTestCase):
             os.environ.pop('MOCK_ERROR_MODE')
         except:
             pass
+
+
+class BaseFakeLaunchpadTestCase(BaseUnitTestCase):
+    '''Base unit test case module, against the local launchpad stand-in started by start_server()'''
+
+    def setUp(self):
+        super(BaseFakeLaunchpadTestCase, self).setUp()
+        self.objects = fakelaunchpad.load_fixture(os.path.join(self.data_dir, "launchpad", "silo.json"))
+        self.server = None
+        # everything launchpad related is kept per process, start from scratch
+        for (target, value) in (('cupstream2distro.launchpadmanager.launchpad', None),
+                                ('cupstream2distro.launchpadmanager._session_pool', Queue.Queue()),
+                                ('cupstream2distro.launchpadmanager._session_count', 0),
+                                ('cupstream2distro.launchpadmanager._local', threading.local()),
+                                ('cupstream2distro.launchpadmanager.COMMON_LAUNCHPAD_CACHE_DIR',
+                                 os.path.abspath('launchpad.cache')),
+                                ('cupstream2distro.cachemanager.COMMON_CACHE_DIR', os.path.abspath('cache')),
+                                ('cupstream2distro.ratelimiter.LAUNCHPAD_RATE_LIMIT_FILE',
+                                 os.path.abspath('launchpad.ratelimit'))):
+            patcher = patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        for target in ('cupstream2distro.launchpadmanager._resources',
+                       'cupstream2distro.launchpadmanager._named_resources',
+                       'cupstream2distro.launchpadmanager._wadl_applications',
+                       'cupstream2distro.launchpadmanager._api_stats',
+                       'cupstream2distro.packagemanager._published_sources_index'):
+            patcher = patch.dict(target, clear=True)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = patch.object(Browser, 'get_wadl_application', Browser.__dict__['get_wadl_application'])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+        super(BaseFakeLaunchpadTestCase, self).tearDown()
+
+    def start_server(self, **kwargs):
+        '''Start the server on the fixture and make launchpadmanager use it'''
+        kwargs.setdefault("seed", 0)
+        self.server = fakelaunchpad.start_server(self.objects, **kwargs)
+        patcher = patch.dict('os.environ', {'CU2D_LAUNCHPAD_SERVICE_ROOT': self.server.service_root,
+                                            'JOB_NAME': 'fakelaunchpad'})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return self.server.fake
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2014 Canonical
+#
+# Authors:
+#  Didier Roche
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+from . import BaseUnitTestCase
+
+from cupstream2distro import artifactstore
+from cupstream2distro.sourcetree import file_digest
+
+from mock import patch
+import os
+
+
+class ArtifactStoreTests(BaseUnitTestCase):
+
+    def setUp(self):
+        super(ArtifactStoreTests, self).setUp()
+        patcher = patch('cupstream2distro.artifactstore.ARTIFACT_STORE_DIR', os.path.abspath('store'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.package_dir = os.path.join(self.data_dir, "ubuntu_source_packages", "foo_package")
+        self.tarball_url = os.path.join(self.package_dir, "foo_42.0daily83.09.13.2.orig.tar.gz")
+        self.tarball_sha256 = file_digest(self.tarball_url)
+
+    def write(self, path, content):
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def list_store(self):
+        return sorted(filename for (dirpath, dirnames, filenames) in os.walk('store') for filename in filenames
+                      if not filename.startswith('.'))
+
+    def test_get_dsc_checksums(self):
+        '''We read the sha256 and size of every file listed in the dsc'''
+        checksums = artifactstore.get_dsc_checksums(os.path.join(self.package_dir, "foo_42.0daily83.09.13.2-0ubuntu1.dsc"))
+        self.assertEquals(checksums, {
+            "foo_42.0daily83.09.13.2.orig.tar.gz":
+                ("3fe98fe69e74fe1290a12c7a62aa89333368f4fabbc0517cfd8a82a7f19a4483", 10240),
+            "foo_42.0daily83.09.13.2-0ubuntu1.diff.gz":
+                ("3fc01d24134d8e8fb7211620a3207755ac67c3ca1f6e026e544780adb18b943c", 991)})
+
+    def test_fetch_links_from_store(self):
+        '''We download a file in the store, then hard link it to every destination'''
+        artifactstore.fetch(self.tarball_url, "tarball1", self.tarball_sha256, 10240)
+        with patch('cupstream2distro.artifactstore.downloader.download') as downloadMock:
+            artifactstore.fetch(self.tarball_url, "tarball2", self.tarball_sha256, 10240)
+        self.assertFalse(downloadMock.called)
+        self.assertEquals(os.stat("tarball1").st_ino, os.stat("tarball2").st_ino)
+        self.assertEquals(self.list_store(), [self.tarball_sha256])
+
+    def test_fetch_checksum_mismatch(self):
+        '''We refuse files not matching their checksum and don't store them'''
+        with self.assertRaises(Exception):
+            artifactstore.fetch(self.tarball_url, "tarball", "0" * 64, 10240)
+        with self.assertRaises(Exception):
+            artifactstore.fetch(self.tarball_url, "tarball", self.tarball_sha256, 42)
+        self.assertFalse(os.path.exists("tarball"))
+        self.assertEquals(self.list_store(), [])
+
+    def test_fetch_resumes_partial_download(self):
+        '''We resume a download interrupted in a previous run'''
+        os.makedirs(os.path.join('store', self.tarball_sha256[:2]))
+        with open(self.tarball_url, 'rb') as f:
+            self.write(os.path.join('store', self.tarball_sha256[:2], '.{}.partial'.format(self.tarball_sha256)),
+                       f.read(4096))
+        with patch('cupstream2distro.downloader._fetch') as fetchMock:
+            fetchMock.side_effect = lambda url, transfer, size: transfer.write(open(url, 'rb').read()[transfer.size:])
+            artifactstore.fetch(self.tarball_url, "tarball", self.tarball_sha256, 10240)
+        self.assertEquals(file_digest("tarball"), self.tarball_sha256)
+        self.assertEquals(self.list_store(), [self.tarball_sha256])
+
+    def test_fetch_after_eviction(self):
+        '''We download again a file evicted from the store'''
+        artifactstore.fetch(self.tarball_url, "tarball1", self.tarball_sha256, 10240)
+        artifactstore.evict(max_size=0)
+        self.assertEquals(self.list_store(), [])
+        artifactstore.fetch(self.tarball_url, "tarball2", self.tarball_sha256, 10240)
+        self.assertEquals(self.list_store(), [self.tarball_sha256])
+
+    def test_evict_least_recently_used(self):
+        '''We evict the least recently used files first, down to the budget'''
+        for (name, atime) in (("aaold", 1000), ("bbused", 3000), ("ccnew", 2000)):
+            os.makedirs(os.path.join("store", name[:2]))
+            path = os.path.join("store", name[:2], name)
+            self.write(path, "0123456789")
+            os.utime(path, (atime, atime))
+        artifactstore.evict(max_size=20)
+        self.assertEquals(self.list_store(), ["bbused", "ccnew"])
+        artifactstore.evict(max_size=10, keep=os.path.abspath(os.path.join("store", "cc", "ccnew")))
+        self.assertEquals(self.list_store(), ["ccnew"])
+
+    def test_download_source(self):
+        '''We download the dsc directly and the files it lists through the store'''
+        urls = [os.path.join(self.package_dir, filename) for filename in os.listdir(self.package_dir)
+                if not os.path.isdir(os.path.join(self.package_dir, filename))]
+        artifactstore.download_source(urls)
+        self.assertEquals(sorted(os.listdir('.')), sorted([os.path.basename(url) for url in urls] + ["store"]))
+        self.assertEquals(len(self.list_store()), 2)
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2014 Canonical
+#
+# Authors:
+#  Didier Roche
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+from . import BaseUnitTestCase
+
+from cupstream2distro import cachemanager
+
+from mock import patch
+import os
+
+
+class CacheManagerTests(BaseUnitTestCase):
+
+    def setUp(self):
+        super(CacheManagerTests, self).setUp()
+        patcher = patch('cupstream2distro.cachemanager.COMMON_CACHE_DIR', os.path.abspath('cache'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_save_and_load(self):
+        '''We load back a value that we saved'''
+        self.assertTrue(cachemanager.save("foo", ["a", 1, None], {"bar": [1, 2]}, 60))
+        self.assertEquals(cachemanager.load("foo", ["a", 1, None]), {"bar": [1, 2]})
+
+    def test_load_falsy_value(self):
+        '''We load back a falsy value, which is different from a cache miss'''
+        cachemanager.save("foo", "key", False, 60)
+        self.assertEquals(cachemanager.load("foo", "key"), False)
+
+    def test_load_missing_key(self):
+        '''We raise a KeyError on a cache miss'''
+        with self.assertRaises(KeyError):
+            cachemanager.load("foo", "key")
+
+    def test_namespaces_are_separated(self):
+        '''The same key in two namespaces point to two different entries'''
+        cachemanager.save("foo", "key", 1, 60)
+        with self.assertRaises(KeyError):
+            cachemanager.load("bar", "key")
+
+    @patch('cupstream2distro.cachemanager.time')
+    def test_load_expired_entry(self, timeMock):
+        '''We raise a KeyError on an expired entry and remove it'''
+        timeMock.time.return_value = 1000
+        cachemanager.save("foo", "key", 1, 60)
+        timeMock.time.return_value = 1061
+        with self.assertRaises(KeyError):
+            cachemanager.load("foo", "key")
+        timeMock.time.return_value = 1000
+        with self.assertRaises(KeyError):
+            cachemanager.load("foo", "key")
+
+    def test_invalidate(self):
+        '''We don't load back an invalidated entry'''
+        cachemanager.save("foo", "key", 1, 60)
+        cachemanager.invalidate("foo", "key")
+        with self.assertRaises(KeyError):
+            cachemanager.load("foo", "key")
+
+    def test_invalidate_missing_entry(self):
+        '''Invalidating a missing entry is a noop'''
+        cachemanager.invalidate("foo", "key")
+
+    def test_save_unserializable_value(self):
+        '''We don't fail if a value can't be saved, only report it'''
+        self.assertFalse(cachemanager.save("foo", "key", object(), 60))
+        with self.assertRaises(KeyError):
+            cachemanager.load("foo", "key")
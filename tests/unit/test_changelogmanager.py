@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2014 Canonical
+#
+# Authors:
+#  Didier Roche
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+from . import BaseUnitTestCase
+
+from cupstream2distro import changelogmanager
+
+from mock import patch
+import os
+import shutil
+from StringIO import StringIO
+
+
+class ChangelogManagerTests(BaseUnitTestCase):
+
+    def setUp(self):
+        super(ChangelogManagerTests, self).setUp()
+        patcher = patch.dict('cupstream2distro.changelogmanager._index', clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_parse_entries(self):
+        '''We index every entry with its metadata, newest first'''
+        with open(os.path.join(self.changelogs_file_dir, 'different_bugs_pattern')) as f:
+            entries = changelogmanager.parse(f)
+        self.assertEquals([(entry.package, entry.version, entry.distribution, entry.urgency) for entry in entries],
+                          [("foo", "42.0daily83.09.13-0ubuntu2", "UNRELEASED", "low"),
+                           ("foo", "42.0daily83.09.13-0ubuntu1", "raring", "low")])
+        self.assertEquals(entries[0].maintainer, "Rocks Did <didrocks@ubuntu.com>")
+        self.assertEquals(entries[0].date, "Sun, 17 Feb 2013 19:06:09 +0000")
+        self.assertFalse(entries[0].released)
+        self.assertTrue(entries[1].released)
+
+    def test_parse_bugs(self):
+        '''We only index bugs in the format launchpad accepts'''
+        with open(os.path.join(self.changelogs_file_dir, 'different_bugs_pattern')) as f:
+            entries = changelogmanager.parse(f)
+        self.assertEquals(entries[0].bugs, set(['56789', '67890', '34567', '12345', '567890', '678901', '123456',
+                                                '1234567']))
+        self.assertEquals(entries[1].bugs, set())
+
+    def test_parse_snapshot_markers(self):
+        '''We index distro and ppa snapshot markers in their order'''
+        with open(os.path.join(self.changelogs_file_dir, 'destppa_with_2_versions')) as f:
+            entries = changelogmanager.parse(f)
+        self.assertEquals([entry.snapshot_revs for entry in entries],
+                          [[(42, 'ubuntu-unity/next'), (43, 'ubuntu-unity/next')], [(8, None)], [(1, None)]])
+
+    def test_parse_snapshot_marker_on_two_lines(self):
+        '''We index a ppa snapshot marker wrapped on two lines'''
+        with open(os.path.join(self.changelogs_file_dir, 'destppa_with_marker_two_lines')) as f:
+            entries = changelogmanager.parse(f)
+        self.assertEquals(entries[0].snapshot_revs, [(42, 'ubuntu-unity/experimental-certified')])
+
+    def test_entry_offsets(self):
+        '''We can read back the raw content of an entry from its offsets'''
+        with open(os.path.join(self.changelogs_file_dir, 'destppa_with_distro_first')) as f:
+            content = f.read()
+            f.seek(0)
+            entries = changelogmanager.get_entries(f)
+        self.assertEquals(content[entries[0].start:entries[0].end],
+                          "foo (42.0daily83.09.13.2-0ubuntu1) raring; urgency=low\n\n"
+                          "  * Automatic snapshot from revision 42\n\n"
+                          " -- Didier Roche <didrocks@ubuntu.com>  Mon, 25 Feb 2013 10:33:30 +0100\n")
+        self.assertTrue(content[entries[1].start:entries[1].end].startswith("foo (42.0daily83.09.13.1-0ubuntu1)"))
+
+    def test_parse_file_object_without_path(self):
+        '''We parse file objects which are not on disk'''
+        entries = changelogmanager.get_entries(StringIO("foo (1.0) utopic; urgency=medium\n\n  * Fix (LP: #12345)\n"))
+        self.assertEquals([(entry.version, entry.bugs) for entry in entries], [("1.0", set(['12345']))])
+
+    def test_read_top_entry(self):
+        '''We only read the top entry, up to its trailer'''
+        f = StringIO("foo (1.0) utopic; urgency=medium\n\n  * Fix\n\n -- Foo <foo@bar.com>  Mon, 25 Feb 2013 10:33:30 +0100\n"
+                     "garbage which isn't read\n")
+        entry = changelogmanager.read_top_entry(f)
+        self.assertEquals((entry.package, entry.version), ("foo", "1.0"))
+        self.assertEquals(f.read(), "garbage which isn't read\n")
+
+    def test_read_top_entry_without_trailer(self):
+        '''We don't return a top entry without trailer'''
+        self.assertIsNone(changelogmanager.read_top_entry(StringIO("foo (1.0) utopic; urgency=medium\n\n  * Fix\n\n"
+                                                                   "foo (0.9) utopic; urgency=medium\n")))
+        self.assertIsNone(changelogmanager.read_top_entry(StringIO("")))
+
+    def get_entries(self, path):
+        with open(path) as f:
+            return changelogmanager.get_entries(f)
+
+    @patch('cupstream2distro.changelogmanager.parse')
+    def test_index_is_cached(self, parseMock):
+        '''We only parse a changelog once while it doesn't change'''
+        parseMock.return_value = ["entry"]
+        shutil.copy(os.path.join(self.changelogs_file_dir, 'one_unreleased'), 'changelog')
+        self.assertEquals(self.get_entries('changelog'), ["entry"])
+        self.assertEquals(self.get_entries('changelog'), ["entry"])
+        self.assertEquals(parseMock.call_count, 1)
+
+    def test_index_refreshed_on_change(self):
+        '''We parse again a changelog which changed'''
+        shutil.copy(os.path.join(self.changelogs_file_dir, 'one_unreleased'), 'changelog')
+        self.assertEquals(len(self.get_entries('changelog')), 1)
+        with open('changelog', 'a') as f:
+            f.write("\nfoo (0.1) raring; urgency=low\n\n  * Initial release\n\n"
+                    " -- Didier Roche <didrocks@ubuntu.com>  Mon, 25 Feb 2013 10:33:30 +0100\n")
+        self.assertEquals(len(self.get_entries('changelog')), 2)
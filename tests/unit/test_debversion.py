@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2014 Canonical
+#
+# Authors:
+#  Didier Roche
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+from unittest import skipUnless
+from . import BaseUnitTestCase
+
+from cupstream2distro import debversion
+
+from distutils.spawn import find_executable
+import os
+import random
+import subprocess
+
+
+def dpkg_compare(version1, operator, version2):
+    return subprocess.call(["dpkg", "--compare-versions", version1, operator, version2]) == 0
+
+
+class DebVersionTests(BaseUnitTestCase):
+
+    def setUp(self):
+        super(DebVersionTests, self).setUp()
+        with open(os.path.join(self.data_dir, "versions")) as f:
+            self.versions = [line.strip() for line in f if line.strip()]
+
+    def test_parse(self):
+        '''We split epoch, upstream version and revision'''
+        self.assertEquals(debversion.parse("1.0"), (0, "1.0", ""))
+        self.assertEquals(debversion.parse("1:1.0-a-0ubuntu1"), (1, "1.0-a", "0ubuntu1"))
+        self.assertEquals(debversion.parse("2:1:1.0"), (2, "1:1.0", ""))
+
+    def test_parse_invalid_versions(self):
+        '''We raise a ValueError on versions dpkg refuses'''
+        for version in ("1 0", "1:", ":1", "a:1", "1-1:1", "1.0-", "1:-1"):
+            with self.assertRaises(ValueError):
+                debversion.parse(version)
+
+    def test_compare(self):
+        '''We compare versions in Debian order'''
+        self.assertTrue(debversion.compare('2-0ubuntu1', '1-0ubuntu1') > 0)
+        self.assertTrue(debversion.compare('1-0ubuntu1', '2-0ubuntu1') < 0)
+        self.assertEquals(debversion.compare('1.0', '1.0'), 0)
+
+    def test_compare_tilde(self):
+        '''A tilde sorts before anything, even the end of the version'''
+        self.assertTrue(debversion.compare('1.0~rc1', '1.0') < 0)
+        self.assertTrue(debversion.compare('1.0~~', '1.0~') < 0)
+        self.assertTrue(debversion.compare('1.0~', '1.0~a') < 0)
+        self.assertTrue(debversion.compare('0', '0~') > 0)
+        self.assertTrue(debversion.compare('1.1+14.10.20140820~rtm-0ubuntu1', '1.1+14.10.20140820-0ubuntu1') < 0)
+
+    def test_compare_epoch(self):
+        '''The epoch takes precedence and defaults to 0'''
+        self.assertTrue(debversion.compare('1:0.1', '9.9') > 0)
+        self.assertEquals(debversion.compare('0:1.0', '1.0'), 0)
+
+    def test_compare_numbers(self):
+        '''Numbers are compared by value, not as strings'''
+        self.assertTrue(debversion.compare('1.10', '1.9') > 0)
+        self.assertEquals(debversion.compare('1.000', '1.0'), 0)
+        self.assertEquals(debversion.compare('1.0-0', '1.0'), 0)
+
+    def test_compare_letters_before_others(self):
+        '''Letters sort before other chars'''
+        self.assertTrue(debversion.compare('1.0a', '1.0+') < 0)
+        self.assertTrue(debversion.compare('1.0.Z', '1.0.a') < 0)
+
+    def test_empty_version_is_lowest(self):
+        '''The empty version sorts before any other one'''
+        self.assertTrue(debversion.compare('', '~') < 0)
+
+    @skipUnless(find_executable("dpkg"), "dpkg isn't available")
+    def test_sort_as_dpkg(self):
+        '''Versions are sorted like dpkg does'''
+        versions = sorted(self.versions, key=debversion.sort_key)
+        for (lower, higher) in zip(versions, versions[1:]):
+            operator = "eq" if debversion.compare(lower, higher) == 0 else "lt"
+            self.assertTrue(dpkg_compare(lower, operator, higher), "{} {} {}".format(lower, operator, higher))
+
+    @skipUnless(find_executable("dpkg"), "dpkg isn't available")
+    def test_compare_as_dpkg(self):
+        '''Random version pairs compare like dpkg does'''
+        rand = random.Random(42)
+        for i in xrange(200):
+            (version1, version2) = (rand.choice(self.versions), rand.choice(self.versions))
+            self.assertEquals(debversion.compare(version1, version2) > 0, dpkg_compare(version1, "gt", version2),
+                              "{} gt {}".format(version1, version2))
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2014 Canonical
+#
+# Authors:
+#  Didier Roche
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+from . import BaseUnitTestCase
+
+from cupstream2distro import downloader
+
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+import hashlib
+from mock import patch
+import os
+import re
+from SocketServer import ThreadingMixIn
+import threading
+
+CONTENT = "".join(chr(i % 251) for i in xrange(300000))
+SHA256 = hashlib.sha256(CONTENT).hexdigest()
+
+
+class FileHandler(BaseHTTPRequestHandler):
+    '''Serve CONTENT with range support, optionally dropping the connection in the middle of the first transfers'''
+
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        self.server.connections += 1
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests.append((self.path, self.headers.getheader("range")))
+        if self.path == "/redirect":
+            self.send_response(303)
+            self.send_header("Location", "/file")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        start = 0
+        range_match = re.match("bytes=(\d+)-", self.headers.getheader("range") or "")
+        if range_match and self.server.supports_range:
+            start = int(range_match.group(1))
+            self.send_response(206)
+            self.send_header("Content-Range", "bytes {}-{}/{}".format(start, len(CONTENT) - 1, len(CONTENT)))
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(CONTENT) - start))
+        self.end_headers()
+        if self.server.drops:
+            self.server.drops -= 1
+            self.wfile.write(CONTENT[start:start + 100000])
+            self.close_connection = 1
+            return
+        self.wfile.write(CONTENT[start:])
+
+
+class FileServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), FileHandler)
+        self.connections = 0
+        self.requests = []
+        self.drops = 0
+        self.supports_range = True
+
+
+class DownloaderTests(BaseUnitTestCase):
+
+    def setUp(self):
+        super(DownloaderTests, self).setUp()
+        self.server = FileServer()
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = "http://127.0.0.1:{}/file".format(self.server.server_port)
+        for (target, value) in (('cupstream2distro.downloader._pool', downloader.ConnectionPool()),
+                                ('cupstream2distro.downloader.DOWNLOAD_BACKOFF_BASE', 0)):
+            patcher = patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.addCleanup(downloader._pool.clear)
+
+    def download(self, url, filename="file", sha256=SHA256, size=len(CONTENT)):
+        with open(filename, 'w+b') as f:
+            downloader.download(url, f, sha256, size)
+        with open(filename, 'rb') as f:
+            return f.read()
+
+    def test_download(self):
+        '''We download and check a file'''
+        self.assertEquals(self.download(self.url), CONTENT)
+
+    def test_download_without_checksum(self):
+        '''We download a file without any expected checksum'''
+        self.assertEquals(self.download(self.url, sha256=None, size=None), CONTENT)
+
+    def test_connection_reused(self):
+        '''We reuse the same connection for successive downloads from the same host'''
+        self.download(self.url, "file1")
+        self.download(self.url, "file2")
+        self.download(self.url.replace("/file", "/redirect"), "file3")
+        self.assertEquals(self.server.connections, 1)
+
+    def test_follow_redirections(self):
+        '''We follow redirections'''
+        self.assertEquals(self.download(self.url.replace("/file", "/redirect")), CONTENT)
+
+    def test_resume_interrupted_download(self):
+        '''We resume an interrupted transfer where it stopped'''
+        self.server.drops = 2
+        self.assertEquals(self.download(self.url), CONTENT)
+        self.assertEquals([request_range for (path, request_range) in self.server.requests],
+                          [None, "bytes=100000-", "bytes=200000-"])
+
+    def test_resume_interrupted_download_without_size(self):
+        '''We detect an interrupted transfer from the announced length when we don't know the size'''
+        self.server.drops = 1
+        self.assertEquals(self.download(self.url, sha256=None, size=None), CONTENT)
+
+    def test_resume_from_existing_content(self):
+        '''We resume after what the file already contains'''
+        with open("file", "wb") as f:
+            f.write(CONTENT[:1000])
+        with open("file", "a+b") as f:
+            downloader.download(self.url, f, SHA256, len(CONTENT))
+        with open("file", "rb") as f:
+            self.assertEquals(f.read(), CONTENT)
+        self.assertEquals(self.server.requests, [("/file", "bytes=1000-")])
+
+    def test_restart_without_range_support(self):
+        '''We start over if the server doesn't support resuming'''
+        self.server.drops = 1
+        self.server.supports_range = False
+        self.assertEquals(self.download(self.url), CONTENT)
+
+    def test_checksum_mismatch(self):
+        '''We raise and empty the file if the content doesn't match the checksum'''
+        with self.assertRaises(Exception):
+            self.download(self.url, sha256="0" * 64)
+        self.assertEquals(os.path.getsize("file"), 0)
+
+    def test_give_up_after_retries(self):
+        '''We give up after too many interrupted transfers'''
+        self.server.drops = 100
+        self.server.supports_range = False
+        with self.assertRaises(IOError):
+            self.download(self.url)
+
+    def test_local_files(self):
+        '''We copy local files'''
+        with open("source", "wb") as f:
+            f.write(CONTENT)
+        self.assertEquals(self.download(os.path.abspath("source")), CONTENT)
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2014 Canonical
+#
+# Authors:
+#  Didier Roche
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+from . import BaseFakeLaunchpadTestCase
+from ..tools import fakelaunchpad
+
+from cupstream2distro import launchpadmanager, packagemanager
+
+from lazr.restfulclient.errors import HTTPError
+from mock import patch
+
+
+class FakeLaunchpadTests(BaseFakeLaunchpadTestCase):
+    '''Run launchpadmanager and packagemanager against the local launchpad stand-in'''
+
+    def test_get_ppa_and_archs(self):
+        '''We get a ppa and the archs it builds from the stand-in'''
+        self.start_server()
+        ppa = launchpadmanager.get_ppa("ci-train-ppa-service/ubuntu/landing-001")
+        self.assertEquals(ppa.name, "landing-001")
+        self.assertEquals(launchpadmanager.get_available_all_and_ignored_archs("utopic", ppa),
+                          (set(["amd64", "i386"]), "i386", set(["powerpc", "arm64", "ppc64el"]), set()))
+
+    def test_published_sources(self):
+        '''We find versions in the destination and in the ppa'''
+        self.start_server()
+        self.assertEquals(packagemanager.get_current_version_for_series("foo", "utopic"), "1.0-0ubuntu1")
+        self.assertEquals(packagemanager.get_current_version_for_series("foo", "trusty"), "0.8-0ubuntu1")
+        ppa = launchpadmanager.get_ppa("ci-train-ppa-service/ubuntu/landing-001")
+        source = packagemanager.get_published_source("bar", "2.1+14.10.20140820-0ubuntu1",
+                                                     launchpadmanager.get_series("utopic"), ppa)
+        self.assertEquals(sorted((build.arch_tag, build.buildstate) for build in source.getBuilds()),
+                          [("amd64", "Successfully built"), ("armhf", "Failed to build"),
+                           ("i386", "Successfully built")])
+
+    def test_index_published_sources_over_pages(self):
+        '''We get all sources of an archive, even split in multiple pages'''
+        fakelaunchpad.add_packages(self.objects, "ubuntu/+archive/primary", "ubuntu/utopic", 20)
+        self.start_server()
+        with patch('cupstream2distro.launchpadmanager.LAUNCHPAD_PAGE_SIZE', 7):
+            index = packagemanager.index_published_sources(launchpadmanager.get_ubuntu_archive(),
+                                                           launchpadmanager.get_series("utopic"))
+        self.assertEquals(len(index), 22)
+        self.assertEquals(index["generated13"][0].source_package_version, "1.0-0ubuntu1")
+
+    def test_index_published_sources_with_big_pages(self):
+        '''We page through big collections with LAUNCHPAD_PAGE_SIZE entries instead of the server default'''
+        fakelaunchpad.add_packages(self.objects, "ubuntu/+archive/primary", "ubuntu/utopic", 600)
+        fake = self.start_server()
+        (archive, series) = (launchpadmanager.get_ubuntu_archive(), launchpadmanager.get_series("utopic"))
+        fake.request_counts.clear()
+        index = packagemanager.index_published_sources(archive, series)
+        self.assertEquals(len(index), 602)
+        # Published: a first page of 75 entries, then 2 of 300 / Pending: a single empty page
+        self.assertEquals(fake.request_counts["getPublishedSources"], 4)
+
+    def test_bugs_titles(self):
+        '''We get bug titles from the stand-in, in concurrent sessions'''
+        self.start_server()
+        self.assertEquals(launchpadmanager.get_bugs_titles({"author": [1234, 4567, 99]}),
+                          {"author": set(["foo crashes on startup (LP: #1234)",
+                                          "bar doesn't build on armhf (LP: #4567)", "Fix LP: #99"])})
+
+    def test_copy_package(self):
+        '''Copying a package creates a new pending publication in the destination'''
+        fake = self.start_server()
+        ppa = launchpadmanager.get_ppa("ci-train-ppa-service/ubuntu/landing-001")
+        launchpadmanager.get_ubuntu_archive().copyPackage(source_name="foo", version="1.1+14.10.20140820-0ubuntu1",
+                                                          from_archive=ppa, to_pocket="proposed",
+                                                          include_binaries=True)
+        self.assertEquals([(path, obj["status"], obj["pocket"]) for (path, obj)
+                           in fake.find("source_package_publishing_history", archive_link="ubuntu/+archive/primary",
+                                        source_package_version="1.1+14.10.20140820-0ubuntu1")],
+                          [("ubuntu/+archive/primary/+sourcepub/100001", "Pending", "Proposed")])
+
+    @patch('cupstream2distro.launchpadmanager.time.sleep')
+    def test_retry_injected_failures(self, sleepMock):
+        '''We retry on injected server errors and count every request'''
+        # first request fails, the next one goes through with this seed
+        fake = self.start_server(failures={"getPPAByName": 0.5}, seed=1)
+        ppa = launchpadmanager.get_ppa("ci-train-ppa-service/ubuntu/landing-001")
+        self.assertEquals(ppa.name, "landing-001")
+        self.assertEquals(fake.request_counts["getPPAByName"], 2)
+
+    @patch('cupstream2distro.launchpadmanager.time.sleep')
+    def test_give_up_after_injected_failures(self, sleepMock):
+        '''We get the server error once retries are exhausted'''
+        fake = self.start_server(failures={"getPPAByName": 1})
+        with self.assertRaises(HTTPError):
+            launchpadmanager.get_ppa("ci-train-ppa-service/ubuntu/landing-001")
+        self.assertEquals(fake.request_counts["getPPAByName"], launchpadmanager.LAUNCHPAD_MAX_RETRIES + 1)
+
+    def test_latency_injection(self):
+        '''Injected latency only applies to the requested method'''
+        fake = fakelaunchpad.FakeLaunchpad(self.objects, latency={"getBuilds": 0.2})
+        with patch('tests.tools.fakelaunchpad.time.sleep') as sleepMock:
+            fake.inject("GET")
+            self.assertFalse(sleepMock.called)
+            fake.inject("getBuilds")
+            sleepMock.assert_called_once_with(0.2)
+        self.assertEquals(fake.request_counts, {"GET": 1, "getBuilds": 1})
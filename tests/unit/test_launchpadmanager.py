@@ -0,0 +1,439 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2014 Canonical
+#
+# Authors:
+#  Didier Roche
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+from . import BaseUnitTestCase
+
+from cupstream2distro import launchpadmanager
+
+from mock import MagicMock, Mock, patch
+import json
+import os
+
+
+class LaunchpadManagerTests(BaseUnitTestCase):
+
+    def setUp(self):
+        super(LaunchpadManagerTests, self).setUp()
+        self.lp = MagicMock()
+        patcher = patch('cupstream2distro.launchpadmanager.get_launchpad', return_value=self.lp)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        for cache in (launchpadmanager._resources, launchpadmanager._named_resources):
+            patcher = patch.dict(cache, clear=True)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_get_resource_from_token_loaded_once(self):
+        '''We only load a resource once'''
+        self.lp.load.return_value.resource_type_link = "https://lp/#archive"
+        resource = launchpadmanager.get_resource_from_token("https://lp/foo")
+        self.assertEquals(launchpadmanager.get_resource_from_token("https://lp/foo"), resource)
+        self.lp.load.assert_called_once_with("https://lp/foo")
+
+    def test_get_resource_from_token_shared_by_self_link(self):
+        '''We return the same object when requesting it by its self_link'''
+        self.lp.load.return_value.resource_type_link = "https://lp/#archive"
+        self.lp.load.return_value.self_link = "https://lp/devel/foo"
+        resource = launchpadmanager.get_resource_from_token("https://lp/foo")
+        self.assertEquals(launchpadmanager.get_resource_from_token("https://lp/devel/foo"), resource)
+        self.assertEquals(self.lp.load.call_count, 1)
+
+    def test_forget_resource(self):
+        '''We load again a forgotten resource, whatever link was used'''
+        self.lp.load.return_value.resource_type_link = "https://lp/#archive"
+        self.lp.load.return_value.self_link = "https://lp/devel/foo"
+        launchpadmanager.get_resource_from_token("https://lp/foo")
+        launchpadmanager.forget_resource("https://lp/foo")
+        launchpadmanager.get_resource_from_token("https://lp/devel/foo")
+        self.assertEquals(self.lp.load.call_count, 2)
+
+    def test_get_resource_from_token_mutable_not_memoized(self):
+        '''We load again resources which can change while we use them'''
+        self.lp.load.return_value.resource_type_link = "https://lp/#branch_merge_proposal"
+        launchpadmanager.get_resource_from_token("https://lp/foo")
+        launchpadmanager.get_resource_from_token("https://lp/foo")
+        self.assertEquals(self.lp.load.call_count, 2)
+
+    def test_resources_cache_size(self):
+        '''We only keep the last loaded resources'''
+        self.lp.load.side_effect = lambda url: Mock(resource_type_link="https://lp/#person", self_link=url)
+        with patch('cupstream2distro.launchpadmanager.LAUNCHPAD_RESOURCE_CACHE_SIZE', 2):
+            for name in ("foo", "bar", "baz"):
+                launchpadmanager.get_resource_from_token("https://lp/~{}".format(name))
+        self.assertEquals(launchpadmanager._resources.keys(), [(id(self.lp), "https://lp/~bar"),
+                                                               (id(self.lp), "https://lp/~baz")])
+
+    def test_forget_unknown_resource(self):
+        '''Forgetting a resource we never loaded is a noop'''
+        launchpadmanager.forget_resource("https://lp/foo")
+
+    def test_get_ppa_memoized(self):
+        '''We only resolve a ppa name once'''
+        ppa = launchpadmanager.get_ppa("ci-train-ppa-service/ubuntu/landing-001")
+        self.assertEquals(launchpadmanager.get_ppa("ci-train-ppa-service/ubuntu/landing-001"), ppa)
+        self.lp.people.__getitem__.assert_called_once_with("ci-train-ppa-service")
+        self.assertNotEquals(launchpadmanager.get_ppa("ci-train-ppa-service/ubuntu/landing-002"), None)
+        self.assertEquals(self.lp.people.__getitem__.call_count, 2)
+
+    def test_get_series_memoized(self):
+        '''We only resolve a series and its distribution once'''
+        series = launchpadmanager.get_series("utopic")
+        self.assertEquals(launchpadmanager.get_series("utopic"), series)
+        self.lp.distributions.__getitem__.assert_called_once_with("ubuntu")
+        distro = self.lp.distributions.__getitem__.return_value
+        distro.getSeries.assert_called_once_with(name_or_version="utopic")
+
+    def test_is_dest_distro_archive_memoized(self):
+        '''We only compute once if a link is a distribution archive'''
+        self.lp.load.return_value.distribution.main_archive_link = "https://lp/ubuntu/+archive/primary"
+        self.assertTrue(launchpadmanager.is_dest_distro_archive("https://lp/ubuntu/+archive/primary"))
+        self.assertTrue(launchpadmanager.is_dest_distro_archive("https://lp/ubuntu/+archive/primary"))
+        self.assertFalse(launchpadmanager.is_dest_distro_archive("https://lp/~foo/+archive/ppa"))
+        self.assertEquals(self.lp.load.call_count, 2)
+
+
+class LaunchpadSessionTests(BaseUnitTestCase):
+
+    def setUp(self):
+        super(LaunchpadSessionTests, self).setUp()
+        patcher = patch('cupstream2distro.launchpadmanager._login', side_effect=lambda *args: MagicMock())
+        self.login = patcher.start()
+        self.addCleanup(patcher.stop)
+        for (name, value) in (('launchpad', MagicMock()), ('_session_pool', launchpadmanager.Queue.Queue()),
+                              ('_session_count', 0), ('_local', launchpadmanager.threading.local())):
+            patcher = patch('cupstream2distro.launchpadmanager.{}'.format(name), value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_session_bound_to_thread(self):
+        '''get_launchpad returns the pooled session inside launchpad_session only'''
+        main_session = launchpadmanager.get_launchpad()
+        with launchpadmanager.launchpad_session() as session:
+            self.assertEquals(launchpadmanager.get_launchpad(), session)
+            self.assertNotEquals(session, main_session)
+        self.assertEquals(launchpadmanager.get_launchpad(), main_session)
+
+    def test_sessions_are_reused(self):
+        '''A released session is handed out again instead of login again'''
+        with launchpadmanager.launchpad_session() as session:
+            pass
+        with launchpadmanager.launchpad_session() as other_session:
+            self.assertEquals(other_session, session)
+        self.assertEquals(self.login.call_count, 1)
+
+    def test_sessions_have_their_own_cache_dir(self):
+        '''Each session gets its own launchpadlib directory'''
+        with launchpadmanager.launchpad_session():
+            with launchpadmanager.launchpad_session():
+                pass
+        self.assertNotEquals(self.login.call_args_list[0][0][0], self.login.call_args_list[1][0][0])
+
+    @patch('cupstream2distro.launchpadmanager.LAUNCHPAD_SESSIONS', 2)
+    def test_map_with_sessions(self):
+        '''We get results in order, computed with at most LAUNCHPAD_SESSIONS sessions'''
+        sessions = set()
+
+        def double(item):
+            sessions.add(launchpadmanager.get_launchpad())
+            return item * 2
+
+        self.assertEquals(launchpadmanager.map_with_sessions(double, range(10), workers=2), range(0, 20, 2))
+        self.assertTrue(launchpadmanager.launchpad not in sessions)
+        self.assertTrue(len(sessions) <= 2)
+
+    def test_map_with_sessions_raise_errors(self):
+        '''We raise back errors from func'''
+        def fail(item):
+            if item == 3:
+                raise ValueError()
+
+        with self.assertRaises(ValueError):
+            launchpadmanager.map_with_sessions(fail, range(5))
+
+    def test_map_with_sessions_login_failure(self):
+        '''We raise back errors when we can't get a session'''
+        self.login.side_effect = IOError
+        with self.assertRaises(IOError):
+            launchpadmanager.map_with_sessions(lambda item: item, range(5))
+
+
+    @patch('cupstream2distro.launchpadmanager.LAUNCHPAD_SESSIONS', 2)
+    def test_open_bugs_for_source_in_worker_sessions(self):
+        '''Bugs are targeted to the source package looked up in the session opening them'''
+        sessions = []
+        self.login.side_effect = lambda *args: sessions.append(MagicMock()) or sessions[-1]
+        with patch.dict(launchpadmanager._named_resources, clear=True):
+            launchpadmanager.open_bugs_for_source(range(6), "foo", "utopic")
+        add_task_calls = 0
+        for session in sessions:
+            package = session.distributions["ubuntu"].getSeries.return_value.getSourcePackage.return_value
+            for call in session.bugs.__getitem__.return_value.addTask.call_args_list:
+                self.assertEquals(call, ((), {"target": package}))
+                add_task_calls += 1
+        self.assertEquals(add_task_calls, 6)
+
+
+class BugTitlesTests(BaseUnitTestCase):
+
+    def setUp(self):
+        super(BugTitlesTests, self).setUp()
+        self.lp = MagicMock()
+        self.lp.bugs.__getitem__.side_effect = lambda bug: Mock(title="title {}".format(bug))
+        for (target, value) in (('cupstream2distro.launchpadmanager.get_launchpad', Mock(return_value=self.lp)),
+                                ('cupstream2distro.launchpadmanager._new_session', Mock(return_value=self.lp)),
+                                ('cupstream2distro.launchpadmanager._session_pool', launchpadmanager.Queue.Queue()),
+                                ('cupstream2distro.cachemanager.COMMON_CACHE_DIR', os.path.abspath('cache'))):
+            patcher = patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_get_bugs_titles(self):
+        '''We get titles for all bugs, once per bug'''
+        self.assertEquals(launchpadmanager.get_bugs_titles({"foo": [1, 2], "bar": [2]}),
+                          {"foo": set(["title 1 (LP: #1)", "title 2 (LP: #2)"]), "bar": set(["title 2 (LP: #2)"])})
+        self.assertEquals(self.lp.bugs.__getitem__.call_count, 2)
+
+    def test_get_bugs_titles_cached(self):
+        '''We don't fetch again titles we already got'''
+        launchpadmanager.get_bugs_titles({"foo": [1]})
+        self.assertEquals(launchpadmanager.get_bugs_titles({"foo": [1]}), {"foo": set(["title 1 (LP: #1)"])})
+        self.assertEquals(self.lp.bugs.__getitem__.call_count, 1)
+
+    def test_get_bugs_titles_missing_bug(self):
+        '''We still list bugs we can't access, and retry them next time'''
+        self.lp.bugs.__getitem__.side_effect = KeyError
+        self.assertEquals(launchpadmanager.get_bugs_titles({"foo": [1]}), {"foo": set(["Fix LP: #1"])})
+        launchpadmanager.get_bugs_titles({"foo": [1]})
+        self.assertEquals(self.lp.bugs.__getitem__.call_count, 2)
+
+
+class ApiStatsTests(BaseUnitTestCase):
+
+    def setUp(self):
+        super(ApiStatsTests, self).setUp()
+        patcher = patch.dict(launchpadmanager._api_stats, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.lp = Mock()
+        self.lp._browser._request.return_value = (Mock(), "content")
+        self.request = self.lp._browser._request
+        launchpadmanager._instrument(self.lp)
+
+    def test_record_named_operation(self):
+        '''We record named operations, counting follow-up pages as the same call'''
+        self.lp._browser._request("https://lp/ubuntu/+archive/primary?ws.op=getPublishedSources&source_name=foo")
+        self.lp._browser._request("https://lp/ubuntu/+archive/primary?ws.op=getPublishedSources&ws.start=300")
+        stats = launchpadmanager.get_api_stats()
+        self.assertEquals(stats["methods"]["getPublishedSources"]["calls"], 1)
+        self.assertEquals(stats["methods"]["getPublishedSources"]["pages"], 2)
+        self.assertEquals(stats["methods"]["getPublishedSources"]["bytes"], 14)
+        self.assertEquals(stats["total"]["calls"], 1)
+        self.request.assert_called_with("https://lp/ubuntu/+archive/primary?ws.op=getPublishedSources&ws.start=300",
+                                        None, "GET")
+
+    def test_record_post_operation(self):
+        '''We record named POST operations from their body'''
+        self.lp._browser._request("https://lp/~foo/+archive/ppa", "ws.op=copyPackage&source_name=foo", "POST")
+        self.assertEquals(launchpadmanager.get_api_stats()["methods"]["copyPackage"]["calls"], 1)
+
+    def test_record_plain_requests(self):
+        '''We record requests without a named operation by http method'''
+        self.lp._browser._request("https://lp/bugs/1")
+        self.lp._browser._request("https://lp/bugs/1", "{}", "PATCH")
+        stats = launchpadmanager.get_api_stats()
+        self.assertEquals(sorted(stats["methods"]), ["GET", "PATCH"])
+
+    def test_record_errors(self):
+        '''We record failed requests and raise back the error'''
+        self.request.side_effect = IOError
+        with self.assertRaises(IOError):
+            self.lp._browser._request("https://lp/bugs/1")
+        self.assertEquals(launchpadmanager.get_api_stats()["methods"]["GET"]["errors"], 1)
+
+    def test_write_api_stats(self):
+        '''We write stats as json'''
+        self.lp._browser._request("https://lp/bugs/1")
+        launchpadmanager.write_api_stats("stats.json")
+        with open("stats.json") as f:
+            self.assertEquals(json.load(f)["total"]["pages"], 1)
+
+
+class RateLimitTests(BaseUnitTestCase):
+
+    def setUp(self):
+        super(RateLimitTests, self).setUp()
+        for target in ('cupstream2distro.launchpadmanager.ratelimiter', 'cupstream2distro.launchpadmanager.time'):
+            patcher = patch(target)
+            setattr(self, target.split('.')[-1], patcher.start())
+            self.addCleanup(patcher.stop)
+        self.lp = Mock()
+        self.request = self.lp._browser._connection.request
+        launchpadmanager._rate_limit(self.lp)
+
+    def test_rate_limited(self):
+        '''Every request waits for the rate limiter, and launchpadlib retries are disabled'''
+        self.request.return_value = (Mock(status=200), "content")
+        self.assertEquals(self.lp._browser._connection.request("https://lp/bugs/1", method="GET"),
+                          self.request.return_value)
+        self.ratelimiter.acquire.assert_called_once_with()
+        self.assertEquals(self.lp._browser.max_retries, 0)
+
+    def test_retry_server_errors(self):
+        '''We retry server errors and timeouts with a growing delay'''
+        self.request.side_effect = [(Mock(status=503), ""), launchpadmanager.socket.timeout(), (Mock(status=200), "")]
+        self.assertEquals(self.lp._browser._connection.request("https://lp/bugs/1")[0].status, 200)
+        self.assertEquals(self.ratelimiter.acquire.call_count, 3)
+        self.assertEquals(self.ratelimiter.report_throttled.call_count, 2)
+        (first_delay, second_delay) = [call[0][0] for call in self.time.sleep.call_args_list]
+        self.assertTrue(0 <= first_delay <= launchpadmanager.LAUNCHPAD_BACKOFF_BASE)
+        self.assertTrue(0 <= second_delay <= launchpadmanager.LAUNCHPAD_BACKOFF_BASE * 2)
+
+    def test_give_up_after_max_retries(self):
+        '''We return the last error response once we retried enough'''
+        self.request.return_value = (Mock(status=500), "")
+        self.assertEquals(self.lp._browser._connection.request("https://lp/bugs/1")[0].status, 500)
+        self.assertEquals(self.request.call_count, launchpadmanager.LAUNCHPAD_MAX_RETRIES + 1)
+
+    def test_retry_changes_only_when_not_processed(self):
+        '''We only retry requests changing launchpad content on 502 and 503'''
+        self.request.side_effect = [(Mock(status=503), ""), (Mock(status=500), "")]
+        self.assertEquals(self.lp._browser._connection.request("https://lp/bugs/1", method="POST")[0].status, 500)
+        self.assertEquals(self.request.call_count, 2)
+
+    def test_no_retry_changes_on_timeouts(self):
+        '''Requests changing launchpad content may have been processed before timing out, we don't retry them'''
+        self.request.side_effect = launchpadmanager.socket.timeout()
+        with self.assertRaises(launchpadmanager.socket.timeout):
+            self.lp._browser._connection.request("https://lp/bugs/1", "PATCH", body="{}")
+        self.assertEquals(self.request.call_count, 1)
+
+    def test_no_retry_on_client_errors(self):
+        '''We don't retry client errors'''
+        self.request.return_value = (Mock(status=404), "")
+        self.lp._browser._connection.request("https://lp/bugs/1")
+        self.assertEquals(self.request.call_count, 1)
+
+
+class WadlCacheTests(BaseUnitTestCase):
+
+    wadl = b'<application xmlns="http://research.sun.com/wadl/2006/10"><resources base="https://lp/devel/"/></application>'
+
+    def setUp(self):
+        super(WadlCacheTests, self).setUp()
+        from lazr.restfulclient._browser import Browser
+        for patcher in (patch('cupstream2distro.cachemanager.COMMON_CACHE_DIR', os.path.abspath('cache')),
+                        patch.dict(launchpadmanager._wadl_applications, clear=True),
+                        patch.object(Browser, 'get_wadl_application', Browser.__dict__['get_wadl_application'])):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        launchpadmanager._install_wadl_cache()
+        self.get_wadl_application = Browser.__dict__['get_wadl_application']
+        self.browser = Mock()
+        self.browser._request.return_value = (Mock(), self.wadl)
+
+    def test_wadl_parsed_once(self):
+        '''We only get and parse the service description once per process'''
+        application = self.get_wadl_application(self.browser, "https://lp/devel/")
+        self.assertEquals(application.resource_base, "https://lp/devel/")
+        self.assertEquals(self.get_wadl_application(self.browser, "https://lp/devel/"), application)
+        self.assertEquals(self.browser._request.call_count, 1)
+
+    def test_wadl_cached_on_disk(self):
+        '''We reuse the service description fetched by a previous process'''
+        self.get_wadl_application(self.browser, "https://lp/devel/")
+        launchpadmanager._wadl_applications.clear()
+        self.assertEquals(self.get_wadl_application(self.browser, "https://lp/devel/").resource_base,
+                          "https://lp/devel/")
+        self.assertEquals(self.browser._request.call_count, 1)
+
+    def test_forget_wadl(self):
+        '''We fetch again a forgotten service description'''
+        self.get_wadl_application(self.browser, "https://lp/devel/")
+        launchpadmanager.forget_wadl()
+        self.get_wadl_application(self.browser, "https://lp/devel/")
+        self.assertEquals(self.browser._request.call_count, 2)
+
+    def test_wadl_cached_per_service_root(self):
+        '''We don't reuse the service description of another service root'''
+        self.get_wadl_application(self.browser, "https://lp/devel/")
+        launchpadmanager._wadl_applications.clear()
+        with patch.dict('os.environ', {launchpadmanager.LAUNCHPAD_SERVICE_ROOT_ENV: "http://127.0.0.1:4242/"}):
+            self.get_wadl_application(self.browser, "https://lp/devel/")
+        self.assertEquals(self.browser._request.call_count, 2)
+
+    def test_unparsable_wadl_fetched_again(self):
+        '''We fetch again a cached service description we can't parse'''
+        launchpadmanager.cachemanager.save(launchpadmanager.LAUNCHPAD_WADL_CACHE_NAMESPACE,
+                                           launchpadmanager._get_wadl_cache_key("https://lp/devel/"), "<application",
+                                           60)
+        self.assertEquals(self.get_wadl_application(self.browser, "https://lp/devel/").resource_base,
+                          "https://lp/devel/")
+        self.assertEquals(self.browser._request.call_count, 1)
+
+    @patch('cupstream2distro.launchpadmanager._login_with_service_description')
+    def test_login_with_outdated_wadl(self, loginMock):
+        '''We fetch again the service description when we can't login with the cached one'''
+        self.get_wadl_application(self.browser, "https://lp/devel/")
+        lp = Mock()
+        loginMock.side_effect = [ValueError("Unknown resource type"), lp]
+        self.assertEquals(launchpadmanager._login(None, False, None), lp)
+        self.assertEquals(launchpadmanager._wadl_applications, {})
+        self.get_wadl_application(self.browser, "https://lp/devel/")
+        self.assertEquals(self.browser._request.call_count, 2)
+
+    def test_install_once(self):
+        '''Installing the cache twice doesn't wrap it twice'''
+        launchpadmanager._install_wadl_cache()
+        from lazr.restfulclient._browser import Browser
+        self.assertEquals(Browser.__dict__['get_wadl_application'], self.get_wadl_application)
+
+
+class SeriesArchsTests(BaseUnitTestCase):
+
+    def setUp(self):
+        super(SeriesArchsTests, self).setUp()
+        patcher = patch('cupstream2distro.cachemanager.COMMON_CACHE_DIR', os.path.abspath('cache'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.series = Mock(self_link="https://lp/ubuntu/rolling")
+        self.series.architectures = [Mock(architecture_tag="amd64", is_nominated_arch_indep=False),
+                                     Mock(architecture_tag="i386", is_nominated_arch_indep=True),
+                                     Mock(architecture_tag="armel", is_nominated_arch_indep=False)]
+
+    def test_get_available_all_and_ignored_archs(self):
+        '''We return available archs and the arch indep one'''
+        (available_archs, arch_all_arch, eventually_ignored, unconditionally_ignored) = \
+            launchpadmanager.get_available_all_and_ignored_archs(self.series)
+        self.assertEquals(available_archs, set(["amd64", "i386"]))
+        self.assertEquals(arch_all_arch, "i386")
+
+    def test_series_archs_cached(self):
+        '''We only look at series archs once'''
+        launchpadmanager.get_available_all_and_ignored_archs(self.series)
+        self.series.architectures = []
+        (available_archs, arch_all_arch, eventually_ignored, unconditionally_ignored) = \
+            launchpadmanager.get_available_all_and_ignored_archs(self.series)
+        self.assertEquals(available_archs, set(["amd64", "i386"]))
+        self.assertEquals(arch_all_arch, "i386")
+
+    def test_virtualized_ppa(self):
+        '''We don't look at series archs for virtualized ppas'''
+        (available_archs, arch_all_arch, eventually_ignored, unconditionally_ignored) = \
+            launchpadmanager.get_available_all_and_ignored_archs(self.series, Mock(require_virtualized=True))
+        self.assertEquals(available_archs, set(launchpadmanager.VIRTUALIZED_PPA_ARCH))
@@ -17,10 +17,13 @@
 # this program; if not, write to the Free Software Foundation, Inc.,
 # 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
 
-from . import BaseUnitTestCase
+from . import BaseUnitTestCase, BaseFakeLaunchpadTestCase
+from ..tools import fakelaunchpad
 
-from cupstream2distro import packageinppamanager
+from cupstream2distro import launchpadmanager, packageinppamanager
+from cupstream2distro.packageinppa import PackageInPPA
 
+import logging
 import os
 import shutil
 
@@ -36,3 +39,124 @@ class PackageInPPAManagerTests(BaseUnitTestCase):
         '''We load and return the current tip rev from config'''
         shutil.copy2(os.path.join(self.project_file_dir, 'foo.project'), '.')
         self.assertEquals(packageinppamanager._get_current_rev_from_config('foo'), '42')
+
+
+class PackageInPPAManagerLaunchpadTests(BaseFakeLaunchpadTestCase):
+    '''Watch packages of the silo ppa of the local launchpad stand-in'''
+
+    def get_package_in_ppa(self, source, version, archs=None):
+        '''Return the PackageInPPA watching source and version in the silo ppa, built on archs'''
+        ppa = launchpadmanager.get_ppa("ci-train-ppa-service/ubuntu/landing-001")
+        series = launchpadmanager.get_series("utopic")
+        (available_archs, arch_all_arch, archs_to_eventually_ignore,
+         archs_to_unconditionally_ignore) = launchpadmanager.get_available_all_and_ignored_archs(series, ppa)
+        with open("{}_{}.dsc".format(source, version), "w") as f:
+            f.write("Source: {}\nArchitecture: any\n".format(source))
+        return PackageInPPA(source, version, ppa, launchpadmanager.get_ubuntu_archive(), series,
+                            archs or available_archs, arch_all_arch, set(), archs_to_unconditionally_ignore)
+
+    def watch_ppa_packages(self, fake, workers):
+        '''Update once the status of the fixture packages, 20 generated ones and an unpublished one in the silo ppa
+
+        Return (packages_not_in_ppa, packages_building, packages_failed), as source names'''
+        packages = [("foo", "1.1+14.10.20140820-0ubuntu1"), ("bar", "2.1+14.10.20140820-0ubuntu1"),
+                    ("baz", "1.0-0ubuntu1")] + [("generated{}".format(num), "1.0-0ubuntu1") for num in range(20)]
+        packages_not_in_ppa = set(self.get_package_in_ppa(source, version) for (source, version) in packages)
+        fake.request_counts.clear()
+        (packages_building, packages_failed) = (set(), set())
+        packageinppamanager.update_all_packages_status(packages_not_in_ppa, packages_building, packages_failed,
+                                                       workers=workers)
+        return tuple(sorted(package.source_name for package in packages_set)
+                     for packages_set in (packages_not_in_ppa, packages_building, packages_failed))
+
+    def test_sweep_ppa_status(self):
+        '''We get the status of all packages of a ppa with the same few requests, whatever their number'''
+        fakelaunchpad.add_packages(self.objects, "~ci-train-ppa-service/+archive/ubuntu/landing-001", "ubuntu/utopic",
+                                   20)
+        fake = self.start_server()
+        self.assertEquals(self.watch_ppa_packages(fake, workers=1), (["baz"], [], []))
+        # sources are indexed (Published and Pending), binaries and builds have 2 pages each, baz isn't published
+        self.assertEquals(fake.request_counts, {"getPublishedSources": 3, "getPublishedBinaries": 2,
+                                                "getBuildRecords": 2})
+
+    def test_concurrent_status_refresh(self):
+        '''We refresh package statuses in concurrent sessions, keeping the logs of each package together'''
+        fakelaunchpad.add_packages(self.objects, "~ci-train-ppa-service/+archive/ubuntu/landing-001", "ubuntu/utopic",
+                                   20)
+        fake = self.start_server(latency={"GET": 0.01})
+        messages = []
+        handler = logging.Handler()
+        handler.emit = lambda record: messages.append(record.getMessage())
+        root_logger = logging.getLogger()
+        root_logger.addHandler(handler)
+        self.addCleanup(root_logger.removeHandler, handler)
+        self.addCleanup(root_logger.setLevel, root_logger.level)
+        root_logger.setLevel(logging.INFO)
+
+        self.assertEquals(self.watch_ppa_packages(fake, workers=4), (["baz"], [], []))
+        groups = []
+        for message in messages:
+            if message.startswith("current_package: "):
+                groups.append([message])
+            elif groups:
+                groups[-1].append(message)
+        self.assertEquals([group[0].split()[1] for group in groups],
+                          ["bar", "baz", "foo"] + sorted("generated{}".format(num) for num in range(20)))
+        self.assertEquals(groups[2][:2], ["current_package: foo 1.1+14.10.20140820-0ubuntu1", "Source available in ppa"])
+        self.assertEquals(sorted(groups[2][2:]), ["arch: amd64, status: published", "arch: armhf, status: published",
+                                                  "arch: i386, status: published"])
+
+    def test_status_only_checks_unsettled_archs(self):
+        '''We only look at the binaries and builds of archs which aren't published or failed yet'''
+        ppa_path = "~ci-train-ppa-service/+archive/ubuntu/landing-001"
+        # foo is still building on i386
+        del self.objects[ppa_path + "/+binarypub/1019"]
+        self.objects[ppa_path + "/+build/1018"].update({"buildstate": "Currently building", "datebuilt": None})
+        fake = self.start_server()
+        package = self.get_package_in_ppa("foo", "1.1+14.10.20140820-0ubuntu1")
+        self.assertEquals(package.get_status(), PackageInPPA.BUILDING)
+
+        # only i386 binaries are listed now
+        fake.request_counts.clear()
+        self.assertEquals(package.get_status(), PackageInPPA.BUILDING)
+        self.assertEquals(fake.request_counts, {"getPublishedBinaries": 1, "getBuilds": 1})
+        # amd64 is published but waits on arch:all packages from i386
+        self.assertEquals((package.current_status["amd64"], package.current_status["i386"]),
+                          (PackageInPPA.BUILDING, PackageInPPA.BUILDING))
+
+        fake.objects[ppa_path + "/+build/1018"].update({"buildstate": "Successfully built",
+                                                         "datebuilt": "2014-08-20T10:20:00+00:00"})
+        fake.objects[ppa_path + "/+binarypub/1019"] = dict(fake.objects[ppa_path + "/+binarypub/1017"],
+                                                           distro_arch_series_link="ubuntu/utopic/i386",
+                                                           build_link=ppa_path + "/+build/1018")
+        fake.request_counts.clear()
+        self.assertEquals(package.get_status(), PackageInPPA.PUBLISHED)
+        self.assertEquals(fake.request_counts, {"getPublishedBinaries": 1})
+
+        # nothing is left to check
+        fake.request_counts.clear()
+        self.assertEquals(package.get_status(), PackageInPPA.PUBLISHED)
+        self.assertEquals(fake.request_counts, {})
+
+    def test_status_follows_retried_builds(self):
+        '''We keep listing the builds of failed archs, as they can be retried'''
+        ppa_path = "~ci-train-ppa-service/+archive/ubuntu/landing-001"
+        fake = self.start_server()
+        package = self.get_package_in_ppa("bar", "2.1+14.10.20140820-0ubuntu1", set(["amd64", "i386", "armhf"]))
+        self.assertEquals(package.get_status(), PackageInPPA.FAILED)
+        fake.request_counts.clear()
+        self.assertEquals(package.get_status(), PackageInPPA.FAILED)
+        self.assertEquals(fake.request_counts, {"getBuilds": 1})
+
+        fake.objects[ppa_path + "/+build/1027"].update({"buildstate": "Needs building"})
+        self.assertEquals(package.get_status(), PackageInPPA.BUILDING)
+
+        fake.objects[ppa_path + "/+build/1027"].update({"buildstate": "Successfully built",
+                                                         "datebuilt": "2014-08-20T10:40:00+00:00"})
+        fake.objects[ppa_path + "/+binarypub/1028"] = dict(fake.objects[ppa_path + "/+binarypub/1024"],
+                                                           distro_arch_series_link="ubuntu/utopic/armhf",
+                                                           build_link=ppa_path + "/+build/1027")
+        self.assertEquals(package.get_status(), PackageInPPA.PUBLISHED)
+        fake.request_counts.clear()
+        self.assertEquals(package.get_status(), PackageInPPA.PUBLISHED)
+        self.assertEquals(fake.request_counts, {})
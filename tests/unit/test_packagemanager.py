@@ -21,7 +21,7 @@
 from unittest import skip
 from . import BaseUnitTestCase, BaseUnitTestCaseWithErrors
 
-from cupstream2distro import packagemanager, launchpadmanager
+from cupstream2distro import packagemanager, launchpadmanager, sourcetree
 
 from datetime import datetime
 import os
@@ -33,6 +33,14 @@ import urllib
 
 class PackageManagerTests(BaseUnitTestCase):
 
+    def setUp(self):
+        super(PackageManagerTests, self).setUp()
+        for (target, value) in (('cupstream2distro.cachemanager.COMMON_CACHE_DIR', os.path.abspath('cache')),
+                                ('cupstream2distro.artifactstore.ARTIFACT_STORE_DIR', os.path.abspath('artifacts'))):
+            patcher = patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
     @patch('cupstream2distro.packagemanager.launchpadmanager')
     def test_get_current_version_for_series_distro(self, mocklaunchpadmanager):
         '''Get the most recent publication in any pocket'''
@@ -128,6 +136,150 @@ class PackageManagerTests(BaseUnitTestCase):
                                                                                          source_name="foo", distro_series=mocklaunchpadmanager.get_series.return_value)
         self.assertEquals("0", return_version)
 
+    @patch('cupstream2distro.packagemanager.launchpadmanager')
+    def test_get_current_version_for_series_not_cached(self, mocklaunchpadmanager):
+        '''We always ask for the current version when the archive isn't indexed, it changes on any upload'''
+        source = Mock()
+        source.source_package_version = "83.09.13-0ubuntu1"
+        source.status = "Published"
+        dest = mocklaunchpadmanager.get_ppa.return_value
+        dest.self_link = "https://api.launchpad.net/devel/~didrocks/+archive/ubuntu/didppa"
+        mocklaunchpadmanager.get_series.return_value.self_link = "https://api.launchpad.net/devel/ubuntu/rolling"
+        dest.getPublishedSources.return_value = [source]
+
+        with patch('cupstream2distro.cachemanager.COMMON_CACHE_DIR', os.path.abspath('cache')):
+            self.assertEquals(packagemanager.get_current_version_for_series("foo", "rolling", "didppa"), "83.09.13-0ubuntu1")
+            source.source_package_version = "83.09.14-0ubuntu1"
+            self.assertEquals(packagemanager.get_current_version_for_series("foo", "rolling", "didppa"), "83.09.14-0ubuntu1")
+
+        self.assertEquals(dest.getPublishedSources.call_count, 2)
+        self.assertFalse(os.path.exists('cache'))
+
+    def test_is_version_for_series_in_dest_cached(self):
+        '''We cache that a version is in dest, per pocket'''
+        dest = Mock()
+        dest.self_link = "https://api.launchpad.net/devel/~didrocks/+archive/ubuntu/didppa"
+        series = Mock()
+        series.self_link = "https://api.launchpad.net/devel/ubuntu/rolling"
+        dest.getPublishedSources.return_value.total_size = 1
+
+        with patch('cupstream2distro.cachemanager.COMMON_CACHE_DIR', os.path.abspath('cache')):
+            self.assertTrue(packagemanager.is_version_for_series_in_dest("foo", "42", series, dest))
+            self.assertTrue(packagemanager.is_version_for_series_in_dest("foo", "42", series, dest))
+            dest.getPublishedSources.return_value.total_size = 0
+            self.assertFalse(packagemanager.is_version_for_series_in_dest("foo", "42", series, dest, pocket="Proposed"))
+            # it can be copied there anytime
+            self.assertFalse(packagemanager.is_version_for_series_in_dest("foo", "42", series, dest, pocket="Proposed"))
+
+        self.assertEquals(dest.getPublishedSources.call_count, 3)
+        dest.getPublishedSources.assert_called_with(exact_match=True, source_name="foo", version="42",
+                                                    distro_series=series, pocket="Proposed")
+
+    @patch('cupstream2distro.packagemanager.launchpadmanager')
+    def test_get_published_source_cached(self, mocklaunchpadmanager):
+        '''We cache the link of a published source and load it back from the cache'''
+        dest = Mock()
+        dest.self_link = "https://api.launchpad.net/devel/~didrocks/+archive/ubuntu/didppa"
+        series = Mock()
+        series.self_link = "https://api.launchpad.net/devel/ubuntu/rolling"
+        source = Mock()
+        source.status = "Published"
+        source.self_link = "https://api.launchpad.net/devel/~didrocks/+archive/ubuntu/didppa/+sourcepub/42"
+        dest.getPublishedSources.return_value = [source]
+
+        with patch('cupstream2distro.cachemanager.COMMON_CACHE_DIR', os.path.abspath('cache')):
+            self.assertEquals(packagemanager.get_published_source("foo", "42", series, dest), source)
+            self.assertEquals(packagemanager.get_published_source("foo", "42", series, dest),
+                              mocklaunchpadmanager.get_resource_from_token.return_value)
+
+        self.assertEquals(dest.getPublishedSources.call_count, 1)
+        mocklaunchpadmanager.get_resource_from_token.assert_called_once_with(source.self_link)
+
+    def get_indexed_archive(self, mocklaunchpadmanager):
+        '''Return an indexed ppa with foo published twice and bar pending'''
+        mocklaunchpadmanager.get_all_entries.side_effect = lambda collection: collection
+        self.addCleanup(packagemanager.clear_published_sources_index)
+        foo1 = Mock(source_package_name="foo", source_package_version="1", status="Published",
+                    pocket="Release", date_created=datetime(2014, 1, 1))
+        foo2 = Mock(source_package_name="foo", source_package_version="2", status="Published",
+                    pocket="Release", date_created=datetime(2014, 2, 1))
+        bar = Mock(source_package_name="bar", source_package_version="3", status="Pending",
+                   pocket="Release", date_created=datetime(2014, 1, 15))
+        dest = mocklaunchpadmanager.get_ppa.return_value
+        dest.getPublishedSources.side_effect = lambda distro_series, status: {"Published": [foo1, foo2],
+                                                                              "Pending": [bar]}[status]
+        index = packagemanager.index_published_sources(dest, mocklaunchpadmanager.get_series.return_value)
+        self.assertEquals(index, {"foo": [foo2, foo1], "bar": [bar]})
+        dest.getPublishedSources.side_effect = None
+        dest.getPublishedSources.reset_mock()
+        return dest
+
+    @patch('cupstream2distro.packagemanager.launchpadmanager')
+    def test_get_current_version_for_series_from_index(self, mocklaunchpadmanager):
+        '''We answer the current version from an indexed archive without querying it again'''
+        dest = self.get_indexed_archive(mocklaunchpadmanager)
+
+        self.assertEquals(packagemanager.get_current_version_for_series("foo", "rolling", "didppa"), "2")
+        self.assertEquals(packagemanager.get_current_version_for_series("bar", "rolling", "didppa"), "3")
+        self.assertEquals(packagemanager.get_current_version_for_series("baz", "rolling", "didppa"), "0")
+        self.assertEquals(dest.getPublishedSources.call_count, 0)
+
+    @patch('cupstream2distro.packagemanager.launchpadmanager')
+    def test_is_version_for_series_in_dest_from_index(self, mocklaunchpadmanager):
+        '''We answer from an indexed archive, but still look at the history if the version isn't active'''
+        dest = self.get_indexed_archive(mocklaunchpadmanager)
+        series = mocklaunchpadmanager.get_series.return_value
+
+        self.assertTrue(packagemanager.is_version_for_series_in_dest("foo", "1", series, dest))
+        self.assertEquals(dest.getPublishedSources.call_count, 0)
+        dest.getPublishedSources.return_value.total_size = 1
+        self.assertTrue(packagemanager.is_version_for_series_in_dest("foo", "0.5", series, dest))
+        dest.getPublishedSources.assert_called_once_with(exact_match=True, source_name="foo", version="0.5",
+                                                         distro_series=series, pocket="Release")
+
+    @patch('cupstream2distro.packagemanager.launchpadmanager')
+    def test_get_published_source_from_index(self, mocklaunchpadmanager):
+        '''We return the publication from an indexed archive'''
+        dest = self.get_indexed_archive(mocklaunchpadmanager)
+        series = mocklaunchpadmanager.get_series.return_value
+
+        self.assertEquals(packagemanager.get_published_source("bar", "3", series, dest).status, "Pending")
+        self.assertEquals(dest.getPublishedSources.call_count, 0)
+
+    def test_get_published_source_not_in_dest(self):
+        '''We return None if the version isn't published in dest'''
+        dest = Mock()
+        dest.getPublishedSources.return_value = []
+        self.assertIsNone(packagemanager.get_published_source("foo", "42", Mock(), dest))
+
+    @patch('cupstream2distro.packagemanager.launchpadmanager')
+    def test_get_archs_built_in_dest(self, mocklaunchpadmanager):
+        '''We return archs having arch specific binaries for the latest published source in dest, and cache them'''
+        mocklaunchpadmanager.get_all_entries.side_effect = lambda collection: collection
+        dest = Mock()
+        dest.self_link = "https://api.launchpad.net/devel/ubuntu/+archive/primary"
+        series = Mock()
+        series.self_link = "https://api.launchpad.net/devel/ubuntu/rolling"
+        source = Mock(status="Published")
+        source.getPublishedBinaries.return_value = [
+            Mock(architecture_specific=True, distro_arch_series=Mock(architecture_tag="armhf")),
+            Mock(architecture_specific=False, distro_arch_series=Mock(architecture_tag="powerpc")),
+            Mock(architecture_specific=True, distro_arch_series=Mock(architecture_tag="amd64"))]
+        dest.getPublishedSources.return_value = [source]
+
+        with patch('cupstream2distro.cachemanager.COMMON_CACHE_DIR', os.path.abspath('cache')):
+            self.assertEquals(packagemanager.get_archs_built_in_dest("foo", series, dest), set(["amd64", "armhf"]))
+            self.assertEquals(packagemanager.get_archs_built_in_dest("foo", series, dest), set(["amd64", "armhf"]))
+
+        self.assertEquals(dest.getPublishedSources.call_count, 1)
+        self.assertEquals(source.getPublishedBinaries.call_count, 1)
+
+    def test_get_archs_built_in_dest_not_in_dest(self):
+        '''We return no arch if the source isn't published in dest'''
+        dest = Mock()
+        dest.getPublishedSources.return_value = []
+        self.assertEquals(packagemanager.get_archs_built_in_dest("foo", Mock(), dest), set())
+
     def test_lower_version(self):
         '''Matching expectations for different cases for lower/upper version'''
         self.assertTrue(packagemanager.is_version1_higher_than_version2('2-0ubuntu1', '1-0ubuntu1'))
@@ -135,6 +287,43 @@ class PackageManagerTests(BaseUnitTestCase):
         self.assertFalse(packagemanager.is_version1_higher_than_version2('2-0ubuntu1', '2daily13.10.1-0ubuntu1'))
         self.assertTrue(packagemanager.is_version1_higher_than_version2('2dailyrelease13.10.1.1-0ubuntu1', '2dailyrelease13.10.1-0ubuntu1'))
 
+    def test_invalid_version_is_not_higher(self):
+        '''A version dpkg refuses is never higher'''
+        self.assertFalse(packagemanager.is_version1_higher_than_version2('1:', '0'))
+
+    def test_get_highest_versions(self):
+        '''We get the highest version per source'''
+        self.assertEquals(packagemanager.get_highest_versions([("foo", "1.0-0ubuntu1"), ("bar", "2~rc1"),
+                                                               ("foo", "1.0~daily-0ubuntu1"), ("foo", "1.0-0ubuntu2"),
+                                                               ("bar", "1:1")]),
+                          {"foo": "1.0-0ubuntu2", "bar": "1:1"})
+
+    def test_get_highest_versions_of_publications(self):
+        '''We get the highest version per source of publications'''
+        source1 = Mock(source_package_name="foo", source_package_version="1.10")
+        source2 = Mock(source_package_name="foo", source_package_version="1.9")
+        self.assertEquals(packagemanager.get_highest_versions([source2, source1]), {"foo": "1.10"})
+
+    def test_get_highest_versions_skips_invalid(self):
+        '''We ignore versions dpkg refuses'''
+        self.assertEquals(packagemanager.get_highest_versions([("foo", "1.0"), ("foo", "1:"), ("bar", "1.0-")]),
+                          {"foo": "1.0"})
+
+    def test_get_sorted_versions(self):
+        '''We get versions per source, highest first and without duplicates'''
+        self.assertEquals(packagemanager.get_sorted_versions([("foo", "1.0"), ("foo", "1.0~rc1"), ("bar", "1"),
+                                                              ("foo", "1.0+b1"), ("foo", "1.0"), ("foo", "1:")]),
+                          {"foo": ["1.0+b1", "1.0", "1.0~rc1"], "bar": ["1"]})
+
+    def test_get_latest_by_date_created(self):
+        '''We get the most recent Published or Pending source'''
+        source1 = Mock(date_created=datetime(2014, 1, 1), status="Published")
+        source2 = Mock(date_created=datetime(2014, 3, 1), status="Deleted")
+        source3 = Mock(date_created=datetime(2014, 2, 1), status="Pending")
+        self.assertEquals(packagemanager.get_latest_by_date_created([source1, source2, source3]), source3)
+        self.assertEquals(packagemanager.get_latest_by_date_created([source1, source2, source3], True), source2)
+        self.assertIsNone(packagemanager.get_latest_by_date_created([source2]))
+
     def test_is_version_in_changelog_found(self):
         '''We find the desired version from changelog'''
         self.get_data_branch('simple')
@@ -242,6 +431,24 @@ class PackageManagerTests(BaseUnitTestCase):
         self.get_data_branch('simple')
         self.assertEquals(packagemanager.get_packaging_version(), "42.0daily83.09.13-0ubuntu2")
 
+    @patch('cupstream2distro.packagemanager.subprocess.Popen')
+    def test_get_packaging_version_in_process(self, popenMock):
+        '''Get latest packaging version without running dpkg-parsechangelog'''
+        self.get_data_branch('simple')
+        self.assertEquals(packagemanager.get_packaging_version(), "42.0daily83.09.13-0ubuntu2")
+        self.assertFalse(popenMock.called)
+
+    def test_get_packaging_version_unknown_format(self):
+        '''Fallback to dpkg-parsechangelog for changelog formats we don't know about'''
+        os.makedirs("debian")
+        with open(os.path.join("debian", "changelog"), "w") as f:
+            f.write("foo (1.0-0ubuntu1) utopic; urgency=low\n\n  * Initial release\n")
+        with patch('cupstream2distro.packagemanager.subprocess.Popen') as popenMock:
+            popenMock.return_value.communicate.return_value = ("Source: foo\nVersion: 1.0-0ubuntu1\n", "")
+            popenMock.return_value.returncode = 0
+            self.assertEquals(packagemanager.get_packaging_version(), "1.0-0ubuntu1")
+        popenMock.assert_called_once_with(["dpkg-parsechangelog"], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
     def test_list_packages_info_in_str_no_package(self):
         '''We return no packaging info if we get no package parameter'''
         self.assertEquals(packagemanager.list_packages_info_in_str(set()), "")
@@ -376,6 +583,114 @@ class PackageManagerTests(BaseUnitTestCase):
         source1.sourceFileUrls.assert_called_once()
         self.assertTrue(os.path.isdir(source_package_dir))
 
+    @patch('cupstream2distro.packagemanager.launchpadmanager')
+    def test_get_source_package_from_dest_writes_manifest(self, launchpadmanagerMock):
+        '''We write the content manifest next to the downloaded source'''
+        dest = Mock()
+        source1 = Mock()
+        dest.getPublishedSources.return_value = [source1]
+        source1.sourceFileUrls.return_value = self.get_source_files_for_package('foo_package', for_download=True)
+
+        source_package_dir = packagemanager.get_source_package_from_dest("foo", dest, "42.0daily83.09.13.2-0ubuntu1", "rolling")
+
+        self.assertTrue(os.path.isfile(source_package_dir + ".manifest"))
+        self.assertEquals(sourcetree.load_manifest(source_package_dir), sourcetree.build_manifest(source_package_dir))
+
+    @patch('cupstream2distro.packagemanager.sourcetree.build_manifest')
+    @patch('cupstream2distro.packagemanager.launchpadmanager')
+    def test_get_source_package_from_dest_reuses_manifest(self, launchpadmanagerMock, buildManifestMock):
+        '''We only build the manifest of a source version once, even when downloaded again elsewhere'''
+        buildManifestMock.return_value = {"foo": [1, 33188, "digest"]}
+        dest = Mock()
+        source1 = Mock()
+        dest.getPublishedSources.return_value = [source1]
+        source1.sourceFileUrls.return_value = self.get_source_files_for_package('foo_package', for_download=True)
+
+        packagemanager.get_source_package_from_dest("foo", dest, "42.0daily83.09.13.2-0ubuntu1", "rolling")
+        source_package_dir = packagemanager.get_source_package_from_dest("foo", dest, "42.0daily83.09.13.2-0ubuntu1", "rolling",
+                                                                         download_dir="otherstack")
+
+        self.assertEquals(buildManifestMock.call_count, 1)
+        self.assertEquals(sourcetree.load_manifest(source_package_dir), {"foo": [1, 33188, "digest"]})
+
+    def test_source_manifest_cache_key_per_dsc(self):
+        '''We don't share the manifest of the same version with a different content, from another archive'''
+        dsc_path = self.get_dsc_for_package('foo_package')
+        shutil.copy(dsc_path, "same.dsc")
+        with open(dsc_path) as f:
+            content = f.read()
+        with open("other.dsc", "w") as f:
+            f.write(content.replace("Maintainer:", "Maintainer: Other"))
+
+        cache_key = packagemanager._get_source_manifest_cache_key(dsc_path)
+        self.assertEquals(packagemanager._get_source_manifest_cache_key("same.dsc"), cache_key)
+        self.assertNotEquals(packagemanager._get_source_manifest_cache_key("other.dsc"), cache_key)
+
+    @patch('cupstream2distro.packagemanager.launchpadmanager')
+    def test_get_source_package_from_dest_shares_downloads(self, launchpadmanagerMock):
+        '''We only download once the source files of a version needed in multiple places'''
+        dest = Mock()
+        source1 = Mock()
+        dest.getPublishedSources.return_value = [source1]
+        source1.sourceFileUrls.return_value = self.get_source_files_for_package('foo_package', for_download=True)
+
+        packagemanager.get_source_package_from_dest("foo", dest, "42.0daily83.09.13.2-0ubuntu1", "rolling")
+        with patch('cupstream2distro.artifactstore._insert') as insertMock:
+            packagemanager.get_source_package_from_dest("foo", dest, "42.0daily83.09.13.2-0ubuntu1", "rolling",
+                                                        download_dir="otherstack")
+        self.assertFalse(insertMock.called)
+        tarball = os.path.join("foo", "foo_42.0daily83.09.13.2.orig.tar.gz")
+        self.assertEquals(os.stat(os.path.join("ubuntu", tarball)).st_ino, os.stat(os.path.join("otherstack", tarball)).st_ino)
+
+    @patch('cupstream2distro.packagemanager.launchpadmanager')
+    def test_get_source_package_from_dest_without_extracting(self, launchpadmanagerMock):
+        '''We only write the control and changelog files, next to the manifest, when not extracting'''
+        dest = Mock()
+        source1 = Mock()
+        dest.getPublishedSources.return_value = [source1]
+        source1.sourceFileUrls.return_value = self.get_source_files_for_package('foo_package', for_download=True)
+
+        source_package_dir = packagemanager.get_source_package_from_dest("foo", dest, "42.0daily83.09.13.2-0ubuntu1", "rolling",
+                                                                         extract=False)
+
+        self.assertEquals(os.listdir(source_package_dir), ["debian"])
+        self.assertEquals(sorted(os.listdir(os.path.join(source_package_dir, "debian"))), ["changelog", "control"])
+        self.assertIn(os.path.join("src", "real_source.c"), sourcetree.load_manifest(source_package_dir))
+        self.assertTrue(os.path.isfile(os.path.join(os.path.dirname(source_package_dir), "foo_42.0daily83.09.13.2-0ubuntu1.dsc")))
+
+    @patch('cupstream2distro.packagemanager.launchpadmanager')
+    def test_get_source_package_from_dest_without_extracting_reuses_manifest(self, launchpadmanagerMock):
+        '''We only read the whole source once when not extracting, even when downloaded again elsewhere'''
+        dest = Mock()
+        source1 = Mock()
+        dest.getPublishedSources.return_value = [source1]
+        source1.sourceFileUrls.return_value = self.get_source_files_for_package('foo_package', for_download=True)
+        packagemanager.get_source_package_from_dest("foo", dest, "42.0daily83.09.13.2-0ubuntu1", "rolling",
+                                                    extract=False)
+
+        with patch('cupstream2distro.packagemanager.sourcepackage.read_source') as readSourceMock:
+            source_package_dir = packagemanager.get_source_package_from_dest("foo", dest, "42.0daily83.09.13.2-0ubuntu1",
+                                                                             "rolling", download_dir="otherstack",
+                                                                             extract=False)
+        self.assertFalse(readSourceMock.called)
+        self.assertEquals(sorted(os.listdir(os.path.join(source_package_dir, "debian"))), ["changelog", "control"])
+        self.assertIn(os.path.join("src", "real_source.c"), sourcetree.load_manifest(source_package_dir))
+
+    @patch('cupstream2distro.packagemanager.sourcepackage.read_source')
+    @patch('cupstream2distro.packagemanager.launchpadmanager')
+    def test_get_source_package_from_dest_extract_unsupported_sources(self, launchpadmanagerMock, readSourceMock):
+        '''We extract sources we can't read in place, even when not asked to'''
+        readSourceMock.side_effect = packagemanager.sourcepackage.UnsupportedSourceException("unsupported")
+        dest = Mock()
+        source1 = Mock()
+        dest.getPublishedSources.return_value = [source1]
+        source1.sourceFileUrls.return_value = self.get_source_files_for_package('foo_package', for_download=True)
+
+        source_package_dir = packagemanager.get_source_package_from_dest("foo", dest, "42.0daily83.09.13.2-0ubuntu1", "rolling",
+                                                                         extract=False)
+
+        self.assertTrue(os.path.isfile(os.path.join(source_package_dir, "src", "real_source.c")))
+
     @patch('cupstream2distro.packagemanager.launchpadmanager')
     def test_get_source_package_from_dest_not_published(self, launchpadmanagerMock):
         '''We return none if the package was never published into the dest'''
@@ -405,6 +720,19 @@ class PackageManagerTests(BaseUnitTestCase):
         '''We release if there has been no upload before'''
         self.assertTrue(packagemanager.is_new_content_relevant_since_old_published_source(None))
 
+    @patch('cupstream2distro.packagemanager.sourcetree.get_changed_files')
+    def test_relevance_from_manifest(self, getChangedFilesMock):
+        '''We compare the branch to the destination manifest instead of its tree when there is one'''
+        self.get_data_branch('onemanualupload')
+        dest_version_source = os.path.abspath(os.path.join('..', 'onemanualupload_dest'))
+        shutil.copytree(self.get_ubuntu_source_content_path('onemanualupload'), dest_version_source)
+        sourcetree.write_manifest(dest_version_source)
+        self.assertFalse(packagemanager.is_new_content_relevant_since_old_published_source(dest_version_source))
+        with open("newfile", "w") as f:
+            f.write("foo")
+        self.assertTrue(packagemanager.is_new_content_relevant_since_old_published_source(dest_version_source))
+        self.assertFalse(getChangedFilesMock.called)
+
     def test_release_if_content_committed_before_snapshot_commit(self):
         '''We release if there is at least one change including an upstream change'''
         self.get_data_branch('oneupstreamchange_before_snapshot_committed')
@@ -469,6 +797,16 @@ class PackageManagerTests(BaseUnitTestCase):
         dest_version_source = self.get_ubuntu_source_content_path('ubuntu_foo_package_with_two_less_release')
         self.assertTrue(packagemanager.is_relevant("foo_42.0daily83.09.13.2-0ubuntu1.dsc", dest_version_source))
 
+    @patch('cupstream2distro.packagemanager._extract_generated_source')
+    def test_package_diffing_without_extracting(self, extractMock):
+        '''We check the relevance of a generated source without extracting it'''
+        for file in self.get_source_files_for_package("foo_package"):
+            if not os.path.isdir(file):
+                shutil.copy2(file, '.')
+        dest_version_source = self.get_ubuntu_source_content_path('ubuntu_foo_package_with_two_less_release')
+        self.assertTrue(packagemanager.is_relevant("foo_42.0daily83.09.13.2-0ubuntu1.dsc", dest_version_source))
+        self.assertFalse(extractMock.called)
+
     def test_detect_packaging_changes_since_last_release(self):
         '''We detect packaging changes since last release'''
         self.assertTrue(packagemanager._packaging_changes_between_dsc(self.get_dsc_for_package("foo_package"),
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2014 Canonical
+#
+# Authors:
+#  Didier Roche
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+from . import BaseUnitTestCase
+
+from cupstream2distro import pollscheduler
+
+import datetime
+from mock import Mock, patch
+import os
+
+STARTED = datetime.datetime(2014, 8, 1, 10, 0, 0)
+STARTED_TIMESTAMP = 1406887200
+
+
+class PollSchedulerTests(BaseUnitTestCase):
+
+    def setUp(self):
+        super(PollSchedulerTests, self).setUp()
+        for (target, value) in (('cupstream2distro.cachemanager.COMMON_CACHE_DIR', os.path.abspath('cache')),
+                                ('cupstream2distro.pollscheduler.TIME_BETWEEN_PPA_CHECKS', 300),
+                                ('cupstream2distro.pollscheduler.PPA_CHECK_MAX_INTERVAL', 900)):
+            patcher = patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def get_build(self, date_started=STARTED, datebuilt=None, arch_tag="amd64"):
+        return Mock(date_started=date_started, datebuilt=datebuilt, arch_tag=arch_tag)
+
+    def test_no_eta_without_history(self):
+        '''We can't tell when a build completes if we never saw one'''
+        self.assertIsNone(pollscheduler.get_build_eta("foo", self.get_build()))
+
+    def test_no_eta_before_dispatch(self):
+        '''We can't tell when a build completes if it didn't start'''
+        pollscheduler.record_build_duration("foo", self.get_build(datebuilt=STARTED + datetime.timedelta(minutes=10)))
+        self.assertIsNone(pollscheduler.get_build_eta("foo", self.get_build(date_started=None)))
+
+    def test_eta_from_last_build_duration(self):
+        '''We expect a build to take as long as the last one of the same source on the same arch'''
+        pollscheduler.record_build_duration("foo", self.get_build(datebuilt=STARTED + datetime.timedelta(minutes=10)))
+        self.assertEquals(pollscheduler.get_build_duration("foo", "amd64"), 600)
+        self.assertEquals(pollscheduler.get_build_eta("foo", self.get_build()), STARTED_TIMESTAMP + 600)
+        self.assertIsNone(pollscheduler.get_build_eta("foo", self.get_build(arch_tag="armhf")))
+        self.assertIsNone(pollscheduler.get_build_eta("bar", self.get_build()))
+
+    def test_eta_of_finished_build(self):
+        '''A finished build is only waiting for its binaries to be published'''
+        self.assertEquals(pollscheduler.get_build_eta("foo", self.get_build(datebuilt=STARTED)), STARTED_TIMESTAMP)
+
+    def test_eta_from_string_dates(self):
+        '''We handle dates given as strings'''
+        self.assertEquals(pollscheduler.get_build_eta("foo", self.get_build(datebuilt="2014-08-01T10:00:00+00:00")),
+                          STARTED_TIMESTAMP)
+
+    def test_delay_unknown(self):
+        '''We keep the regular delay when we can't tell when builds complete'''
+        self.assertEquals(pollscheduler.get_next_check_delay([None], now=0), 300)
+        self.assertEquals(pollscheduler.get_next_check_delay([], now=0), 300)
+
+    def test_delay_until_eta(self):
+        '''We sleep until the expected completion, but at least the regular delay'''
+        self.assertEquals(pollscheduler.get_next_check_delay([600], now=0), 600)
+        self.assertEquals(pollscheduler.get_next_check_delay([600, 400], now=0), 400)
+        self.assertEquals(pollscheduler.get_next_check_delay([600], now=590), 300)
+
+    def test_delay_is_capped(self):
+        '''We sleep at most PPA_CHECK_MAX_INTERVAL for known etas and the regular delay for unknown ones'''
+        self.assertEquals(pollscheduler.get_next_check_delay([3600], now=0), 900)
+        self.assertEquals(pollscheduler.get_next_check_delay([3600, None], now=0), 300)
+
+    def test_delay_backs_off_when_late(self):
+        '''We check less and less often when a build is late'''
+        self.assertEquals(pollscheduler.get_next_check_delay([600], now=600), 300)
+        self.assertEquals(pollscheduler.get_next_check_delay([600], now=900), 300)
+        self.assertEquals(pollscheduler.get_next_check_delay([600], now=1200), 600)
+        self.assertEquals(pollscheduler.get_next_check_delay([600], now=100000), 900)
+
+    def count_checks(self, get_delay, completion):
+        '''Return how many checks it takes to see a build started at 0 completing at completion'''
+        (now, checks) = (0, 1)
+        while now < completion:
+            now += get_delay(now)
+            checks += 1
+        return checks
+
+    def test_no_more_checks_than_regular_delay(self):
+        '''A whole build never takes more checks than with the regular delay, and far less for long builds'''
+        for duration in (60, 300, 610, 1000, 3600, 7200):
+            for late in (-120, 0, 10, 200, 1000, 5000):
+                completion = max(duration + late, 0)
+                checks = self.count_checks(lambda now: pollscheduler.get_next_check_delay([duration], now=now),
+                                           completion)
+                self.assertLessEqual(checks, self.count_checks(lambda now: 300, completion),
+                                     (duration, late))
+        self.assertEquals(self.count_checks(lambda now: pollscheduler.get_next_check_delay([7200], now=now), 7200),
+                          9)
+        self.assertEquals(self.count_checks(lambda now: 300, 7200), 25)
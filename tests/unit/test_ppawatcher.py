@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2014 Canonical
+#
+# Authors:
+#  Didier Roche
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+from . import BaseFakeLaunchpadTestCase
+
+from cupstream2distro import launchpadmanager, packageinppamanager, packagemanager, ppawatcher
+
+import json
+from mock import patch
+import os
+import socket
+import threading
+import time
+
+
+class PPAWatcherTests(BaseFakeLaunchpadTestCase):
+    '''Watch the silo ppa of the local launchpad stand-in, in the job or in the ppa watcher'''
+
+    def get_registration(self, source, version):
+        '''Return the registration of a watch on source and version in the silo ppa'''
+        with open("{}_{}.dsc".format(source, version), "w") as f:
+            f.write("Source: {}\nArchitecture: any\n".format(source))
+        return ppawatcher.get_registration("ci-train-ppa-service/ubuntu/landing-001", "utopic", [(source, version)])
+
+    def test_watch_in_process(self):
+        '''We watch packages in the job itself'''
+        self.start_server()
+        watch = ppawatcher.Watch(self.get_registration("foo", "1.1+14.10.20140820-0ubuntu1"))
+        self.assertEquals(ppawatcher.watch_in_process(watch), (True, "All packages are published in the ppa"))
+
+    def test_ppa_watcher_shares_checks(self):
+        '''The ppa watcher checks a ppa once for all jobs watching it, and replies to each job'''
+        self.start_server()
+        watcher = ppawatcher.PPAWatcher(os.path.abspath("ppa-watcher.socket"), os.path.abspath("stats.json"))
+        watcher.listen()
+        self.addCleanup(watcher.stop)
+        results = {}
+
+        def delegate(source, version):
+            results[source] = ppawatcher.delegate(self.get_registration(source, version), watcher.socket_path)
+        jobs = [threading.Thread(target=delegate, args=package)
+                for package in (("foo", "1.1+14.10.20140820-0ubuntu1"), ("bar", "2.1+14.10.20140820-0ubuntu1"))]
+        for job in jobs:
+            job.start()
+        # both jobs are registered before the first check
+        while watcher.registrations.qsize() < 2:
+            time.sleep(0.01)
+
+        with patch('cupstream2distro.packageinppamanager.sweep_ppa_status',
+                   wraps=packageinppamanager.sweep_ppa_status) as sweepMock:
+            run = threading.Thread(target=watcher.run)
+            run.start()
+            for job in jobs:
+                job.join()
+            watcher.stop()
+            run.join()
+        self.assertEquals(results, {"foo": (True, "All packages are published in the ppa"),
+                                    "bar": (True, "All packages are published in the ppa")})
+        self.assertEquals(sweepMock.call_count, 1)
+        self.assertEquals(watcher.watches, {})
+        # nothing loaded during the cycle is kept
+        self.assertEquals((launchpadmanager._resources, launchpadmanager._named_resources,
+                           packagemanager._published_sources_index, launchpadmanager._api_stats), ({}, {}, {}, {}))
+        with open("stats.json") as f:
+            self.assertEquals(json.load(f)["methods"]["getBuildRecords"]["calls"], 1)
+
+    def test_ppa_watcher_registers_outside_checks(self):
+        '''Jobs registering an unknown ppa get their answer without waiting for the checks'''
+        self.start_server()
+        watcher = ppawatcher.PPAWatcher(os.path.abspath("ppa-watcher.socket"))
+        watcher.listen()
+        self.addCleanup(watcher.stop)
+        registration = self.get_registration("foo", "1.1+14.10.20140820-0ubuntu1")
+        registration["ppa"] = "ci-train-ppa-service/ubuntu/landing-999"
+        with self.assertRaises(socket.error) as cm:
+            ppawatcher.delegate(registration, watcher.socket_path)
+        self.assertTrue(str(cm.exception).startswith("Can't watch ci-train-ppa-service/ubuntu/landing-999"),
+                        cm.exception)
+        self.assertTrue(watcher.registrations.empty())
+
+    def test_ppa_watcher_fails_loading_watch(self):
+        '''Jobs watch the packages themselves when the ppa watcher fails to load their watch'''
+        self.start_server()
+        watcher = ppawatcher.PPAWatcher(os.path.abspath("ppa-watcher.socket"))
+        watcher.listen()
+        self.addCleanup(watcher.stop)
+        registration = self.get_registration("foo", "1.1+14.10.20140820-0ubuntu1")
+        with patch('cupstream2distro.ppawatcher.Watch', side_effect=IOError("Launchpad timed out")):
+            self.assertRaises(socket.error, ppawatcher.delegate, registration, watcher.socket_path)
+        self.assertTrue(watcher.registrations.empty())
+        self.assertEquals(ppawatcher.watch_in_process(ppawatcher.Watch(registration)),
+                          (True, "All packages are published in the ppa"))
+
+    def test_ppa_watcher_not_running(self):
+        '''Jobs know when there is no ppa watcher to watch for them'''
+        self.assertRaises(socket.error, ppawatcher.delegate, self.get_registration("foo", "1.0-0ubuntu1"),
+                          os.path.abspath("ppa-watcher.socket"))
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2014 Canonical
+#
+# Authors:
+#  Didier Roche
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+from . import BaseUnitTestCase
+
+from cupstream2distro import ratelimiter
+
+from mock import patch
+import json
+import os
+
+
+class RateLimiterTests(BaseUnitTestCase):
+
+    def setUp(self):
+        super(RateLimiterTests, self).setUp()
+        self.state_file = os.path.abspath(os.path.join('cu2d', 'launchpad.ratelimit'))
+        for (name, value) in (('LAUNCHPAD_RATE_LIMIT_FILE', self.state_file), ('LAUNCHPAD_BURST', 2),
+                              ('LAUNCHPAD_MAX_REQUESTS_PER_SECOND', 4), ('LAUNCHPAD_MIN_REQUESTS_PER_SECOND', 1),
+                              ('LAUNCHPAD_RATE_INCREASE', 0.5)):
+            patcher = patch('cupstream2distro.ratelimiter.{}'.format(name), value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = patch('cupstream2distro.ratelimiter.time')
+        self.time = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.time.time.return_value = 1000
+
+    def get_state(self):
+        with open(self.state_file) as f:
+            return json.load(f)
+
+    def test_acquire_within_burst(self):
+        '''We don't wait while there are tokens left'''
+        ratelimiter.acquire()
+        ratelimiter.acquire()
+        self.assertFalse(self.time.sleep.called)
+        self.assertEquals(self.get_state()["tokens"], 0)
+
+    def test_acquire_waits_for_token(self):
+        '''We wait for the next token once the bucket is empty'''
+        ratelimiter.acquire()
+        ratelimiter.acquire()
+
+        def sleep(delay):
+            self.time.time.return_value += delay
+        self.time.sleep.side_effect = sleep
+        ratelimiter.acquire()
+        self.time.sleep.assert_called_once_with(0.25)
+
+    def test_bucket_refills_over_time(self):
+        '''Tokens come back with time, up to the burst size'''
+        ratelimiter.acquire()
+        ratelimiter.acquire()
+        self.time.time.return_value = 2000
+        ratelimiter.acquire()
+        self.assertFalse(self.time.sleep.called)
+        self.assertEquals(self.get_state()["tokens"], 1)
+
+    def test_report_throttled_slows_down(self):
+        '''We halve the rate when throttled, down to the minimum, and regain it on success'''
+        ratelimiter.report_throttled()
+        self.assertEquals(self.get_state()["rate"], 2)
+        ratelimiter.report_throttled()
+        ratelimiter.report_throttled()
+        self.assertEquals(self.get_state()["rate"], 1)
+        self.time.time.return_value = 2000
+        ratelimiter.acquire()
+        self.assertEquals(self.get_state()["rate"], 1.5)
+
+    def test_corrupted_state(self):
+        '''We start from a fresh state if the state file is corrupted'''
+        os.makedirs(os.path.dirname(self.state_file))
+        with open(self.state_file, 'w') as f:
+            f.write("garbage")
+        ratelimiter.acquire()
+        self.assertEquals(self.get_state()["tokens"], 1)
+
+    def test_unusable_state_file(self):
+        '''We don't limit if we can't use the state file'''
+        os.makedirs(self.state_file)
+        ratelimiter.acquire()
+        self.assertFalse(self.time.sleep.called)
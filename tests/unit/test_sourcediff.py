@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2014 Canonical
+#
+# Authors:
+#  Didier Roche
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+from . import BaseUnitTestCase
+
+from cupstream2distro import sourcediff
+
+import glob
+from mock import patch
+import os
+import shutil
+
+
+class SourceDiffTests(BaseUnitTestCase):
+
+    def setUp(self):
+        super(SourceDiffTests, self).setUp()
+        sourcediff._get_source_diff.cache_clear()
+        self.addCleanup(sourcediff._get_source_diff.cache_clear)
+
+    def get_dsc(self, package_name):
+        return glob.glob(os.path.join(self.data_dir, 'ubuntu_source_packages', package_name, '*.dsc'))[0]
+
+    def test_packaging_changes(self):
+        '''We detect changes in debian/, ignoring the changelog'''
+        self.assertTrue(sourcediff.get_source_diff(self.get_dsc('foo_package'),
+                                                   self.get_dsc('foo_package_with_new_binary_package'))
+                        .has_packaging_changes())
+        self.assertFalse(sourcediff.get_source_diff(self.get_dsc('foo_package'),
+                                                    self.get_dsc('foo_package_with_upstream_changes'))
+                         .has_packaging_changes())
+
+    def test_new_binary_packages(self):
+        '''We list binary packages only present in the new debian/control'''
+        diff = sourcediff.get_source_diff(self.get_dsc('foo_package'),
+                                          self.get_dsc('foo_package_with_new_binary_package'))
+        self.assertEquals(diff.get_new_binary_packages(), ['foo-with-baz'])
+
+    def test_moved_binary_package_isnt_new(self):
+        '''A binary package moved in debian/control isn't reported as new'''
+        diff = sourcediff.get_source_diff(self.get_dsc('foo_package'), self.get_dsc('foo_package'))
+        diff.new_contents = {'debian/control': 'Source: foo\n\nPackage: b\n\nPackage: a\n\nPackage: c\n'}
+        diff.old_contents = {'debian/control': 'Source: foo\n\nPackage: a\n\nPackage: b\n'}
+        self.assertEquals(diff.get_new_binary_packages(), ['c'])
+
+    def test_render_only_packaging_files(self):
+        '''We only render the packaging and build system files'''
+        diff = sourcediff.get_source_diff(self.get_dsc('foo_package'),
+                                          self.get_dsc('foo_package_with_upstream_and_packaging_changes'))
+        self.assertEquals([line.split('/', 1)[1] for line in diff.render().splitlines() if line.startswith('+++ ')],
+                          ['CMakeLists.txt', 'configure.ac', 'debian/changelog', 'debian/control',
+                           'debian/subdir/subpackagefile', 'setup.py', 'src/CMakeLists.txt', 'src/Makefile.am'])
+        self.assertTrue(len(diff.changed_files) > 8)
+
+    def test_render_missing_last_newline(self):
+        '''We mark files without a trailing newline'''
+        diff = sourcediff.get_source_diff(self.get_dsc('foo_package'), self.get_dsc('foo_package'))
+        diff.changed_files = set(['debian/rules'])
+        diff.old_contents = {'debian/rules': 'a\nb'}
+        diff.new_contents = {'debian/rules': 'a\nc'}
+        self.assertEquals(diff.render().splitlines()[-4:],
+                          ['-b', '\\ No newline at end of file', '+c', '\\ No newline at end of file'])
+
+    @patch('cupstream2distro.sourcediff.SourceDiff')
+    def test_diff_computed_once(self, source_diff_mock):
+        '''We only diff a pair of sources once while they don't change'''
+        for package_name in ('foo_package', 'foo_package_with_new_binary_package'):
+            shutil.copytree(os.path.join(self.data_dir, 'ubuntu_source_packages', package_name), package_name)
+        olddsc = glob.glob(os.path.join('foo_package', '*.dsc'))[0]
+        newdsc = glob.glob(os.path.join('foo_package_with_new_binary_package', '*.dsc'))[0]
+        sourcediff.get_source_diff(olddsc, newdsc)
+        sourcediff.get_source_diff(os.path.abspath(olddsc), newdsc)
+        self.assertEquals(source_diff_mock.call_count, 1)
+        with open(newdsc, 'a') as f:
+            f.write('\n')
+        sourcediff.get_source_diff(olddsc, newdsc)
+        self.assertEquals(source_diff_mock.call_count, 2)
@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2014 Canonical
+#
+# Authors:
+#  Didier Roche
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+from unittest import skipUnless
+from . import BaseUnitTestCase
+
+from cupstream2distro import sourcepackage, sourcetree
+from cupstream2distro.utils import ignored
+
+from distutils.spawn import find_executable
+import glob
+from mock import patch
+import os
+import subprocess
+import tarfile
+
+MAIN_C = "".join("line {}\n".format(i) for i in range(100))
+
+PATCH = '''--- a/src/main.c
++++ b/src/main.c
+@@ -1,6 +1,7 @@
+ line 0
+ line 1
+ line 2
++inserted
+ line 3
+ line 4
+ line 5
+@@ -48,7 +49,7 @@
+ line 47
+ line 48
+ line 49
+-line 50
++LINE 50
+ line 51
+ line 52
+ line 53
+--- /dev/null
++++ b/NEW
+@@ -0,0 +1 @@
++new file
+\\ No newline at end of file
+'''
+
+
+class SourcePackageTests(BaseUnitTestCase):
+
+    def write(self, path, content):
+        with ignored(OSError):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def make_quilt_source(self, patches, series):
+        '''Create a 3.0 (quilt) source package with an upstream symlink and component, return its dsc'''
+        self.write(os.path.join('bar-1.0', 'src', 'main.c'), MAIN_C)
+        self.write(os.path.join('bar-1.0', 'debian', 'control'), 'upstream packaging')
+        os.symlink('src/main.c', os.path.join('bar-1.0', 'link'))
+        self.write(os.path.join('bar-comp', 'file'), 'component')
+        self.write(os.path.join('debian', 'control'), 'Source: bar\n')
+        self.write(os.path.join('debian', 'patches', 'series'), series)
+        for (name, content) in patches.items():
+            self.write(os.path.join('debian', 'patches', name), content)
+        for (tarball, directory) in (('bar_1.0.orig.tar.gz', 'bar-1.0'), ('bar_1.0.orig-comp.tar.bz2', 'bar-comp'),
+                                     ('bar_1.0-1.debian.tar.gz', 'debian')):
+            with tarfile.open(tarball, 'w:' + tarball.split('.')[-1]) as tar:
+                tar.add(directory)
+        self.write('bar_1.0-1.dsc', 'Format: 3.0 (quilt)\nSource: bar\nVersion: 1.0-1\nFiles:\n'
+                   ' 0 0 bar_1.0.orig.tar.gz\n 0 0 bar_1.0.orig-comp.tar.bz2\n 0 0 bar_1.0-1.debian.tar.gz\n')
+        return 'bar_1.0-1.dsc'
+
+    def test_get_dsc_fields(self):
+        '''We read single and multiline fields of a signed dsc'''
+        fields = sourcepackage.get_dsc_fields(os.path.join(self.data_dir, 'ubuntu_source_packages', 'foo_package',
+                                                           'foo_42.0daily83.09.13.2-0ubuntu1.dsc'))
+        self.assertEquals(fields['Format'], '1.0')
+        self.assertEquals(fields['Files'], 'a4226cd3623f0a1bb51738f0fdaa818c 10240 foo_42.0daily83.09.13.2.orig.tar.gz\n'
+                                           '8a268e73278098bc5d34fcb25b6eb122 991 foo_42.0daily83.09.13.2-0ubuntu1.diff.gz')
+
+    @skipUnless(find_executable("dpkg-source"), "dpkg-source isn't available")
+    def test_read_source_as_extracted(self):
+        '''We compute the same content than dpkg-source extracts, for native and non native packages'''
+        for dsc in glob.glob(os.path.join(self.data_dir, 'ubuntu_source_packages', '*', '*.dsc')):
+            extracted = os.path.abspath(os.path.basename(os.path.dirname(dsc)))
+            subprocess.check_call(['dpkg-source', '--no-check', '-x', dsc, extracted], stdout=subprocess.PIPE)
+            (manifest, contents) = sourcepackage.read_source(dsc)
+            self.assertEquals(sourcetree.get_changed_files_between_manifests(manifest,
+                                                                             sourcetree.build_manifest(extracted)),
+                              set(), dsc)
+
+    def test_read_source_members(self):
+        '''We return the content of the requested files, with the debian diff applied'''
+        dsc = os.path.join(self.data_dir, 'ubuntu_source_packages', 'foo_package', 'foo_42.0daily83.09.13.2-0ubuntu1.dsc')
+        (manifest, contents) = sourcepackage.read_source(dsc, ['debian/changelog', 'doesnt/exist'])
+        self.assertEquals(contents.keys(), ['debian/changelog'])
+        self.assertTrue(contents['debian/changelog'].startswith('foo (42.0daily83.09.13.2-0ubuntu1)'))
+
+    def test_read_members_from_diff(self):
+        '''We only read the debian diff for the files it creates'''
+        dsc = os.path.join(self.data_dir, 'ubuntu_source_packages', 'foo_package', 'foo_42.0daily83.09.13.2-0ubuntu1.dsc')
+        members = ['debian/changelog', 'debian/control']
+        expected = sourcepackage.read_source(dsc, members)[1]
+        with patch('cupstream2distro.sourcepackage._open_tar') as openTarMock:
+            self.assertEquals(sourcepackage.read_members(dsc, members), expected)
+        self.assertFalse(openTarMock.called)
+        self.assertEquals(sourcepackage.read_members(dsc, ['src/real_source.c']),
+                          sourcepackage.read_source(dsc, ['src/real_source.c'])[1])
+
+    def test_read_quilt_source(self):
+        '''We apply quilt patches, replace the upstream debian directory and add components'''
+        dsc = self.make_quilt_source({'one.patch': PATCH}, 'one.patch\n')
+        (manifest, contents) = sourcepackage.read_source(dsc, ['src/main.c', 'NEW'])
+        lines = MAIN_C.splitlines(True)
+        lines.insert(3, 'inserted\n')
+        lines[51] = 'LINE 50\n'
+        self.assertEquals(contents, {'src/main.c': ''.join(lines), 'NEW': 'new file'})
+        self.assertEquals(sorted(manifest), ['NEW', 'comp/file', 'debian/control', 'debian/patches/one.patch',
+                                             'debian/patches/series', 'link', 'src/main.c'])
+        self.assertEquals(manifest['link'][2], 'link:src/main.c')
+        self.assertEquals(manifest['debian/control'][0], len('Source: bar\n'))
+
+    def test_read_quilt_members(self):
+        '''We only read the debian tarball for debian files, unless a quilt patch touches them'''
+        dsc = self.make_quilt_source({'one.patch': PATCH}, 'one.patch\n')
+        self.assertEquals(sourcepackage.read_members(dsc, ['debian/control']), {'debian/control': 'Source: bar\n'})
+        self.assertEquals(sourcepackage.read_members(dsc, ['src/main.c', 'NEW']),
+                          sourcepackage.read_source(dsc, ['src/main.c', 'NEW'])[1])
+
+    def test_read_quilt_source_with_offset_patch(self):
+        '''We apply patches whose hunks moved since they were written'''
+        offset_patch = PATCH.replace('@@ -48,7 +49,7 @@', '@@ -40,7 +41,7 @@')
+        dsc = self.make_quilt_source({'one.patch': offset_patch}, '# comment\none.patch -p1\n')
+        self.assertIn('LINE 50', sourcepackage.read_source(dsc, ['src/main.c'])[1]['src/main.c'])
+
+    def test_read_quilt_source_patch_not_applying(self):
+        '''We refuse sources with patches which need fuzz to apply'''
+        dsc = self.make_quilt_source({'one.patch': PATCH.replace(' line 49\n', ' line 42\n')}, 'one.patch\n')
+        with self.assertRaises(sourcepackage.UnsupportedSourceException):
+            sourcepackage.read_source(dsc)
+
+    def test_unsupported_format(self):
+        '''We refuse source formats we don't know about'''
+        self.write('foo.dsc', 'Format: 3.0 (git)\nFiles:\n 0 0 foo.git\n')
+        with self.assertRaises(sourcepackage.UnsupportedSourceException):
+            sourcepackage.read_source('foo.dsc')
+
+    def test_parse_patch(self):
+        '''We parse file paths and hunks of unified diffs'''
+        patches = sourcepackage.parse_patch(PATCH)
+        self.assertEquals([(old_path, new_path, len(hunks)) for (old_path, new_path, hunks) in patches],
+                          [('src/main.c', 'src/main.c', 2), (None, 'NEW', 1)])
+        self.assertEquals(patches[1][2], [(0, [], ['new file'])])
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2014 Canonical
+#
+# Authors:
+#  Didier Roche
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+from . import BaseUnitTestCase
+
+from cupstream2distro import sourcetree
+from cupstream2distro.utils import ignored
+
+from mock import patch
+import os
+
+
+class SourceTreeTests(BaseUnitTestCase):
+
+    def write(self, path, content):
+        with ignored(OSError):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def setUp(self):
+        super(SourceTreeTests, self).setUp()
+        for tree in ('tree1', 'tree2'):
+            self.write(os.path.join(tree, 'src', 'main.c'), 'int main() {}\n')
+            self.write(os.path.join(tree, 'debian', 'control'), 'Source: foo\nVcs-Bzr: lp:foo\n')
+
+    def test_same_trees(self):
+        '''Identical trees have no changed files'''
+        self.assertEquals(sourcetree.get_changed_files('tree1', 'tree2'), set())
+
+    def test_changed_content(self):
+        '''We detect files with the same size but a different content'''
+        self.write(os.path.join('tree2', 'src', 'main.c'), 'int mane() {}\n')
+        self.assertEquals(sourcetree.get_changed_files('tree1', 'tree2'), set([os.path.join('src', 'main.c')]))
+
+    def test_files_in_one_tree_only(self):
+        '''Files only in one of the trees are changed'''
+        self.write(os.path.join('tree1', 'README'), 'foo')
+        self.write(os.path.join('tree2', 'src', 'new.c'), '')
+        self.assertEquals(sourcetree.get_changed_files('tree1', 'tree2'),
+                          set(['README', os.path.join('src', 'new.c')]))
+
+    def test_excluded_files_and_dirs(self):
+        '''We ignore translations, local options and bzr or quilt metadata'''
+        self.write(os.path.join('tree1', 'po', 'fr.po'), 'foo')
+        self.write(os.path.join('tree1', 'po', 'foo.pot'), 'foo')
+        self.write(os.path.join('tree1', 'debian', 'source', 'local-options'), 'foo')
+        self.write(os.path.join('tree1', '.bzr', 'branch-format'), 'foo')
+        self.write(os.path.join('tree2', '.pc', 'applied-patches'), 'foo')
+        self.assertEquals(sourcetree.get_changed_files('tree1', 'tree2'), set())
+
+    def test_symlinks(self):
+        '''Symlinks are compared on their target'''
+        os.symlink('main.c', os.path.join('tree1', 'src', 'link'))
+        os.symlink('main.c', os.path.join('tree2', 'src', 'link'))
+        os.symlink('src', os.path.join('tree1', 'dirlink'))
+        os.symlink('debian', os.path.join('tree2', 'dirlink'))
+        self.assertEquals(sourcetree.get_changed_files('tree1', 'tree2'), set(['dirlink']))
+
+    @patch('cupstream2distro.sourcetree.file_digest')
+    def test_different_sizes_not_hashed(self, digestMock):
+        '''We don't read files with different sizes'''
+        self.write(os.path.join('tree2', 'src', 'main.c'), 'int main() { return 0; }\n')
+        self.write(os.path.join('tree2', 'debian', 'control'), 'Source: foo\n')
+        self.assertEquals(sourcetree.get_changed_files('tree1', 'tree2'),
+                          set([os.path.join('src', 'main.c'), os.path.join('debian', 'control')]))
+        self.assertFalse(digestMock.called)
+
+    def test_vcs_only_control_changes(self):
+        '''Vcs-* fields and comments changes in control aren't relevant'''
+        self.write(os.path.join('tree2', 'debian', 'control'), '# a comment\nSource: foo\nVcs-Bzr: lp:~foo/foo/bar\n')
+        self.assertFalse(sourcetree.has_relevant_control_changes(os.path.join('tree1', 'debian', 'control'),
+                                                                 os.path.join('tree2', 'debian', 'control')))
+
+    def test_relevant_control_changes(self):
+        '''Other control changes are relevant'''
+        self.write(os.path.join('tree2', 'debian', 'control'), 'Source: foo\nVcs-Bzr: lp:foo\nBuild-Depends: bar\n')
+        self.assertTrue(sourcetree.has_relevant_control_changes(os.path.join('tree1', 'debian', 'control'),
+                                                                os.path.join('tree2', 'debian', 'control')))
+
+    def test_manifest_of_same_tree(self):
+        '''A tree has no changed files compared to its own manifest, read back from disk'''
+        os.symlink('main.c', os.path.join('tree1', 'src', 'link'))
+        sourcetree.write_manifest('tree1')
+        self.assertTrue(os.path.isfile('tree1.manifest'))
+        self.assertEquals(sourcetree.get_changed_files_from_manifest('tree1', sourcetree.load_manifest('tree1')), set())
+
+    def test_manifest_entries(self):
+        '''The manifest records size, mode and content hash of each file'''
+        manifest = sourcetree.build_manifest('tree1')
+        path = os.path.join('tree1', 'src', 'main.c')
+        self.assertEquals(manifest[os.path.join('src', 'main.c')],
+                          [14, os.lstat(path).st_mode, sourcetree.file_digest(path)])
+
+    def test_manifest_changes(self):
+        '''We detect changed, added, removed and relinked files against a manifest'''
+        os.symlink('main.c', os.path.join('tree1', 'src', 'link'))
+        manifest = sourcetree.build_manifest('tree1')
+        self.write(os.path.join('tree2', 'src', 'main.c'), 'int mane() {}\n')
+        self.write(os.path.join('tree2', 'README'), 'foo')
+        os.symlink('README', os.path.join('tree2', 'src', 'link'))
+        self.assertEquals(sourcetree.get_changed_files_from_manifest('tree2', manifest),
+                          set([os.path.join('src', 'main.c'), os.path.join('src', 'link'), 'README']))
+
+    def test_manifest_excluded_files(self):
+        '''Excluded files are in the manifest, but ignored when comparing'''
+        self.write(os.path.join('tree1', 'po', 'fr.po'), 'foo')
+        manifest = sourcetree.build_manifest('tree1')
+        self.assertIn(os.path.join('po', 'fr.po'), manifest)
+        self.assertEquals(sourcetree.get_changed_files_from_manifest('tree2', manifest), set())
+
+    @patch('cupstream2distro.sourcetree.file_digest')
+    def test_manifest_different_sizes_not_hashed(self, digestMock):
+        '''We don't read files with a different size than in the manifest'''
+        digestMock.return_value = 'digest'
+        manifest = sourcetree.build_manifest('tree1')
+        digestMock.reset_mock()
+        self.write(os.path.join('tree2', 'src', 'main.c'), 'int main() { return 0; }\n')
+        self.write(os.path.join('tree2', 'debian', 'control'), 'Source: foo\n')
+        self.assertEquals(sourcetree.get_changed_files_from_manifest('tree2', manifest),
+                          set([os.path.join('src', 'main.c'), os.path.join('debian', 'control')]))
+        self.assertFalse(digestMock.called)
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+# Copyright: (C) 2014 Canonical
+#
+# Authors:
+#  Didier Roche
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; version 3.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc.,
+# 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+from . import BaseUnitTestCase
+
+from cupstream2distro import utils
+
+import logging
+
+
+class UtilsTests(BaseUnitTestCase):
+
+    def setUp(self):
+        super(UtilsTests, self).setUp()
+        self.messages = []
+        handler = logging.Handler()
+        handler.emit = lambda record: self.messages.append(record.getMessage())
+        root_logger = logging.getLogger()
+        root_logger.addHandler(handler)
+        self.addCleanup(root_logger.removeHandler, handler)
+        self.addCleanup(root_logger.setLevel, root_logger.level)
+        root_logger.setLevel(logging.INFO)
+
+    def test_held_logs(self):
+        '''Records are held back during the context and emitted once each afterwards'''
+        second_handler = logging.Handler()
+        second_handler.emit = lambda record: None
+        logging.getLogger().addHandler(second_handler)
+        self.addCleanup(logging.getLogger().removeHandler, second_handler)
+        with utils.held_logs() as records:
+            logging.info("first")
+            logging.info("second")
+        self.assertEquals(self.messages, [])
+        self.assertEquals([record.getMessage() for record in records], ["first", "second"])
+        utils.emit_logs(records)
+        self.assertEquals(self.messages, ["first", "second"])
+
+    def test_held_logs_of_named_loggers(self):
+        '''Records of named loggers, propagated to the root logger handlers, are held back too'''
+        with utils.held_logs() as records:
+            logging.getLogger("launchpadlib").info("from a library")
+        self.assertEquals(self.messages, [])
+        self.assertEquals([(record.name, record.getMessage()) for record in records],
+                          [("launchpadlib", "from a library")])
+        utils.emit_logs(records)
+        self.assertEquals(self.messages, ["from a library"])
+
+    def test_logs_are_emitted_outside_held_logs(self):
+        '''Records logged outside the context are emitted right away'''
+        with utils.held_logs():
+            pass
+        logging.getLogger("launchpadlib").info("from a library")
+        self.assertEquals(self.messages, ["from a library"])